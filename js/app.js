@@ -382,16 +382,29 @@ function getQueryParam(param) {
 
 // ============================================================================
 // Repeater Data Manager
-// Reads repeater status from /data/repeater-status.json
+// Reads repeater status from /data/status (summary, node index and one file
+// per node, written by scripts/shards.py) or, for the whole document,
+// /data/repeater-status.min.json
 // (Updated via GitHub Actions workflow every 5 minutes)
+// With a live status server (fetch-repeater-data.py --serve) configured as
+// liveUrl or window.REPEATER_LIVE_URL, the same layout is read from the
+// server and changes arrive as Server-Sent Events within seconds
 // ============================================================================
 
 class RepeaterDataManager {
     constructor(config = {}) {
-        this.dataUrl = config.dataUrl || '/data/repeater-status.json';
+        this.dataUrl = config.dataUrl || '/data/repeater-status.min.json';
         this.cacheExpiry = (config.cacheExpiryMinutes || 1) * 60 * 1000; // 1 minute cache
+        this.historyUrl = config.historyUrl || '/data/history';
+        this.liveUrl = config.liveUrl || window.REPEATER_LIVE_URL || null;
+        this.statusUrl = config.statusUrl || this.liveUrl || '/data/status';
+        this.eventSource = null;
         this.data = null;
         this.lastFetch = null;
+        this.history = {};
+        this.summary = null;
+        this.summaryFetchedAt = null;
+        this.shards = {}; // content-hashed file name -> parsed JSON (never changes)
     }
     
     /**
@@ -442,6 +455,146 @@ class RepeaterDataManager {
         }
         return data;
     }
+
+    /**
+     * Get the network summary (statistics without the node list)
+     * summary.json is revalidated on every fetch; everything it points
+     * to has a content hash in its name and can be cached forever
+     * @returns {Promise<Object|null>} Summary object or null on error
+     */
+    async getSummary() {
+        if (this.summary && Date.now() - this.summaryFetchedAt < this.cacheExpiry) {
+            return this.summary;
+        }
+
+        try {
+            const response = await fetch(`${this.statusUrl}/summary.json`, { cache: 'no-cache' });
+            if (!response.ok) {
+                console.error(`Summary fetch error: ${response.status} ${response.statusText}`);
+                return null;
+            }
+            this.summary = await response.json();
+            this.summaryFetchedAt = Date.now();
+            return this.summary;
+        } catch (error) {
+            console.error('Error fetching status summary:', error);
+            return null;
+        }
+    }
+
+    /**
+     * Fetch a content-hashed status file (cached for the page's lifetime)
+     * @param {string} name - File name relative to statusUrl
+     * @returns {Promise<Object|null>} Parsed JSON or null on error
+     */
+    async getShard(name) {
+        if (this.shards[name]) return this.shards[name];
+
+        try {
+            const response = await fetch(`${this.statusUrl}/${name}`);
+            if (!response.ok) {
+                console.error(`Status file fetch error: ${response.status} ${response.statusText}`);
+                return null;
+            }
+            const data = await response.json();
+            this.shards[name] = data;
+            return data;
+        } catch (error) {
+            console.error('Error fetching status file:', error);
+            return null;
+        }
+    }
+
+    /**
+     * Get the node index: one small object per node
+     * @returns {Promise<Array<Object>|null>} Objects with id, name, status,
+     *     lastSeen, latitude, longitude and file, or null on error
+     */
+    async getNodeIndex() {
+        const summary = await this.getSummary();
+        if (!summary) return null;
+        const index = await this.getShard(summary.nodeIndex);
+        if (!index) return null;
+        return index.rows.map(row => Object.fromEntries(index.fields.map((field, i) => [field, row[i]])));
+    }
+
+    /**
+     * Get one node's full record and history
+     * @param {string} nodeId - Node id from the node index
+     * @returns {Promise<{node: Object, history: Object|null}|null>} Node detail or null on error
+     */
+    async getNode(nodeId) {
+        const nodes = await this.getNodeIndex();
+        const entry = nodes ? nodes.find(node => node.id === nodeId) : null;
+        if (!entry) return null;
+        return this.getShard(entry.file);
+    }
+
+    /**
+     * Follow live status changes from the status server
+     * The cached summary is replaced on every 'summary' event, so the next
+     * getSummary()/getNodeIndex() call returns the new state without polling
+     * @param {Function} onChange - Called as onChange(type, data) with type
+     *     'summary' (the new summary) or 'node' ({id, name, status,
+     *     previousStatus, lastSeen} when a repeater changes online state)
+     * @returns {EventSource|null} The event stream, or null without a liveUrl
+     */
+    subscribe(onChange) {
+        if (!this.liveUrl || typeof EventSource === 'undefined') return null;
+        if (!this.eventSource) {
+            this.eventSource = new EventSource(`${this.liveUrl}/events`);
+            this.eventSource.addEventListener('summary', event => {
+                this.summary = JSON.parse(event.data);
+                this.summaryFetchedAt = Date.now();
+            });
+        }
+        this.eventSource.addEventListener('summary', () => onChange('summary', this.summary));
+        this.eventSource.addEventListener('node', event => onChange('node', JSON.parse(event.data)));
+        return this.eventSource;
+    }
+
+    /**
+     * Get the history rollups for one node (or the whole network)
+     * Files are written by scripts/rollups.py alongside the status file
+     * @param {string} nodeId - Node id from the status data, or 'network'
+     * @returns {Promise<Object|null>} History document or null on error
+     */
+    async getHistory(nodeId) {
+        const cached = this.history[nodeId];
+        if (cached && Date.now() - cached.fetchedAt < this.cacheExpiry) {
+            return cached.data;
+        }
+
+        try {
+            const response = await fetch(`${this.historyUrl}/${encodeURIComponent(nodeId)}.json`);
+            if (!response.ok) {
+                console.error(`History fetch error: ${response.status} ${response.statusText}`);
+                return null;
+            }
+            const data = await response.json();
+            this.history[nodeId] = { data, fetchedAt: Date.now() };
+            return data;
+        } catch (error) {
+            console.error('Error fetching history data:', error);
+            return null;
+        }
+    }
+
+    /**
+     * Turn one field of a history resolution into chart points
+     * @param {Object} history - Document from getHistory()
+     * @param {string} resolution - '5m', '1h' or '1d'
+     * @param {string} field - e.g. 'packets', 'online', 'rssiMean', 'snrMax'
+     * @returns {Array<{time: Date, value: number|null}>} One point per bucket
+     */
+    static historyPoints(history, resolution, field) {
+        const series = history && history.series ? history.series[resolution] : null;
+        if (!series || !series[field]) return [];
+        return series[field].map((value, i) => ({
+            time: new Date(series.start + i * series.step),
+            value
+        }));
+    }
 }
 
 // Create global instance
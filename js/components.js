@@ -163,6 +163,10 @@ function renderNetworkStatus(containerId) {
 
     // Start loading live data
     loadNetworkStatusData();
+    // With a live status server, re-render as soon as the summary changes
+    repeaterManager.subscribe(type => {
+        if (type === 'summary') loadNetworkStatusData();
+    });
 }
 
 /**
@@ -243,8 +247,9 @@ function updatePulseColor(element, r, g, b) {
  */
 async function loadNetworkStatusData() {
     try {
-        const response = await fetch('data/repeater-status.json');
-        const data = await response.json();
+        // The summary and node index are all this widget shows
+        const data = await repeaterManager.getSummary();
+        if (!data) throw new Error('Status summary unavailable');
         const container = document.getElementById('network-status-container');
         const statusText = document.getElementById('network-status-text');
         const nodePulse = document.getElementById('node-pulse');
@@ -273,12 +278,13 @@ async function loadNetworkStatusData() {
 
         // Update sidebar network status widget
         if (!container) return;
-        if (!data.nodes || data.nodes.length === 0) {
+        const nodes = await repeaterManager.getNodeIndex();
+        if (!nodes || nodes.length === 0) {
             container.innerHTML = '<div class="text-slate-300 text-sm">No repeaters online</div>';
             return;
         }
 
-        const statusHtml = data.nodes.map(node => {
+        const statusHtml = nodes.map(node => {
             const statusColor = node.status === 'online' ? 'text-mesh-300' : 'text-red-400';
             const statusDot = node.status === 'online' ? 'bg-mesh-500' : 'bg-red-500';
             const borderColor = node.status === 'online' ? 'border-l-mesh-500' : 'border-l-red-500';
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Convert archived API responses or the packet store into a packet archive.
+
+Reads JSON dumps (.json/.json.gz), existing archives (.pktar) or a SQLite
+packet store, drops duplicate packets (same key as the packet store: id,
+else hash + heard_at; the first copy wins) and writes one time-sorted
+archive (see packet_archive.py). fetch-repeater-data.py reads archives
+with --input and --replay.
+
+Usage:
+    python scripts/archive-packets.py data/archive/2026-05.pktar dumps/2026-05-*.json.gz
+    python scripts/archive-packets.py data/archive/store.pktar --store data/packet-store.sqlite3
+    python scripts/archive-packets.py --info data/archive/2026-05.pktar
+"""
+
+import argparse
+import importlib.util
+import logging
+import sys
+from collections import Counter
+from pathlib import Path
+
+from packet_archive import BLOCK_ROWS, PacketArchive, write_archive
+from packet_store import PacketStore, packet_store_key
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = Path(__file__).parent
+
+
+def load_pipeline():
+    """Import fetch-repeater-data.py (hyphenated, so not importable by name)."""
+    if str(SCRIPT_DIR) not in sys.path:
+        sys.path.insert(0, str(SCRIPT_DIR))
+    spec = importlib.util.spec_from_file_location("fetch_repeater_data", SCRIPT_DIR / "fetch-repeater-data.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def iter_unique(packets, stats):
+    """Yield packets whose store key has not been seen (keyless packets always pass)."""
+    seen = set()
+    for packet in packets:
+        stats["read"] += 1
+        key = packet_store_key(packet)
+        if key is not None:
+            if key in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.add(key)
+        yield packet
+
+
+def show_info(path):
+    """Print an archive's size, blocks, time range and payload type mix."""
+    with PacketArchive(path) as archive:
+        size = Path(path).stat().st_size
+        print(f"{path}: {len(archive)} packets in {len(archive.blocks)} blocks, {size} bytes "
+              f"({size / max(1, len(archive)):.0f} bytes/packet, {archive.codec.name})")
+        types = Counter()
+        heard = []
+        for packet in archive.iter_packets(fields=("payload_type", "heard_at")):
+            types[packet.get("payload_type")] += 1
+            if packet.get("heard_at"):
+                heard.append(packet["heard_at"])
+        if heard:
+            print(f"  heard {min(heard)} .. {max(heard)}")
+        for name, count in types.most_common():
+            print(f"  {name}: {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("output", type=Path, nargs="?", help="Archive to write (.pktar)")
+    parser.add_argument("inputs", type=Path, nargs="*", metavar="INPUT",
+                        help="API responses (.json/.json.gz) or archives (.pktar) to include")
+    parser.add_argument("--store", type=Path, help="Also include every packet in this SQLite packet store")
+    parser.add_argument("--block-rows", type=int, default=BLOCK_ROWS,
+                        help="Packets per block (default: %(default)s)")
+    parser.add_argument("--codec", choices=["zstd", "zlib"],
+                        help="Column compression (default: zstd if installed, else zlib)")
+    parser.add_argument("--info", type=Path, nargs="+", metavar="ARCHIVE", help="Describe archives and exit")
+    args = parser.parse_args()
+
+    if args.info:
+        for path in args.info:
+            show_info(path)
+        return 0
+    if args.output is None or not (args.inputs or args.store):
+        parser.error("give an output archive and at least one input or --store")
+
+    pipeline = load_pipeline()
+    sources = [pipeline.iter_packet_file(path) for path in args.inputs]
+    store = PacketStore(args.store, pipeline.parse_path_hops) if args.store else None
+    try:
+        if store is not None:
+            sources.append(store.iter_packets())
+        stats = Counter()
+        packets = iter_unique((p for source in sources for p in source), stats)
+        count = write_archive(args.output, packets, args.block_rows, args.codec)
+    finally:
+        if store is not None:
+            store.close()
+
+    size = args.output.stat().st_size
+    logger.info(f"Wrote {count} packets to {args.output} ({size} bytes, {stats['duplicates']} duplicates dropped "
+                f"from {stats['read']} read)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Prefix-collision attribution for 1-byte path hops.
+
+A path hop is only the first byte of a repeater's public key, so with
+more than a few dozen repeaters several keys share a prefix and a hop
+cannot say which of them forwarded the packet. AttributionIndex picks
+the most likely candidate for an ambiguous hop from its context in the
+path (the hops before and after it) using three kinds of evidence:
+
+- adjacency: a repeater's own Adverts show which hop first heard it, so
+  a candidate known to reach the neighboring hop is more likely;
+- distance: candidates close to the neighboring hops' Advert locations
+  (or to the observer, for the last hop) are more likely than ones
+  across the region;
+- recency: a candidate that advertised recently is more likely than one
+  that has gone quiet.
+
+The scores are normalized over the candidates, so the winner's share is
+the confidence of the attribution. Results are memoized per (prefix,
+previous hop, next hop), so a lookup costs one dict access once a route
+has been seen.
+
+Usage:
+    index = AttributionIndex()
+    index.add_repeater(key, lat, lon, last_advert_ms)
+    index.add_link(key, first_hop)
+    key, confidence = index.resolve("a0", prev_hop, next_hop)
+"""
+
+import math
+
+from topology import OBSERVER
+
+ADJACENCY_WEIGHT = 0.5
+DISTANCE_WEIGHT = 0.3
+RECENCY_WEIGHT = 0.2
+DISTANCE_SCALE_KM = 20  # score falls to 1/e at this distance from a neighbor
+RECENCY_SCALE_MS = 86_400_000  # score falls to 1/e this long before the newest Advert
+EARTH_RADIUS_KM = 6371.0
+
+
+def distance_km(a, b):
+    """Great-circle distance between two (lat, lon) points in km."""
+    lat1, lon1 = map(math.radians, a)
+    lat2, lon2 = map(math.radians, b)
+    h = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+def parse_location(lat, lon):
+    """(lat, lon) floats, or None if either is missing/invalid/out of range or the 0,0 placeholder."""
+    try:
+        lat, lon = float(lat), float(lon)
+    except (ValueError, TypeError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or (lat == 0 and lon == 0):
+        return None
+    return lat, lon
+
+
+class AttributionIndex:
+    """Candidates per hop prefix plus the evidence used to choose between them."""
+
+    def __init__(self):
+        self.candidates = {}  # prefix -> sorted list of canonical keys
+        self.locations = {}  # key -> (lat, lon)
+        self.last_ms = {}  # key -> newest Advert heard time
+        self.links = {}  # key -> {hop prefix or OBSERVER: Adverts first heard there}
+        self.observer_location = None
+        self.ambiguous = frozenset()  # prefixes with more than one candidate
+        self._newest_ms = None
+        self._memo = {}
+
+    def add_repeater(self, key, lat=None, lon=None, last_ms=None):
+        """Add or update a candidate repeater (canonical key)."""
+        prefix = key[:2]
+        keys = self.candidates.setdefault(prefix, [])
+        if key not in keys:
+            keys.append(key)
+            keys.sort()
+            if len(keys) > 1:
+                self.ambiguous = self.ambiguous | {prefix}
+        location = parse_location(lat, lon)
+        if location is not None:
+            self.locations[key] = location
+        if last_ms is not None and last_ms > self.last_ms.get(key, -1):
+            self.last_ms[key] = last_ms
+            if self._newest_ms is None or last_ms > self._newest_ms:
+                self._newest_ms = last_ms
+        self._memo.clear()
+
+    def add_link(self, key, hop):
+        """Record that an Advert from key was first heard by hop (a prefix, or OBSERVER)."""
+        links = self.links.setdefault(key, {})
+        links[hop] = links.get(hop, 0) + 1
+        self._memo.clear()
+
+    def set_observer_location(self, lat, lon):
+        self.observer_location = parse_location(lat, lon)
+        self._memo.clear()
+
+    def _neighbor_location(self, hop):
+        """Location of a neighboring hop, if it is unambiguous and known."""
+        if hop == OBSERVER:
+            return self.observer_location
+        keys = self.candidates.get(hop)
+        if keys and len(keys) == 1:
+            return self.locations.get(keys[0])
+        return None
+
+    def _score(self, key, prev, nxt, neighbor_locations):
+        links = self.links.get(key, {})
+        evidence = links.get(nxt, 0) + (links.get(prev, 0) if prev else 0)
+        adjacency = evidence / (evidence + 1)
+
+        location = self.locations.get(key)
+        if location is not None and neighbor_locations:
+            distance = sum(math.exp(-distance_km(location, n) / DISTANCE_SCALE_KM)
+                           for n in neighbor_locations) / len(neighbor_locations)
+        else:
+            distance = 0.5  # no evidence either way
+
+        last_ms = self.last_ms.get(key)
+        if last_ms is not None and self._newest_ms is not None:
+            recency = math.exp(-(self._newest_ms - last_ms) / RECENCY_SCALE_MS)
+        else:
+            recency = 0.0
+
+        return (ADJACENCY_WEIGHT * adjacency + DISTANCE_WEIGHT * distance
+                + RECENCY_WEIGHT * recency)
+
+    def resolve(self, prefix, prev=None, nxt=OBSERVER):
+        """
+        Attribute one hop to a repeater.
+
+        Args:
+            prefix: Hop prefix to resolve
+            prev: Hop before it in the path (None if it is the first hop)
+            nxt: Hop after it (OBSERVER if it is the last hop)
+
+        Returns:
+            Tuple of (canonical key, confidence 0..1), or (None, 0.0) if
+            no known repeater has this prefix
+        """
+        context = (prefix, prev, nxt)
+        result = self._memo.get(context)
+        if result is not None:
+            return result
+        keys = self.candidates.get(prefix)
+        if not keys:
+            result = (None, 0.0)
+        elif len(keys) == 1:
+            result = (keys[0], 1.0)
+        else:
+            neighbor_locations = [loc for loc in (self._neighbor_location(prev) if prev else None,
+                                                  self._neighbor_location(nxt))
+                                  if loc is not None]
+            scores = [(self._score(key, prev, nxt, neighbor_locations), key) for key in keys]
+            total = sum(score for score, _ in scores)
+            # Highest score wins; keys are sorted, so ties go to the lowest key
+            best_score, best_key = scores[0]
+            for score, key in scores[1:]:
+                if score > best_score:
+                    best_score, best_key = score, key
+            result = (best_key, best_score / total if total else 1.0 / len(keys))
+        self._memo[context] = result
+        return result
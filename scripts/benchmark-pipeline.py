@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Benchmark the repeater status pipeline in fetch-repeater-data.py.
+
+Generates synthetic MeshCore packets (see synthetic_packets.py) and times
+each pipeline stage at several packet and repeater counts, so performance
+changes can be checked without hitting the API. Results are written as
+JSON; pass an earlier results file with --compare to see the change per
+stage between commits.
+
+Usage:
+    python scripts/benchmark-pipeline.py
+    python scripts/benchmark-pipeline.py --packets 5000 100000 --repeaters 10 1000
+    python scripts/benchmark-pipeline.py --output after.json --compare before.json
+    python scripts/benchmark-pipeline.py --only activity-scan timestamps
+"""
+
+import argparse
+import importlib.util
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from packet_archive import PacketArchive, write_archive
+from synthetic_packets import generate_packets
+
+SCRIPT_DIR = Path(__file__).parent
+DEFAULT_PACKETS = [5_000, 100_000, 1_000_000]
+DEFAULT_REPEATERS = [10, 100, 1000]
+DEFAULT_OUTPUT = SCRIPT_DIR.parent / "benchmark-results.json"
+MESSAGE_FIELDS = ("hash", "heard_at", "payload_type", "decoded_payload")  # what count_messages reads
+
+
+def load_pipeline():
+    """Import fetch-repeater-data.py (hyphenated, so not importable by name)."""
+    if str(SCRIPT_DIR) not in sys.path:
+        sys.path.insert(0, str(SCRIPT_DIR))
+    spec = importlib.util.spec_from_file_location(
+        "fetch_repeater_data", SCRIPT_DIR / "fetch-repeater-data.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def substring_scan(pipeline, all_packets, repeater_keys):
+    """
+    The previous find_repeater_activity matching loop, kept for comparison.
+
+    Tests every repeater prefix against the stringified path, so the cost
+    per packet grows with the number of repeaters.
+    """
+    normalized_keys = {k.lower(): k for k in repeater_keys}
+    key_prefixes = {}
+    for key in repeater_keys:
+        key_prefixes.setdefault(key[:2].lower(), []).append(key)
+    activity = {key: pipeline.new_activity() for key in repeater_keys}
+    for packet in all_packets:
+        decoded = packet.get("decoded_payload") or {}
+        packet_public_key = (decoded.get("public_key") or "").lower()
+        path = str(packet.get("path", "")).lower()
+        matched = set()
+        if packet_public_key in normalized_keys:
+            matched.add(normalized_keys[packet_public_key])
+        if path:
+            for prefix, keys in key_prefixes.items():
+                if prefix in path:
+                    matched.update(keys)
+        for key in matched:
+            pipeline.record_activity(activity[key], packet.get("heard_at", ""),
+                                     packet.get("snr"), packet.get("rssi"))
+    return activity
+
+
+def time_call(func, *args, repeat=3):
+    """Return the best wall time in seconds over repeat calls."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_stages(pipeline, packet_count, repeater_count, repeat):
+    """
+    Time every pipeline stage on one synthetic dataset.
+
+    Each stage gets the inputs the pipeline would hand it (raw packet
+    dicts, the aggregated repeaters, and so on), computed once outside the
+    timed call.
+
+    Returns:
+        Dict with the dataset sizes and stage name -> best wall time in seconds
+    """
+    packets, _ = generate_packets(packet_count, repeater_count)
+    repeater_packets = pipeline.filter_repeater_packets(packets)
+    repeaters = pipeline.aggregate_repeaters(repeater_packets)
+    fresh = pipeline.filter_stale_repeaters(packets, repeaters)
+    activity = pipeline.find_repeater_activity(packets, set(repeaters))
+    nodes = [pipeline.build_node_record(pk, p, activity.get(pk)) for pk, p in repeaters.items()]
+    document = {"nodes": nodes}
+
+    def build_nodes():
+        return [pipeline.build_node_record(pk, p, activity.get(pk)) for pk, p in repeaters.items()]
+
+    def engine_pass():
+        engine = pipeline.AnalysisEngine.with_default_consumers()
+        return pipeline.build_status_document(engine.run(packets), engine.now)
+
+    timings = {
+        "filter_repeater_packets": time_call(pipeline.filter_repeater_packets, packets, repeat=repeat),
+        "aggregate_repeaters": time_call(pipeline.aggregate_repeaters, repeater_packets, repeat=repeat),
+        "filter_stale_repeaters": time_call(pipeline.filter_stale_repeaters, packets, repeaters,
+                                            repeat=repeat),
+        "find_repeater_activity": time_call(pipeline.find_repeater_activity, packets, set(repeaters),
+                                            repeat=repeat),
+        "count_companion_nodes": time_call(pipeline.count_companion_nodes, packets, repeat=repeat),
+        "count_messages": time_call(pipeline.count_messages, packets, repeat=repeat),
+        "build_node_record": time_call(build_nodes, repeat=repeat),
+        "calculate_network_stats": time_call(pipeline.calculate_network_stats, nodes, repeat=repeat),
+        "engine_single_pass": time_call(engine_pass, repeat=repeat),
+    }
+    if pipeline.analyze_columnar(packets[:1], datetime.now(timezone.utc)) is not None:
+        def columnar_pass():
+            now = datetime.now(timezone.utc)
+            return pipeline.build_status_document(pipeline.analyze_columnar(packets, now), now)
+        timings["columnar_pass"] = time_call(columnar_pass, repeat=repeat)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output_file, backup_file = pipeline.OUTPUT_FILE, pipeline.BACKUP_FILE
+        pipeline.OUTPUT_FILE = Path(tmp) / "repeater-status.json"
+        pipeline.BACKUP_FILE = Path(tmp) / "repeater-status.json.bak"
+        try:
+            timings["save_json_data"] = time_call(lambda: pipeline.save_json_data(document, force=True),
+                                                  repeat=repeat)
+            timings["save_json_data_unchanged"] = time_call(pipeline.save_json_data, document, repeat=repeat)
+        finally:
+            pipeline.OUTPUT_FILE, pipeline.BACKUP_FILE = output_file, backup_file
+
+        # Raw packet history: parse a JSON dump vs query a packet archive
+        dump_file = Path(tmp) / "packets.json"
+        dump_file.write_text(json.dumps(packets))
+        archive_file = Path(tmp) / "packets.pktar"
+        timings["archive_write"] = time_call(write_archive, archive_file, packets, repeat=repeat)
+        week_ms = pipeline.datetime_to_ms(datetime.now(timezone.utc) - timedelta(days=7))
+
+        def messages_from_dump():
+            return pipeline.count_messages(json.loads(dump_file.read_bytes()))
+
+        def messages_from_archive():
+            with PacketArchive(archive_file) as archive:
+                return pipeline.count_messages(archive.iter_packets(
+                    since_ms=week_ms, payload_types={"TextMessage", "GroupText"}, fields=MESSAGE_FIELDS))
+        timings["json_dump_messages"] = time_call(messages_from_dump, repeat=repeat)
+        timings["archive_messages_7d"] = time_call(messages_from_archive, repeat=repeat)
+
+    return {
+        "packets": packet_count,
+        "repeaters": repeater_count,
+        "repeaters_advertised": len(repeaters),
+        "repeaters_fresh": len(fresh),
+        "timings": timings,
+    }
+
+
+def bench_activity(pipeline, packet_count, repeater_counts):
+    """Time find_repeater_activity against the old substring scan."""
+    print(f"find_repeater_activity, {packet_count} packets")
+    print(f"{'repeaters':>10} {'hop index (s)':>14} {'substring (s)':>14} {'speedup':>8}")
+    rows = []
+    for repeater_count in repeater_counts:
+        packets, keys = generate_packets(packet_count, repeater_count)
+        indexed = time_call(pipeline.find_repeater_activity, packets, keys)
+        scanned = time_call(substring_scan, pipeline, packets, keys)
+        print(f"{repeater_count:>10} {indexed:>14.3f} {scanned:>14.3f} {scanned / indexed:>7.1f}x")
+        rows.append({"packets": packet_count, "repeaters": repeater_count,
+                     "hop_index": indexed, "substring": scanned})
+    return rows
+
+
+def generate_timestamps(count, seed=0):
+    """Generate heard_at strings in the API format spread over the last 30 days."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    timestamps = []
+    for _ in range(count):
+        t = now - timedelta(milliseconds=rng.randrange(30 * 86_400_000))
+        timestamps.append(t.strftime("%Y-%m-%dT%H:%M:%S.") + f"{t.microsecond // 1000:03d}Z")
+    return timestamps
+
+
+def bench_timestamps(pipeline, count):
+    """
+    Time heard_at handling: datetime parsing per stage vs epoch ms at ingest.
+
+    The old pipeline parsed heard_at with fromisoformat() separately in
+    each of four stages (staleness, companions, messages, online status);
+    PacketView now parses it once and every stage does an integer compare.
+    """
+    timestamps = generate_timestamps(count)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=7)
+    cutoff_ms = pipeline.datetime_to_ms(cutoff)
+
+    def parse_datetime():
+        return [datetime.fromisoformat(s.replace('Z', '+00:00')) for s in timestamps]
+
+    def parse_ms():
+        parse = pipeline.parse_heard_at_ms
+        return [parse(s) for s in timestamps]
+
+    parsed_dt = parse_datetime()
+    parsed_ms = parse_ms()
+    assert parsed_ms == [pipeline.datetime_to_ms(dt) for dt in parsed_dt]
+
+    rows = [
+        ("parse", time_call(parse_datetime), time_call(parse_ms)),
+        ("window compare", time_call(lambda: sum(dt >= cutoff for dt in parsed_dt)),
+         time_call(lambda: sum(ms >= cutoff_ms for ms in parsed_ms))),
+        ("4 stages", time_call(lambda: [sum(dt >= cutoff for dt in parse_datetime()) for _ in range(4)]),
+         time_call(lambda: [sum(ms >= cutoff_ms for ms in parsed) for parsed in [parse_ms()] for _ in range(4)])),
+    ]
+    print(f"heard_at handling, {count} timestamps")
+    print(f"{'step':>15} {'datetime (s)':>13} {'epoch ms (s)':>13} {'speedup':>8}")
+    for step, old, new in rows:
+        print(f"{step:>15} {old:>13.3f} {new:>13.3f} {old / new:>7.1f}x")
+    return [{"timestamps": count, "step": step, "datetime": old, "epoch_ms": new}
+            for step, old, new in rows]
+
+
+def git_revision():
+    """Return the current commit hash, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=SCRIPT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(previous, current):
+    """Print the change per stage against an earlier results file."""
+    before = {(r["packets"], r["repeaters"]): r["timings"] for r in previous.get("stages", [])}
+    print(f"\nCompared with {previous.get('commit') or 'previous run'}")
+    print(f"{'packets':>9} {'repeaters':>9} {'stage':>24} {'before (s)':>11} {'after (s)':>10} {'change':>8}")
+    for row in current["stages"]:
+        old = before.get((row["packets"], row["repeaters"]))
+        if not old:
+            continue
+        for stage, seconds in row["timings"].items():
+            if old.get(stage):
+                change = (seconds - old[stage]) / old[stage]
+                print(f"{row['packets']:>9} {row['repeaters']:>9} {stage:>24} "
+                      f"{old[stage]:>11.4f} {seconds:>10.4f} {change:>+8.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--packets", type=int, nargs="+", default=DEFAULT_PACKETS,
+                        help="Synthetic packet counts (default: %(default)s)")
+    parser.add_argument("--repeaters", type=int, nargs="+", default=DEFAULT_REPEATERS,
+                        help="Repeater counts (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Runs per measurement; the best is kept (1M-packet runs use 1)")
+    parser.add_argument("--timestamps", type=int, default=1_000_000,
+                        help="Timestamps for the heard_at parsing benchmark")
+    parser.add_argument("--only", nargs="+", choices=["stages", "activity-scan", "timestamps"],
+                        default=["stages", "activity-scan", "timestamps"], help="Benchmarks to run")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT,
+                        help="Results JSON file (default: %(default)s)")
+    parser.add_argument("--compare", type=Path, help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    pipeline = load_pipeline()
+    pipeline.logger.disabled = True
+
+    results = {
+        "commit": git_revision(),
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "stages": [],
+        "activity_scan": [],
+        "timestamps": [],
+    }
+
+    if "stages" in args.only:
+        print(f"{'packets':>9} {'repeaters':>9} {'stage':>24} {'seconds':>9}")
+        for packet_count in args.packets:
+            for repeater_count in args.repeaters:
+                repeat = 1 if packet_count >= 1_000_000 else args.repeat
+                row = bench_stages(pipeline, packet_count, repeater_count, repeat)
+                for stage, seconds in row["timings"].items():
+                    print(f"{packet_count:>9} {repeater_count:>9} {stage:>24} {seconds:>9.4f}")
+                results["stages"].append(row)
+        print()
+
+    if "activity-scan" in args.only:
+        results["activity_scan"] = bench_activity(pipeline, min(args.packets), args.repeaters)
+        print()
+
+    if "timestamps" in args.only:
+        results["timestamps"] = bench_timestamps(pipeline, args.timestamps)
+
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare_results(json.loads(args.compare.read_text()), results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
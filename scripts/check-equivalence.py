@@ -0,0 +1,626 @@
+#!/usr/bin/env python3
+"""
+Differential check of the repeater status pipeline against its reference.
+
+reference_pipeline.py keeps the analysis functions as they were before
+the performance work. This script generates randomized packet sets (see
+synthetic_packets.py) and mixes in the edge cases the API produces or
+could produce: missing decoded_payload, public keys in upper or mixed
+case, invalid and differently formatted heard_at, null or non-numeric
+SNR/RSSI, every path form parse_path_hops() accepts, and packets exactly
+on the 3-day, 30-day and 240-minute boundaries.
+
+Alongside each packet set the generator writes a normalized copy that
+says what the packets mean: paths with their hops comma-separated,
+heard_at in the API's format (dropped where it is invalid) and public
+keys in lower case. On that copy the reference's substring path matching
+and string timestamp comparisons give the right answer, so the documented
+fixes (hop-boundary matching, parsed timestamps, canonical keys) leave
+nothing to explain. All documents are built at a frozen clock, and the
+checks are:
+
+- strict: the reference and the current pipeline (AnalysisEngine and,
+  with --columnar, analyze_columnar; with and without prefix
+  attribution) on the normalized packets must produce the same status
+  document, and the legacy stage functions (filter_stale_repeaters,
+  find_repeater_activity, count_companion_nodes, count_messages,
+  calculate_network_stats) the same results
+- invariance: the current pipeline must produce the same document from
+  the raw packets as from the normalized ones (lastSeen compared as a
+  time, publicKey ignoring case)
+- raw: the reference and the current pipeline on the raw packets, to
+  show where the fixes change the output
+
+Differences that are intended are listed in DEVIATIONS. In the strict
+checks only prefix attribution and rounding are allowed to differ; in
+the raw check a difference is explained when the repeater it belongs to
+is affected by one of the deviations. Anything else is unexplained and
+fails the run. Fields only the current pipeline writes are counted as
+additions, not differences.
+
+Usage:
+    python scripts/check-equivalence.py
+    python scripts/check-equivalence.py --seeds 200 --packets 5000 --columnar
+    python scripts/check-equivalence.py --seed 17 --verbose    # one packet set, every difference
+"""
+
+import argparse
+import copy
+import importlib.util
+import logging
+import random
+import sys
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import reference_pipeline as reference
+from synthetic_packets import generate_packets
+from timestamps import format_epoch_ms, format_heard_at, parse_heard_at_ms
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = Path(__file__).parent
+FROZEN_NOW = datetime(2026, 5, 1, 12, 0, 0, tzinfo=timezone.utc)
+EDGE_CASE_RATE = 0.03  # share of packets given each kind of edge case
+NAIVE_TIMESTAMP_SETS = 0.2  # share of packet sets that also get heard_at without an offset
+SHOW_LIMIT = 20  # unexplained differences printed without --verbose
+
+# Intended differences between the reference and the current pipeline
+DEVIATIONS = {
+    "hop-boundary": "Path hops are matched whole; the reference also found a repeater's prefix "
+                    "across hop boundaries or in the text of a list path ('0d' in 'a0d3')",
+    "shared-prefix": "A hop prefix shared by several repeaters is credited to the most likely one "
+                     "(attribution.py); the reference credited all of them",
+    "timestamp-format": "heard_at is compared as a parsed time; the reference compared strings, so an "
+                        "invalid or differently formatted timestamp could become a repeater's last heard time",
+    "advert-timestamp": "The same, for the Advert a repeater's metadata and staleness come from: "
+                        "the reference could pick another Advert or drop the repeater",
+    "key-case": "Public keys are compared in lower case; the reference listed a repeater "
+                "advertised in two letter cases twice",
+    "naive-timestamp": "A heard_at without an offset is taken as UTC; the reference raised TypeError "
+                       "comparing it with its window cutoffs, so there is no raw reference output",
+    "mean-rounding": "Averages come from streaming or vectorized sums; after rounding to 0.1 they "
+                     "can differ from sum() / len() by one step",
+    "derived": "Network statistics over nodes that differ for one of the reasons above",
+    "wall-clock": "lastUpdated is the time the document was built",
+}
+ACTIVITY_REASONS = {"hop-boundary", "shared-prefix", "timestamp-format"}
+PRESENCE_REASONS = {"advert-timestamp", "key-case"}
+ACTIVITY_FIELDS = {"status", "lastSeen", "averageSNR", "averageRSSI", "averageRSSIPercentage",
+                   "activityPacketCount"}
+MEAN_FIELDS = {"averageSNR", "averageRSSI", "averageRSSIPercentage", "averageSignal"}
+NETWORK_FIELDS = ("totalNodes", "onlineNodes", "offlineNodes", "healthPercentage", "networkHealth",
+                  "averageSignal", "averageSNR")
+
+
+def load_pipeline():
+    """Import fetch-repeater-data.py (hyphenated, so not importable by name)."""
+    if str(SCRIPT_DIR) not in sys.path:
+        sys.path.insert(0, str(SCRIPT_DIR))
+    spec = importlib.util.spec_from_file_location("fetch_repeater_data", SCRIPT_DIR / "fetch-repeater-data.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# ============================================================================
+# Packet sets
+# ============================================================================
+
+def path_hops(path):
+    """Hop strings of a synthetic path ("a0d3" or "a0,d3")."""
+    path = (path or "").replace(",", "")
+    return [path[i:i + 2] for i in range(0, len(path), 2)]
+
+
+def reformat_path(rng, hops):
+    """
+    The hops in another form the API could send.
+
+    Returns:
+        Tuple of (path value, the hops it stands for)
+    """
+    form = rng.randrange(7)
+    if form == 0:
+        return " -> ".join(hops), hops
+    if form == 1:
+        return list(hops), hops
+    if form == 2:
+        return [int(hop, 16) for hop in hops], hops
+    if form == 3:
+        return "".join(hops).upper(), hops
+    if form == 4:
+        return ",".join(hops).upper(), hops
+    if form == 5:
+        return None, []
+    return "", []
+
+
+def odd_timestamp(rng, heard_at, naive=False):
+    """
+    An invalid or differently formatted heard_at.
+
+    With naive, a timestamp without a UTC offset is possible too (the
+    reference raises TypeError on those; the pipeline takes them as UTC).
+
+    Returns:
+        Tuple of (raw value, or None to drop the field; the time it stands
+        for in the API's format, or None if invalid)
+    """
+    dt = datetime.fromtimestamp(parse_heard_at_ms(heard_at) / 1000, timezone.utc)
+    seconds = dt.replace(microsecond=0)
+    choices = [
+        ("garbage", None),
+        ("", None),
+        (None, None),
+        (dt.isoformat(), format_heard_at(dt)),  # +00:00 offset
+        (seconds.strftime("%Y-%m-%dT%H:%M:%SZ"), format_heard_at(seconds)),  # no milliseconds
+        (dt.astimezone(timezone(timedelta(hours=2))).isoformat(timespec="milliseconds"), format_heard_at(dt)),
+    ]
+    if naive:
+        midnight = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        choices.append((heard_at[:10], format_heard_at(midnight)))  # date only
+    return rng.choice(choices)
+
+
+def boundary_packets(rng, packets, now):
+    """Copies of packets heard exactly on (and 1 ms either side of) the windows' edges."""
+    edges = [now - timedelta(days=reference.ADVERT_STALE_DAYS),
+             now - timedelta(days=30),
+             now - timedelta(minutes=reference.ONLINE_THRESHOLD_MINUTES)]
+    extra = []
+    for edge in edges:
+        for offset_ms in (-1, 0, 1):
+            for packet in rng.sample(packets, min(3, len(packets))):
+                packet = copy.deepcopy(packet)
+                packet["id"] = f"edge-{len(extra)}"
+                packet["heard_at"] = format_heard_at(edge + timedelta(milliseconds=offset_ms))
+                extra.append(packet)
+    return extra
+
+
+def make_packet_set(seed, packet_count, repeater_count, edge_cases=True, now=FROZEN_NOW):
+    """
+    Generate one randomized packet set and its normalized copy.
+
+    Args:
+        seed: Random seed; the same arguments give the same packets
+        packet_count: Synthetic packets before the edge cases are added
+        repeater_count: Synthetic repeaters
+        edge_cases: Mix in the edge cases described in the module docstring
+        now: Newest possible heard_at
+
+    Returns:
+        Tuple of (packets, normalized packets), in the same order
+    """
+    packets, repeater_keys = generate_packets(packet_count, repeater_count, seed=seed, now=now)
+    rng = random.Random(seed)
+    if edge_cases:
+        packets.extend(boundary_packets(rng, packets, now))
+
+    # Some repeaters always advertise their key in upper case, one in both cases
+    keys = sorted(repeater_keys)
+    upper = set(rng.sample(keys, len(keys) // 4))
+    mixed = rng.choice(keys) if rng.random() < 0.5 else None
+    naive = rng.random() < NAIVE_TIMESTAMP_SETS
+
+    pairs = []
+    for packet in packets:
+        hops = path_hops(packet.get("path"))
+        if edge_cases:
+            decoded = packet.get("decoded_payload")
+            if rng.random() < EDGE_CASE_RATE:
+                choice = rng.randrange(3)
+                if choice == 0:
+                    del packet["decoded_payload"]
+                elif choice == 1:
+                    packet["decoded_payload"] = None if decoded is None else {}
+                elif decoded:
+                    decoded.pop("public_key", None)
+            for field in ("snr", "rssi"):
+                if rng.random() < EDGE_CASE_RATE:
+                    value = packet.get(field)
+                    packet[field] = rng.choice([None, "bad", str(value), [], bool(value)])
+
+        normalized = copy.deepcopy(packet)
+        normalized["path"] = ",".join(hops)
+        if edge_cases:
+            decoded = packet.get("decoded_payload")
+            key = decoded.get("public_key") if decoded else None
+            if key and (key in upper or (key == mixed and rng.random() < 0.5)):
+                decoded["public_key"] = key.upper()
+            if rng.random() < EDGE_CASE_RATE:
+                raw, meant = odd_timestamp(rng, packet["heard_at"], naive)
+                if raw is None:
+                    del packet["heard_at"]
+                else:
+                    packet["heard_at"] = raw
+                if meant is None:
+                    del normalized["heard_at"]
+                else:
+                    normalized["heard_at"] = meant
+            if rng.random() < 4 * EDGE_CASE_RATE:
+                packet["path"], hops = reformat_path(rng, hops)
+                normalized["path"] = ",".join(hops)
+        pairs.append((packet, normalized))
+    rng.shuffle(pairs)
+    return [raw for raw, _ in pairs], [normalized for _, normalized in pairs]
+
+
+# ============================================================================
+# Deviations
+# ============================================================================
+
+def is_api_timestamp(value):
+    """True if value is a valid heard_at in the API's own format."""
+    if not isinstance(value, str):
+        return False
+    ms = parse_heard_at_ms(value)
+    return ms is not None and format_epoch_ms(ms) == value
+
+
+def reference_prefixes(path, prefixes):
+    """The prefixes the reference found in path (substring match)."""
+    text = str(path).lower()
+    return {prefix for prefix in prefixes if prefix in text} if text else set()
+
+
+class AffectedNodes:
+    """
+    Which DEVIATIONS can change each repeater's results in a packet set.
+
+    Keys are canonical (lowercase) public keys.
+    """
+
+    def __init__(self, pipeline, packets):
+        spellings = defaultdict(set)  # canonical key -> keys as advertised by Repeater Adverts
+        for packet in packets:
+            decoded = packet.get("decoded_payload") or {}
+            if packet.get("payload_type") == "Advert" and decoded.get("mode") == "Repeater" \
+                    and decoded.get("public_key"):
+                spellings[decoded["public_key"].lower()].add(decoded["public_key"])
+        self.mixed_case = {key for key, names in spellings.items() if len(names) > 1}
+        prefix_keys = Counter(key[:2] for key in spellings)
+        self.shared_prefixes = {prefix for prefix, count in prefix_keys.items() if count > 1}
+
+        prefixes = set(prefix_keys)
+        self.boundary_prefixes = set()  # matched by only one of the two implementations somewhere
+        self.odd_time_prefixes = set()  # credited by a packet with a non-API heard_at
+        self.odd_time_keys = set()
+        self.odd_advert_keys = set()
+        for packet in packets:
+            path = packet.get("path", "")
+            old = reference_prefixes(path, prefixes)
+            new = prefixes.intersection(pipeline.parse_path_hops(path))
+            self.boundary_prefixes |= old ^ new
+            if not is_api_timestamp(packet.get("heard_at")):
+                self.odd_time_prefixes |= old | new
+                decoded = packet.get("decoded_payload") or {}
+                key = (decoded.get("public_key") or "").lower()
+                if key:
+                    self.odd_time_keys.add(key)
+                    if packet.get("payload_type") == "Advert":
+                        self.odd_advert_keys.add(key)
+
+    def reasons(self, key):
+        """Set of DEVIATIONS names that apply to the repeater with canonical key."""
+        prefix = key[:2]
+        reasons = set()
+        if prefix in self.boundary_prefixes:
+            reasons.add("hop-boundary")
+        if prefix in self.shared_prefixes:
+            reasons.add("shared-prefix")
+        if key in self.odd_time_keys or prefix in self.odd_time_prefixes:
+            reasons.add("timestamp-format")
+        if key in self.odd_advert_keys:
+            reasons.add("advert-timestamp")
+        if key in self.mixed_case:
+            reasons.add("key-case")
+        return reasons
+
+
+# ============================================================================
+# Diffs
+# ============================================================================
+
+class Report:
+    """Differences found, per check and field, explained or not."""
+
+    def __init__(self):
+        self.compared = Counter()  # check -> values compared
+        self.explained = Counter()  # (check, field, reason) -> count
+        self.unexplained = []  # (check, detail)
+        self.additions = Counter()  # (check, field) -> count
+
+    def same(self, check, count=1):
+        self.compared[check] += count
+
+    def diff(self, check, field, ref_value, new_value, reason=None, where=""):
+        self.compared[check] += 1
+        if reason:
+            self.explained[check, field, reason] += 1
+        else:
+            self.unexplained.append((check, f"{where}{field}: reference {ref_value!r}, current {new_value!r}"))
+
+    def added(self, check, field):
+        self.additions[check, field] += 1
+
+
+def close(a, b, tolerance):
+    return (isinstance(a, (int, float)) and isinstance(b, (int, float))
+            and abs(a - b) <= tolerance + 1e-9)
+
+
+def node_field_reason(field, ref_value, new_value, reasons):
+    """The deviation that explains a node field difference, or None."""
+    if reasons & PRESENCE_REASONS:
+        return min(reasons & PRESENCE_REASONS)
+    if field in ACTIVITY_FIELDS and reasons & ACTIVITY_REASONS:
+        return min(reasons & ACTIVITY_REASONS)
+    if field in MEAN_FIELDS and close(ref_value, new_value, 0.1):
+        return "mean-rounding"
+    return None
+
+
+def nodes_by_key(document):
+    nodes = defaultdict(list)
+    for node in document["nodes"]:
+        nodes[node["publicKey"].lower()].append(node)
+    return nodes
+
+
+def diff_documents(report, check, ref_doc, new_doc, affected, allowed):
+    """
+    Compare a reference status document with a current one, field by field.
+
+    Args:
+        report: Report to add to
+        check: Name of the check
+        ref_doc: Document from build_reference_document()
+        new_doc: Document from build_status_document()
+        affected: AffectedNodes for the packets both were built from
+        allowed: DEVIATIONS names that may explain node differences
+    """
+    ref_nodes, new_nodes = nodes_by_key(ref_doc), nodes_by_key(new_doc)
+    explained_nodes = False
+    for key in sorted(ref_nodes.keys() | new_nodes.keys()):
+        reasons = affected.reasons(key) & allowed
+        old, new = ref_nodes.get(key, []), new_nodes.get(key, [])
+        if len(old) != 1 or len(new) != 1:
+            reason = min(reasons & PRESENCE_REASONS) if reasons & PRESENCE_REASONS else None
+            report.diff(check, "nodes", len(old), len(new), reason, where=f"node {key[:12]} count, ")
+            explained_nodes = explained_nodes or bool(reason)
+            continue
+        old, new = old[0], new[0]
+        for field, value in old.items():
+            if new.get(field) == value:
+                report.same(check)
+                continue
+            reason = node_field_reason(field, value, new.get(field), reasons)
+            report.diff(check, f"node.{field}", value, new.get(field), reason, where=f"node {key[:12]} ")
+            explained_nodes = explained_nodes or bool(reason)
+        for field in new.keys() - old.keys():
+            report.added(check, f"node.{field}")
+
+    for field in NETWORK_FIELDS + ("companionCount", "messageCount"):
+        value, new_value = ref_doc.get(field), new_doc.get(field)
+        if value == new_value:
+            report.same(check)
+            continue
+        reason = None
+        if field in NETWORK_FIELDS and explained_nodes:
+            reason = "derived"
+        elif field in MEAN_FIELDS and close(value, new_value, 0.1):
+            reason = "mean-rounding"
+        report.diff(check, field, value, new_value, reason)
+    if ref_doc["lastUpdated"] != new_doc["lastUpdated"]:
+        report.diff(check, "lastUpdated", ref_doc["lastUpdated"], new_doc["lastUpdated"], "wall-clock")
+    for field in new_doc.keys() - ref_doc.keys():
+        report.added(check, field)
+
+
+def comparable_node(node):
+    """A node record with lastSeen as epoch ms and publicKey in lower case."""
+    return dict(node, lastSeen=parse_heard_at_ms(node["lastSeen"]), publicKey=node["publicKey"].lower())
+
+
+def diff_invariance(report, check, raw_doc, normalized_doc):
+    """Compare two current documents, which must agree in every field."""
+    raw_nodes, normalized_nodes = nodes_by_key(raw_doc), nodes_by_key(normalized_doc)
+    for key in sorted(raw_nodes.keys() | normalized_nodes.keys()):
+        old, new = normalized_nodes.get(key, []), raw_nodes.get(key, [])
+        if len(old) != 1 or len(new) != 1:
+            report.diff(check, "nodes", len(old), len(new), where=f"node {key[:12]} count, ")
+            continue
+        old, new = comparable_node(old[0]), comparable_node(new[0])
+        for field in old.keys() | new.keys():
+            if old.get(field) == new.get(field):
+                report.same(check)
+            else:
+                report.diff(check, f"node.{field}", old.get(field), new.get(field), where=f"node {key[:12]} ")
+    for field in (normalized_doc.keys() | raw_doc.keys()) - {"nodes", "lastUpdated"}:
+        if normalized_doc.get(field) == raw_doc.get(field):
+            report.same(check)
+        else:
+            report.diff(check, field, normalized_doc.get(field), raw_doc.get(field))
+
+
+def diff_functions(report, pipeline, packets, now):
+    """Call the legacy stage functions of both implementations on identical inputs."""
+    repeaters = reference.aggregate_repeaters(reference.filter_repeater_packets(packets))
+    fresh = reference.filter_stale_repeaters(packets, repeaters, now=now)
+    current = pipeline.filter_stale_repeaters(packets, repeaters, now=now)
+    for key in sorted(fresh.keys() | current.keys()):
+        if (key in fresh) == (key in current):
+            report.same("filter_stale_repeaters")
+        else:
+            report.diff("filter_stale_repeaters", "kept", key in fresh, key in current,
+                        where=f"repeater {key[:12]} ")
+
+    ref_activity = reference.find_repeater_activity(packets, set(fresh))
+    new_activity = pipeline.find_repeater_activity(packets, set(fresh))
+    for key in sorted(fresh):
+        old, new = ref_activity[key], new_activity[key]
+        fields = {
+            "packet_count": (old["packet_count"], new["packet_count"]),
+            "last_heard_at": (old["last_heard_at"], new["last_heard_at"]),
+        }
+        for name in ("snr", "rssi"):
+            values, stats = old[f"{name}_values"], new[name]
+            mean = sum(values) / len(values) if values else None
+            new_mean = stats.mean if stats.count else None
+            if mean is not None and close(mean, new_mean, 1e-9 * abs(mean)):
+                new_mean = mean
+            fields[f"{name}.count"] = (len(values), stats.count)
+            fields[f"{name}.mean"] = (mean, new_mean)
+        for field, (value, new_value) in fields.items():
+            if value == new_value:
+                report.same("find_repeater_activity")
+            else:
+                report.diff("find_repeater_activity", field, value, new_value, where=f"repeater {key[:12]} ")
+
+    companions = reference.count_companion_nodes(packets, now=now)
+    for name, value, new_value in (
+            ("count_companion_nodes", companions, pipeline.count_companion_nodes(packets, now=now)),
+            ("count_messages", reference.count_messages(packets, now=now),
+             pipeline.count_messages(packets, now=now))):
+        if value == new_value:
+            report.same(name)
+        else:
+            report.diff(name, "count", value, new_value)
+
+    nodes = [reference.build_node_record(pk, packet, ref_activity.get(pk), now=now)
+             for pk, packet in fresh.items()]
+    stats = reference.calculate_network_stats(nodes, companions, now=now)
+    new_stats = pipeline.calculate_network_stats(nodes, companions)
+    for field, value in stats.items():
+        if field == "lastUpdated":
+            continue
+        if new_stats.get(field) == value:
+            report.same("calculate_network_stats")
+        else:
+            report.diff("calculate_network_stats", field, value, new_stats.get(field))
+    for field in new_stats.keys() - stats.keys():
+        report.added("calculate_network_stats", field)
+
+
+# ============================================================================
+# Checks
+# ============================================================================
+
+def current_document(pipeline, packets, now, columnar=False, attribution=True):
+    """The status document the current pipeline builds for packets (None without numpy)."""
+    index = None
+    if attribution:
+        index = pipeline.build_attribution_index(packets, now, [key for key, _ in pipeline.FETCH_SOURCES])
+    if columnar:
+        results = pipeline.analyze_columnar(packets, now, index)
+        if results is None:
+            return None
+    else:
+        results = pipeline.AnalysisEngine.with_default_consumers(now, index).run(packets)
+    return pipeline.build_status_document(results, now)
+
+
+def check_packet_set(report, pipeline, packets, normalized, now, columnar=False):
+    """
+    Run every check for one packet set.
+
+    Returns:
+        False if the packets hold no repeater Adverts (the reference
+        builds no document then)
+    """
+    ref_doc = reference.build_reference_document(normalized, now)
+    if ref_doc is None:
+        return False
+    affected = AffectedNodes(pipeline, normalized)
+    for engine in ["engine", "columnar"] if columnar else ["engine"]:
+        for attribution in (False, True):
+            new_doc = current_document(pipeline, normalized, now, engine == "columnar", attribution)
+            if new_doc is None:
+                continue
+            check = f"{engine}+attribution" if attribution else engine
+            diff_documents(report, check, ref_doc, new_doc, affected,
+                           {"shared-prefix"} if attribution else set())
+            if attribution:
+                raw_doc = current_document(pipeline, packets, now, engine == "columnar")
+                diff_invariance(report, f"{engine} raw input", raw_doc, new_doc)
+    diff_functions(report, pipeline, normalized, now)
+
+    try:
+        ref_doc = reference.build_reference_document(packets, now)
+    except TypeError as e:
+        report.diff("raw", "reference", str(e), None, "naive-timestamp")
+        return True
+    if ref_doc is not None:
+        diff_documents(report, "raw", ref_doc, current_document(pipeline, packets, now),
+                       AffectedNodes(pipeline, packets), set(DEVIATIONS))
+    return True
+
+
+def print_report(report, verbose=False):
+    """Print the comparison summary; returns True if every difference is explained."""
+    print(f"{'check':>24} {'compared':>9} {'explained':>10} {'unexplained':>12}")
+    unexplained = Counter(check for check, _ in report.unexplained)
+    for check, compared in sorted(report.compared.items()):
+        explained = sum(n for (c, _, _), n in report.explained.items() if c == check)
+        print(f"{check:>24} {compared:>9} {explained:>10} {unexplained[check]:>12}")
+
+    if report.explained:
+        print("\nExplained differences:")
+        by_reason = defaultdict(Counter)
+        for (check, field, reason), count in report.explained.items():
+            by_reason[reason][f"{check} {field}"] += count
+        for reason, fields in sorted(by_reason.items()):
+            print(f"  {reason}: {DEVIATIONS[reason]}")
+            for field, count in sorted(fields.items()):
+                print(f"      {count:>6}  {field}")
+    if report.additions:
+        print("\nFields only in the current output:")
+        for (check, field), count in sorted(report.additions.items()):
+            print(f"      {count:>6}  {check} {field}")
+
+    if report.unexplained:
+        shown = report.unexplained if verbose else report.unexplained[:SHOW_LIMIT]
+        print(f"\n{len(report.unexplained)} unexplained differences:")
+        for check, detail in shown:
+            print(f"  [{check}] {detail}")
+        if len(shown) < len(report.unexplained):
+            print(f"  ... {len(report.unexplained) - len(shown)} more (--verbose shows all)")
+        return False
+    print("\nNo unexplained differences")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff the pipeline against the frozen reference implementation")
+    parser.add_argument("--seeds", type=int, default=20, help="Packet sets to check (default: %(default)s)")
+    parser.add_argument("--seed", type=int, help="Check only the packet set with this seed")
+    parser.add_argument("--packets", type=int, default=3000, help="Packets per set (default: %(default)s)")
+    parser.add_argument("--repeaters", type=int, default=40, help="Repeaters per set (default: %(default)s)")
+    parser.add_argument("--no-edge-cases", action="store_true", help="Plain synthetic packets only")
+    parser.add_argument("--columnar", action="store_true", help="Also check the NumPy path (analyze_columnar)")
+    parser.add_argument("--verbose", action="store_true", help="Print every difference and the pipeline's log")
+    args = parser.parse_args()
+
+    pipeline = load_pipeline()
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+    seeds = [args.seed] if args.seed is not None else range(args.seeds)
+    report = Report()
+    skipped = 0
+    for seed in seeds:
+        packets, normalized = make_packet_set(seed, args.packets, args.repeaters, not args.no_edge_cases)
+        if not check_packet_set(report, pipeline, packets, normalized, FROZEN_NOW, args.columnar):
+            skipped += 1
+    logging.disable(logging.NOTSET)
+
+    print(f"Checked {len(seeds) - skipped} packet sets at {FROZEN_NOW.isoformat()}"
+          + (f" ({skipped} without repeater Adverts skipped)" if skipped else ""))
+    return 0 if print_report(report, args.verbose) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
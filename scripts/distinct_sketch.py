@@ -0,0 +1,254 @@
+"""
+Mergeable distinct counting for fetch-repeater-data.py.
+
+DistinctCounter counts distinct values (companion public keys, message
+hashes) exactly while it holds at most exact_limit of them, then turns
+into a HyperLogLog sketch of fixed size. DailyDistinct keeps one counter
+per UTC day, so a 1-, 7- or 30-day window is the union of the daily
+counters it covers, and counters from different runs, regions or worker
+processes union the same way.
+
+Error bound: a HyperLogLog with precision p has m = 2**p registers and a
+relative standard error of about 1.04 / sqrt(m) -- 0.81% at the default
+p = 14 (16 KiB per sketch), so ~95% of estimates fall within 1.6% of the
+true count. Counters still in exact mode hold the values themselves and
+have no error.
+"""
+
+import base64
+import hashlib
+import math
+from collections import Counter
+
+DEFAULT_PRECISION = 14
+DEFAULT_EXACT_LIMIT = 10_000
+DAY_MS = 86_400_000
+_HASH_BITS = 64
+
+
+def hash_value(value):
+    """Stable 64-bit hash of a string (Python's hash() differs per process)."""
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+def relative_error(precision=DEFAULT_PRECISION):
+    """Relative standard error of a HyperLogLog with 2**precision registers."""
+    return 1.04 / math.sqrt(1 << precision)
+
+
+def _sigma(x):
+    """sigma() of Ertl's estimator: x + sum over k >= 1 of x**(2**k) * 2**(k-1)."""
+    if x == 1:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x):
+    """tau() of Ertl's estimator."""
+    if x == 0 or x == 1:
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+class HyperLogLog:
+    """
+    HyperLogLog cardinality sketch (Flajolet et al.) over 64-bit hashes.
+    """
+
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision=DEFAULT_PRECISION):
+        if not 4 <= precision <= 18:
+            raise ValueError(f"precision must be between 4 and 18, not {precision}")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add_hash(self, h):
+        """Add a 64-bit hash."""
+        suffix_bits = _HASH_BITS - self.precision
+        index = h >> suffix_bits
+        rank = suffix_bits - (h & ((1 << suffix_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """Union another sketch of the same precision into this one."""
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge precision {other.precision} into {self.precision}")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        """
+        Estimated number of distinct values added.
+
+        Uses Ertl's improved estimator ("New cardinality estimation
+        algorithms for HyperLogLog sketches", 2017), which stays unbiased
+        from empty to full sketches without the empirical bias tables or
+        linear-counting switchover of the original HyperLogLog.
+        """
+        m = len(self.registers)
+        q = _HASH_BITS - self.precision
+        histogram = Counter(self.registers)
+        z = m * _tau(1 - histogram.get(q + 1, 0) / m)
+        for rank in range(q, 0, -1):
+            z = 0.5 * (z + histogram.get(rank, 0))
+        z += m * _sigma(histogram.get(0, 0) / m)
+        return round(m * m / (2 * math.log(2)) / z)
+
+    def to_dict(self):
+        return {"p": self.precision, "registers": base64.b64encode(self.registers).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["p"])
+        sketch.registers = bytearray(base64.b64decode(data["registers"]))
+        return sketch
+
+
+class DistinctCounter:
+    """
+    Distinct count that is exact up to exact_limit values, then a HyperLogLog.
+
+    exact_limit=None keeps it exact at any size (exact mode); 0 makes it
+    a sketch from the start.
+    """
+
+    __slots__ = ("precision", "exact_limit", "values", "sketch")
+
+    def __init__(self, precision=DEFAULT_PRECISION, exact_limit=DEFAULT_EXACT_LIMIT):
+        self.precision = precision
+        self.exact_limit = exact_limit
+        self.values = set()  # exact mode: the values themselves (hashed only on conversion)
+        self.sketch = None  # approximate mode: a HyperLogLog
+
+    @property
+    def exact(self):
+        """True while the count is exact."""
+        return self.sketch is None
+
+    def add(self, value):
+        """Add a string value."""
+        if self.sketch is not None:
+            self.sketch.add_hash(hash_value(value))
+            return
+        self.values.add(value)
+        if self.exact_limit is not None and len(self.values) > self.exact_limit:
+            self._to_sketch()
+
+    def _to_sketch(self):
+        self.sketch = HyperLogLog(self.precision)
+        for value in self.values:
+            self.sketch.add_hash(hash_value(value))
+        self.values = set()
+
+    def merge(self, other):
+        """Union another counter into this one."""
+        if other.sketch is None:
+            if self.sketch is None:
+                self.values |= other.values
+                if self.exact_limit is not None and len(self.values) > self.exact_limit:
+                    self._to_sketch()
+            else:
+                for value in other.values:
+                    self.sketch.add_hash(hash_value(value))
+            return self
+        if self.sketch is None:
+            self._to_sketch()
+        self.sketch.merge(other.sketch)
+        return self
+
+    def count(self):
+        """Distinct values added (estimated once in approximate mode)."""
+        return len(self.values) if self.sketch is None else self.sketch.count()
+
+    def to_dict(self):
+        if self.sketch is None:
+            return {"p": self.precision, "exact": sorted(self.values)}
+        return self.sketch.to_dict()
+
+    @classmethod
+    def from_dict(cls, data, exact_limit=DEFAULT_EXACT_LIMIT):
+        counter = cls(data["p"], exact_limit)
+        if "exact" in data:
+            for value in data["exact"]:
+                counter.add(value)
+        else:
+            counter.sketch = HyperLogLog.from_dict(data)
+        return counter
+
+
+class DailyDistinct:
+    """
+    One DistinctCounter per UTC day.
+
+    Windows are answered in whole days: the N-day window ending at now
+    is the union of every day that overlaps it. Callers that need a hard
+    cutoff (such as the 30-day statistics window) simply do not add
+    values from before it.
+    """
+
+    __slots__ = ("precision", "exact_limit", "days")
+
+    def __init__(self, precision=DEFAULT_PRECISION, exact_limit=DEFAULT_EXACT_LIMIT):
+        self.precision = precision
+        self.exact_limit = exact_limit
+        self.days = {}  # day start (epoch ms) -> DistinctCounter
+
+    def add(self, heard_ms, value):
+        """Add value to the counter of the UTC day containing heard_ms."""
+        day = heard_ms - heard_ms % DAY_MS
+        counter = self.days.get(day)
+        if counter is None:
+            counter = self.days[day] = DistinctCounter(self.precision, self.exact_limit)
+        counter.add(value)
+
+    def merge(self, other):
+        """Union another DailyDistinct (e.g. another region) day by day."""
+        for day, counter in other.days.items():
+            current = self.days.get(day)
+            if current is None:
+                current = self.days[day] = DistinctCounter(self.precision, self.exact_limit)
+            current.merge(counter)
+        return self
+
+    def window(self, days, now_ms):
+        """Union of the daily counters overlapping the last days days."""
+        first_day = now_ms - days * DAY_MS
+        first_day -= first_day % DAY_MS
+        union = DistinctCounter(self.precision, self.exact_limit)
+        for day, counter in self.days.items():
+            if day >= first_day:
+                union.merge(counter)
+        return union
+
+    def count(self, days, now_ms):
+        """Distinct values in the last days days (see window())."""
+        return self.window(days, now_ms).count()
+
+    def prune(self, before_ms):
+        """Drop days that end at or before before_ms."""
+        self.days = {day: c for day, c in self.days.items() if day + DAY_MS > before_ms}
+
+    def to_dict(self):
+        return {str(day): counter.to_dict() for day, counter in sorted(self.days.items())}
+
+    @classmethod
+    def from_dict(cls, data, precision=DEFAULT_PRECISION, exact_limit=DEFAULT_EXACT_LIMIT):
+        daily = cls(precision, exact_limit)
+        daily.days = {int(day): DistinctCounter.from_dict(d, exact_limit) for day, d in data.items()}
+        return daily
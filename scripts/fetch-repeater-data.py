@@ -4,93 +4,296 @@ Fetch repeater status from letsmesh.net API using cloudscraper.
 
 The letsmesh.net API is behind Cloudflare protection. This script uses
 cloudscraper to handle Cloudflare's anti-bot challenges and fetch the
-JSON data directly via HTTP.
+JSON data directly via HTTP. Cookies and response validators are kept
+in data/fetch-cache between runs (see fetch_cache.py), so requests are
+conditional and a run whose responses did not change skips the analysis.
+
+Fetched packets are kept in a local SQLite packet store (see
+packet_store.py) so each run only needs what is new since the last fetch
+and the 30-day statistics cover a full 30 days.
+
+Each run also appends 5-minute history buckets per repeater (see
+rollups.py) and exports fixed-size chart files to data/history, and
+updates the hop-level topology graph exported to data/topology.json
+(see topology.py). Repeater addresses come from a local gazetteer (see
+geocode.py). The status document is also split into a summary, a node
+index and per-node files under data/status for lazy loading (see
+shards.py). With --serve the daemon also serves the status over HTTP
+and pushes changes as Server-Sent Events (see status_server.py).
+With --replay a directory of archived API responses is analyzed on a
+process pool instead, to backfill history. --input and --replay also
+read compact packet archives written by archive-packets.py (see
+packet_archive.py).
 
 If the fetch fails, the script leaves the existing data file unchanged.
 """
 
+import argparse
+import codecs
+import gzip
+import itertools
 import json
 import logging
+import os
+import pickle
+import random
+import re
+import signal
+import tempfile
 import time
 import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from datetime import datetime, timezone, timedelta
+from functools import lru_cache
 from pathlib import Path
+from urllib.parse import urlsplit
 
-# Configure logging
+import rollups
+from attribution import AttributionIndex
+from distinct_sketch import DailyDistinct, DistinctCounter, relative_error
+from fetch_cache import FetchCache
+from geocode import ReverseGeocoder
+from metrics import METRICS
+from output_writer import JsonOutput, semantic_content, write_atomic
+from packet_archive import ARCHIVE_SUFFIX, PacketArchive, is_archive, iter_archives
+from packet_store import CopyIndex, PacketStore, packet_store_key
+from poll_scheduler import PollScheduler
+from shards import write_shards
+from status_server import StatusState, make_server
+from stream_stats import RunningStats
+from timestamps import datetime_to_ms, format_epoch_ms, ms_to_datetime, parse_heard_at_ms
+from topology import OBSERVER, TopologyGraph
+
+# Configure logging (level from LOG_LEVEL, overridden by --log-level)
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
 # Configuration - API settings
-API_ENDPOINT = "https://api.letsmesh.net/api/packets/filtered"
+API_ENDPOINT = os.environ.get("LETSMESH_API_URL", "https://api.letsmesh.net/api/packets/filtered")
+API_SINCE_PARAM = None  # Query parameter for "heard after" filtering, if the API supports one
 API_TIMEOUT = 30  # seconds
 API_RETRIES = 3
 API_LIMIT = 5000  # Request up to 5000 records (API defaults to 500 if omitted)
+API_PAGE_PARAM = "before"  # Cursor parameter used to page past API_LIMIT
+API_MAX_PAGES = 5  # Maximum pages requested per source per run
+FETCH_WORKERS = 4  # Concurrent source fetches
+STREAM_CHUNK_SIZE = 64 * 1024  # bytes read per chunk when streaming responses
 ONLINE_THRESHOLD_MINUTES = 240  # Node is online if heard within last 240 minutes
 ADVERT_STALE_DAYS = 3  # Exclude repeaters with no advert in this many days
+STATS_WINDOW_DAYS = 30  # Window for companion/message counts and packet retention
+DISTINCT_WINDOWS_DAYS = (1, 7, STATS_WINDOW_DAYS)  # companion/message counts published per window
+DISTINCT_EXACT_LIMIT = 10_000  # distinct counts are exact up to this many values, HyperLogLog above
+DISTINCT_PRECISION = 14  # HyperLogLog registers = 2**precision (error ~1.04/sqrt(2**precision))
+FETCH_UNCHANGED_MAX_AGE = 3600  # seconds an unchanged fetch may reuse the last analysis
+DAEMON_INTERVAL = 300  # seconds between polls in --daemon mode
+DAEMON_JITTER = 0.1  # +/- fraction of the interval added to each poll delay
+DAEMON_MAX_BACKOFF = 3600  # longest delay after repeated failed polls, seconds
+POLL_MIN_INTERVAL = 60  # --adaptive: shortest delay between polls, seconds
+POLL_MAX_INTERVAL = 1800  # --adaptive: longest delay between polls, seconds
+POLL_REQUEST_BUDGET = 60  # --adaptive: API requests per sliding hour
+POLL_DUE_SLACK = 30  # --adaptive without --daemon: a run this close to due polls anyway, seconds
 RSSI_MIN = -120  # dBm
 RSSI_MAX = 0  # dBm
+ADVERT_FIELDS = ("payload_type", "decoded_payload", "heard_at", "path")  # read from archives for attribution
+_PATH_SEPARATORS = re.compile(r"[^0-9a-f]+")  # anything between hex hop tokens
 
 # Configuration - Mesh Observer Settings
 # Set these to your observer node's public key and region
 OBSERVER_PUBLIC_KEY = "2b63bf3df73da29f30df1308aca6480e9f09abb43a8993533465a5fed60ccad7"  # lowercase hex
 MESH_REGION = "CMH"  # Geographic region (e.g., CMH for Columbus, OH)
 
+# (observer public key, region) pairs to aggregate. Add neighboring
+# observers/regions here; packets heard by several are merged by hash.
+FETCH_SOURCES = [
+    (OBSERVER_PUBLIC_KEY, MESH_REGION),
+]
+
 # Determine output path
 SCRIPT_DIR = Path(__file__).parent
 PROJECT_ROOT = SCRIPT_DIR.parent
 OUTPUT_FILE = PROJECT_ROOT / "data" / "repeater-status.json"
 BACKUP_FILE = PROJECT_ROOT / "data" / "repeater-status.json.bak"
+PACKET_STORE_FILE = PROJECT_ROOT / "data" / "packet-store.sqlite3"
+METRICS_FILE = PROJECT_ROOT / "data" / "repeater-metrics.json"
+ROLLUP_DIR = PROJECT_ROOT / "data" / "rollups"
+HISTORY_DIR = PROJECT_ROOT / "data" / "history"
+TOPOLOGY_FILE = PROJECT_ROOT / "data" / "topology.json"
+TOPOLOGY_STATE_FILE = PROJECT_ROOT / "data" / "topology-state.json"
+SHARD_DIR = PROJECT_ROOT / "data" / "status"
+GAZETTEER_FILE = PROJECT_ROOT / "data" / "gazetteer.txt.gz"  # GeoNames dump or CSV, see geocode.py
+GEOCODE_CACHE_FILE = PROJECT_ROOT / "data" / "geocode-cache.json"
+FETCH_CACHE_DIR = PROJECT_ROOT / "data" / "fetch-cache"
+POLL_SCHEDULE_FILE = PROJECT_ROOT / "data" / "poll-schedule.json"
+
+# Cookies, validators and last responses kept between runs (set by main)
+FETCH_CACHE = None
+
+# Shared cloudscraper sessions, one per API host
+_SCRAPERS = {}
+_SCRAPERS_LOCK = threading.Lock()
+
+# API requests sent by this process (for the poll scheduler's request budget)
+_REQUEST_COUNT = 0
+_REQUEST_LOCK = threading.Lock()
+
 
+def count_request():
+    """Count one API request (fetch_requests metric and requests_sent())."""
+    global _REQUEST_COUNT
+    with _REQUEST_LOCK:
+        _REQUEST_COUNT += 1
+    METRICS.incr("fetch_requests")
 
-def fetch_api_data(observer_key, region, max_retries=API_RETRIES):
+
+def requests_sent():
+    """Number of API requests sent so far by this process."""
+    with _REQUEST_LOCK:
+        return _REQUEST_COUNT
+
+
+def get_scraper(host):
     """
-    Fetch packet data from letsmesh.net API using cloudscraper.
+    Return the shared cloudscraper session for host, creating it on first use.
     
-    Uses cloudscraper to handle Cloudflare's anti-bot challenges and fetch
-    JSON data directly via HTTP, without needing a full browser.
+    One session per host keeps Cloudflare clearance cookies across retries,
+    pages and sources instead of solving the challenge again each time.
+    The underlying cookie jar and connection pool are thread-safe, so the
+    session is shared by concurrent source fetches. A new session starts
+    with the cookies and User-Agent saved in FETCH_CACHE by an earlier run.
     
     Args:
-        observer_key: Observer node public key
-        region: Geographic region (e.g., CMH)
-        max_retries: Number of retry attempts
+        host: Host name the session is for
         
     Returns:
-        List of packet dictionaries or None if fetch fails
+        cloudscraper session, or None if cloudscraper is not installed
     """
-    if not observer_key or observer_key == "your_observer_public_key_here":
-        logger.warning("OBSERVER_PUBLIC_KEY not configured.")
-        return None
-    
+    with _SCRAPERS_LOCK:
+        scraper = _SCRAPERS.get(host)
+        if scraper is None:
+            try:
+                import cloudscraper
+            except ImportError:
+                logger.error("cloudscraper not installed. Install with: pip install cloudscraper")
+                return None
+            scraper = cloudscraper.create_scraper(
+                browser={
+                    'browser': 'chrome',
+                    'platform': 'linux',
+                }
+            )
+            if FETCH_CACHE is not None:
+                FETCH_CACHE.restore_session(host, scraper)
+            _SCRAPERS[host] = scraper
+        return scraper
+
+
+def reset_scraper(host):
+    """Drop the cached session for host so the next request starts fresh."""
+    with _SCRAPERS_LOCK:
+        _SCRAPERS.pop(host, None)
+    if FETCH_CACHE is not None:
+        FETCH_CACHE.forget_session(host)
+
+
+def is_challenge(text):
+    """True if a response body looks like a Cloudflare challenge page."""
+    return "Just a moment" in text or "Cloudflare" in text
+
+
+def conditional_headers(api_url):
+    """If-None-Match / If-Modified-Since for api_url from FETCH_CACHE."""
+    return FETCH_CACHE.request_headers(api_url) if FETCH_CACHE is not None else {}
+
+
+def wire_size(response):
+    """Bytes transferred for a consumed response body (compressed size), or None."""
     try:
-        import cloudscraper
-    except ImportError:
-        logger.error("cloudscraper not installed. Install with: pip install cloudscraper")
-        return None
+        size = response.raw.tell()
+        if size:
+            return size
+    except Exception:
+        pass
+    length = response.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+def record_transfer(response):
+    """
+    Count a finished 200 response's size before and after decompression.
+
+    bytes_downloaded is the decoded body, bytes_transferred what came over
+    the wire; responses_compressed counts bodies sent with a
+    Content-Encoding, so an API that stops compressing shows up in metrics.
+    """
+    encoding = response.headers.get("Content-Encoding")
+    transferred = wire_size(response)
+    if transferred is not None:
+        METRICS.incr("bytes_transferred", transferred)
+    if encoding:
+        METRICS.incr("responses_compressed")
+    logger.info(f"Transferred {transferred if transferred is not None else '?'} bytes "
+                f"({encoding or 'not compressed'})")
+    return transferred
+
+
+def fetch_api_page(api_url, max_retries=API_RETRIES):
+    """
+    Fetch one page of packets, retrying with exponential backoff.
+    
+    With FETCH_CACHE set the request is conditional; a 304 response is
+    answered from the cached body, and a 200 response replaces it.
     
-    api_url = f"{API_ENDPOINT}?observer={observer_key}&region={region}&limit={API_LIMIT}"
+    Args:
+        api_url: Full request URL
+        max_retries: Number of retry attempts
+        
+    Returns:
+        List of packet dictionaries or None if fetch fails
+    """
+    host = urlsplit(api_url).netloc
     
     for attempt in range(max_retries):
+        if attempt:
+            METRICS.incr("fetch_retries")
         try:
             logger.info(f"Fetching API data (attempt {attempt + 1}/{max_retries})...")
             
-            scraper = cloudscraper.create_scraper(
-                browser={
-                    'browser': 'chrome',
-                    'platform': 'linux',
-                }
-            )
+            scraper = get_scraper(host)
+            if scraper is None:
+                return None
             
             logger.info(f"Loading: {api_url[:70]}...")
-            response = scraper.get(api_url, timeout=API_TIMEOUT)
+            response = scraper.get(api_url, timeout=API_TIMEOUT, headers=conditional_headers(api_url))
+            count_request()
             
-            logger.debug(f"Response status: {response.status_code}")
-            logger.debug(f"Response content length: {len(response.text)} chars")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Response status: {response.status_code}")
+                logger.debug(f"Response content length: {len(response.content)} bytes")
             
+            if response.status_code == 304 and FETCH_CACHE is not None:
+                body = FETCH_CACHE.cached_body(api_url)
+                if body is not None:
+                    METRICS.incr("responses_not_modified")
+                    FETCH_CACHE.save_session(host, scraper)
+                    data = json.loads(body)
+                    logger.info(f"Not modified; using {len(data)} cached packets")
+                    return data
+                # The cached body is gone; the next attempt asks unconditionally
+                continue
+            
+            METRICS.incr("bytes_downloaded", len(response.content))
             if response.status_code != 200:
+                METRICS.incr("http_errors")
                 logger.warning(f"HTTP {response.status_code} response")
+                if is_challenge(response.text):
+                    METRICS.incr("cloudflare_challenges")
+                    logger.warning("Got Cloudflare challenge page despite cloudscraper")
+                    reset_scraper(host)
                 if attempt < max_retries - 1:
                     wait_time = 2 ** attempt
                     logger.info(f"Waiting {wait_time}s before retry...")
@@ -100,9 +303,17 @@ def fetch_api_data(observer_key, region, max_retries=API_RETRIES):
             # Try to parse JSON directly
             try:
                 data = response.json()
+                if isinstance(data, list):
+                    transferred = record_transfer(response)
+                    if FETCH_CACHE is not None:
+                        if not FETCH_CACHE.store(api_url, response.headers, response.content, transferred):
+                            METRICS.incr("responses_unchanged")
+                            logger.info("Response is identical to the cached one")
+                        FETCH_CACHE.save_session(host, scraper)
                 if isinstance(data, list) and len(data) > 0:
                     logger.info(f"Successfully fetched {len(data)} packets")
-                    logger.debug(f"Sample packet 1: payload_type={data[0].get('payload_type')}")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(f"Sample packet 1: payload_type={data[0].get('payload_type')}")
                     return data
                 elif isinstance(data, list):
                     logger.warning("API returned an empty list")
@@ -111,8 +322,11 @@ def fetch_api_data(observer_key, region, max_retries=API_RETRIES):
                     logger.warning(f"Unexpected response type: {type(data).__name__}")
             except json.JSONDecodeError:
                 # Response might contain HTML (Cloudflare challenge page) 
-                if "Just a moment" in response.text or "Cloudflare" in response.text:
+                if is_challenge(response.text):
+                    METRICS.incr("cloudflare_challenges")
                     logger.warning("Got Cloudflare challenge page despite cloudscraper")
+                    # Start the next attempt with a fresh session
+                    reset_scraper(host)
                 else:
                     logger.warning(f"Response is not valid JSON (first 200 chars): {response.text[:200]}")
             
@@ -132,27 +346,500 @@ def fetch_api_data(observer_key, region, max_retries=API_RETRIES):
     return None
 
 
+def fetch_api_data(observer_key, region, max_retries=API_RETRIES, since=None):
+    """
+    Fetch packet data from letsmesh.net API using cloudscraper.
+    
+    Uses cloudscraper to handle Cloudflare's anti-bot challenges and fetch
+    JSON data directly via HTTP, without needing a full browser.
+    
+    When a page comes back full (API_LIMIT packets), older packets are
+    requested with API_PAGE_PARAM set to the oldest heard_at seen so far,
+    up to API_MAX_PAGES pages. Paging stops early once a page reaches the
+    since high-water mark or adds no packets not already seen.
+    
+    Args:
+        observer_key: Observer node public key
+        region: Geographic region (e.g., CMH)
+        max_retries: Number of retry attempts per page
+        since: Optional heard_at high-water mark; sent as API_SINCE_PARAM
+               when that is configured, and used to stop paging
+        
+    Returns:
+        List of packet dictionaries or None if fetch fails
+    """
+    if not observer_key or observer_key == "your_observer_public_key_here":
+        logger.warning("OBSERVER_PUBLIC_KEY not configured.")
+        return None
+    
+    base_url = f"{API_ENDPOINT}?observer={observer_key}&region={region}&limit={API_LIMIT}"
+    if since and API_SINCE_PARAM:
+        base_url += f"&{API_SINCE_PARAM}={since}"
+    
+    packets = []
+    seen = set()
+    cursor = None
+    for page in range(API_MAX_PAGES):
+        api_url = base_url
+        if cursor:
+            api_url += f"&{API_PAGE_PARAM}={cursor}"
+        data = fetch_api_page(api_url, max_retries)
+        if data is None:
+            # A failed first page fails the fetch; later pages keep what we have
+            return packets if page else None
+        
+        added = 0
+        for packet in data:
+            key = (packet.get("id"), packet.get("hash"), packet.get("heard_at"))
+            if key not in seen:
+                seen.add(key)
+                packets.append(packet)
+                added += 1
+        
+        if len(data) < API_LIMIT or not added or not API_PAGE_PARAM:
+            break
+        oldest = min((p.get("heard_at") or "" for p in data), default="")
+        if not oldest or (since and oldest <= since):
+            break
+        cursor = oldest
+        logger.info(f"Page {page + 1} was full; requesting packets before {cursor}")
+    
+    return packets
+
+
+def merge_packets(packet_lists):
+    """
+    Merge packets fetched from several sources.
+    
+    The same transmission heard by several observers shares a hash. Copies
+    with the same hash and path are merged, keeping the earliest heard_at.
+    A copy that took a different path is kept, because each distinct path
+    is separate evidence of which repeaters relayed it.
+    
+    Args:
+        packet_lists: Iterable of packet lists, one per source
+        
+    Returns:
+        Merged list of packet dictionaries
+    """
+    merged = {}
+    for packets in packet_lists:
+        for packet in packets:
+            packet_hash = packet.get("hash")
+            if packet_hash:
+                key = (packet_hash, parse_path_hops(packet.get("path")))
+            else:
+                key = ("id", packet.get("id"), packet.get("heard_at"))
+            current = merged.get(key)
+            if current is None or (packet.get("heard_at") or "") < (current.get("heard_at") or ""):
+                merged[key] = packet
+    return list(merged.values())
+
+
+def fetch_sources(sources, since=None, max_workers=FETCH_WORKERS):
+    """
+    Fetch several (observer, region) sources concurrently and merge them.
+    
+    Wall-clock time follows the slowest source rather than the sum.
+    
+    Args:
+        sources: List of (observer_key, region) tuples
+        since: Optional heard_at high-water mark (see fetch_api_data)
+        max_workers: Size of the worker pool
+        
+    Returns:
+        Merged list of packets, or None if every source failed
+    """
+    if len(sources) == 1:
+        observer_key, region = sources[0]
+        return fetch_api_data(observer_key, region, since=since)
+    
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sources)))) as pool:
+        futures = {
+            pool.submit(fetch_api_data, observer_key, region, since=since): (observer_key, region)
+            for observer_key, region in sources
+        }
+        for future in as_completed(futures):
+            observer_key, region = futures[future]
+            data = future.result()
+            if data is None:
+                logger.warning(f"Source {observer_key[:8]}/{region} failed")
+            else:
+                logger.info(f"Source {observer_key[:8]}/{region}: {len(data)} packets")
+                results.append(data)
+    
+    if not results:
+        return None
+    packets = merge_packets(results)
+    logger.info(f"Merged {sum(len(r) for r in results)} packets from {len(results)} sources into {len(packets)}")
+    return packets
+
+
+# ============================================================================
+# Streaming ingestion
+#
+# response.json() holds the body text and the full decoded list at once.
+# The helpers below parse the packet array incrementally from the response
+# body (or an archived dump), yielding packets as they arrive, so memory
+# stays flat and analysis overlaps with the download.
+# ============================================================================
+
+class FetchError(Exception):
+    """Raised when a streamed fetch fails before yielding any packet."""
+
+
+class NotJSONArrayError(ValueError):
+    """Raised when a stream does not start with a JSON array (e.g. a challenge page)."""
+
+    def __init__(self, head):
+        super().__init__(f"Response is not a JSON array (first 200 chars): {head[:200]}")
+        self.head = head
+
+
+def iter_json_array(chunks):
+    """
+    Incrementally parse a top-level JSON array from text or byte chunks.
+    
+    Args:
+        chunks: Iterable of str or bytes chunks (e.g. response.iter_content())
+        
+    Yields:
+        Each element of the array as soon as it is complete
+        
+    Raises:
+        NotJSONArrayError: If the input does not start with '['
+        json.JSONDecodeError: If the array is malformed or truncated
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    started = False
+    expect_value = True
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = text_decoder.decode(chunk)
+        buf = buf[pos:] + chunk
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos >= len(buf):
+                break
+            char = buf[pos]
+            if not started:
+                if char != "[":
+                    raise NotJSONArrayError(buf[pos:pos + 200])
+                started = True
+                pos += 1
+            elif char == "]":
+                return
+            elif not expect_value:
+                if char != ",":
+                    raise json.JSONDecodeError("Expected ',' or ']'", buf, pos)
+                expect_value = True
+                pos += 1
+            else:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    break  # element is incomplete; wait for the next chunk
+                if end == len(buf) and not isinstance(value, (dict, list)):
+                    break  # a bare scalar may continue in the next chunk
+                pos = end
+                expect_value = False
+                yield value
+    if not started:
+        raise NotJSONArrayError(buf)
+    raise json.JSONDecodeError("Unterminated JSON array", buf, len(buf))
+
+
+def iter_packet_file(path):
+    """
+    Stream packets from an archived API response (.json or .json.gz) or
+    a packet archive (.pktar, see packet_archive.py).
+    
+    Args:
+        path: Path to a file containing a JSON array of packets, or a
+              packet archive
+        
+    Yields:
+        Packet dictionaries
+    """
+    path = Path(path)
+    if is_archive(path):
+        with PacketArchive(path) as archive:
+            yield from archive.iter_packets()
+        return
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rb") as f:
+        yield from iter_json_array(iter(lambda: f.read(STREAM_CHUNK_SIZE), b""))
+
+
+def count_bytes(chunks):
+    """Pass chunks through, adding their size to the bytes_downloaded counter."""
+    for chunk in chunks:
+        METRICS.incr("bytes_downloaded", len(chunk))
+        yield chunk
+
+
+def cache_chunks(chunks, writer):
+    """Pass chunks through, also writing them to a fetch cache BodyWriter."""
+    for chunk in chunks:
+        writer.write(chunk)
+        yield chunk
+
+
+def stream_api_page(api_url, max_retries=API_RETRIES):
+    """
+    Stream one page of packets from the API.
+    
+    Retries with backoff as fetch_api_page does, but only until the first
+    packet has been yielded; a failure after that is raised to the caller.
+    With FETCH_CACHE set the request is conditional like fetch_api_page's:
+    a 304 response streams the cached body, and a 200 response is cached
+    as it is parsed.
+    
+    Args:
+        api_url: Full request URL
+        max_retries: Number of retry attempts
+        
+    Yields:
+        Packet dictionaries
+        
+    Raises:
+        FetchError: If no attempt produced a packet stream
+    """
+    host = urlsplit(api_url).netloc
+    for attempt in range(max_retries):
+        if attempt:
+            METRICS.incr("fetch_retries")
+            wait_time = 2 ** (attempt - 1)
+            logger.info(f"Waiting {wait_time}s before retry...")
+            time.sleep(wait_time)
+        scraper = get_scraper(host)
+        if scraper is None:
+            raise FetchError("cloudscraper not installed")
+        writer = None
+        not_modified = False
+        try:
+            logger.info(f"Streaming: {api_url[:70]}... (attempt {attempt + 1}/{max_retries})")
+            response = scraper.get(api_url, timeout=API_TIMEOUT, stream=True, headers=conditional_headers(api_url))
+            count_request()
+            if response.status_code == 304 and FETCH_CACHE is not None:
+                response.close()
+                body = FETCH_CACHE.cached_body(api_url)
+                if body is None:
+                    continue
+                METRICS.incr("responses_not_modified")
+                logger.info("Not modified; streaming the cached response")
+                not_modified = True
+                chunks = [body]
+            elif response.status_code != 200:
+                METRICS.incr("http_errors")
+                logger.warning(f"HTTP {response.status_code} response")
+                if is_challenge(response.text):
+                    METRICS.incr("cloudflare_challenges")
+                    logger.warning("Got Cloudflare challenge page despite cloudscraper")
+                    reset_scraper(host)
+                response.close()
+                continue
+            else:
+                chunks = count_bytes(response.iter_content(chunk_size=STREAM_CHUNK_SIZE))
+                if FETCH_CACHE is not None:
+                    writer = FETCH_CACHE.body_writer(api_url)
+                    chunks = cache_chunks(chunks, writer)
+            packets = iter_json_array(chunks)
+            first = next(packets, None)
+        except NotJSONArrayError as e:
+            if writer is not None:
+                writer.abort()
+            if "Just a moment" in e.head or "Cloudflare" in e.head:
+                METRICS.incr("cloudflare_challenges")
+                logger.warning("Got Cloudflare challenge page despite cloudscraper")
+                reset_scraper(host)
+            else:
+                logger.warning(str(e))
+            continue
+        except Exception as e:
+            if writer is not None:
+                writer.abort()
+            logger.warning(f"Fetch error: {str(e)[:200]} (attempt {attempt + 1}/{max_retries})")
+            continue
+        
+        count = 0
+        try:
+            with response:
+                if first is not None:
+                    yield first
+                    count = 1
+                    for packet in packets:
+                        yield packet
+                        count += 1
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            raise
+        if not not_modified:
+            transferred = record_transfer(response)
+            if writer is not None and not writer.commit(response.headers, transferred):
+                METRICS.incr("responses_unchanged")
+                logger.info("Response is identical to the cached one")
+        if FETCH_CACHE is not None:
+            FETCH_CACHE.save_session(host, scraper)
+        logger.info(f"Streamed {count} packets")
+        return
+    raise FetchError(f"Failed to stream API data after {max_retries} attempts")
+
+
+def stream_api_data(observer_key, region, since=None, seen=None):
+    """
+    Stream packets for one source, paging like fetch_api_data.
+    
+    Args:
+        observer_key: Observer node public key
+        region: Geographic region (e.g., CMH)
+        since: Optional heard_at high-water mark
+        seen: Optional set of (hash, hops) keys shared across sources;
+              packets already in it are skipped (first copy wins)
+        
+    Yields:
+        Packet dictionaries
+    """
+    base_url = f"{API_ENDPOINT}?observer={observer_key}&region={region}&limit={API_LIMIT}"
+    if since and API_SINCE_PARAM:
+        base_url += f"&{API_SINCE_PARAM}={since}"
+    
+    cursor = None
+    for page in range(API_MAX_PAGES):
+        api_url = base_url + (f"&{API_PAGE_PARAM}={cursor}" if cursor else "")
+        count = 0
+        added = 0
+        oldest = None
+        for packet in stream_api_page(api_url):
+            count += 1
+            heard_at = packet.get("heard_at") or ""
+            if heard_at and (oldest is None or heard_at < oldest):
+                oldest = heard_at
+            if seen is not None and packet.get("hash"):
+                key = (packet["hash"], parse_path_hops(packet.get("path")))
+                if key in seen:
+                    continue
+                seen.add(key)
+            added += 1
+            yield packet
+        
+        if count < API_LIMIT or not added or not API_PAGE_PARAM:
+            return
+        if not oldest or (since and oldest <= since):
+            return
+        cursor = oldest
+
+
+def stream_sources(sources, since=None):
+    """
+    Open a packet stream over all sources, one after another.
+    
+    Packets heard by several sources are dropped after the first copy with
+    the same hash and path. The first packet is fetched eagerly so that a
+    failed fetch is reported before any analysis starts.
+    
+    Args:
+        sources: List of (observer_key, region) tuples
+        since: Optional heard_at high-water mark
+        
+    Returns:
+        Iterator over packets, or None if the first source failed outright
+    """
+    seen = set() if len(sources) > 1 else None
+    streams = itertools.chain.from_iterable(
+        stream_api_data(observer_key, region, since, seen)
+        for observer_key, region in sources
+        if observer_key and observer_key != "your_observer_public_key_here"
+    )
+    try:
+        first = next(streams, None)
+    except FetchError as e:
+        logger.error(str(e))
+        return None
+    if first is None:
+        return iter(())
+    return itertools.chain([first], streams)
+
+
+# ============================================================================
+# Packet ingest
+#
+# Public keys arrive in mixed case (Adverts carry upper-case hex, the config
+# uses lower-case). They are canonicalized once when a packet is ingested and
+# every stage compares canonical keys, so no per-packet loop lowercases keys.
+# ============================================================================
+
+def canonical_key(public_key):
+    """
+    Return the canonical form of a public key: lowercase hex, or "" if missing.
+
+    Args:
+        public_key: Public key string as found in the API (any case) or None
+
+    Returns:
+        Lowercase key string
+    """
+    return public_key.lower() if public_key else ""
+
+
+class PacketView:
+    """
+    Ingested packet: the raw dict plus the fields every stage needs.
+
+    Dict lookups, key canonicalization and timestamp parsing happen once
+    per packet here instead of once per stage or per engine consumer.
+    heard_ms is heard_at in epoch milliseconds (None if missing/invalid);
+    stages compare times with it rather than with the heard_at string.
+    inserted_ms is when the packet store stored the packet, or heard_ms
+    for a packet that did not come from the store.
+    """
+    __slots__ = ("packet", "decoded", "payload_type", "key", "heard_at", "heard_ms", "inserted_ms")
+
+    def __init__(self, packet, inserted_ms=None):
+        self.packet = packet
+        self.decoded = packet.get("decoded_payload") or {}
+        self.payload_type = packet.get("payload_type", "")
+        self.key = canonical_key(self.decoded.get("public_key"))
+        self.heard_at = packet.get("heard_at", "")
+        self.heard_ms = parse_heard_at_ms(self.heard_at)
+        self.inserted_ms = self.heard_ms if inserted_ms is None else inserted_ms
+
+
+def iter_packet_views(packets):
+    """Yield a PacketView for each packet without building a list."""
+    for packet in packets:
+        yield packet if isinstance(packet, PacketView) else PacketView(packet)
+
+
 def filter_repeater_packets(packets):
     """
     Filter packets to keep only repeater advertisements.
     
     Args:
-        packets: List of packet dictionaries from API
+        packets: List of packet dictionaries (or PacketViews) from API
         
     Returns:
-        List of repeater advertisement packets
+        List of repeater advertisement packets, of the same kind as given
     """
     if not packets:
         return []
     
     repeater_packets = []
-    for packet in packets:
+    debug = logger.isEnabledFor(logging.DEBUG)
+    for item, view in zip(packets, iter_packet_views(packets)):
         # Filter for Advert type packets with Repeater mode
-        decoded = packet.get("decoded_payload") or {}
-        if (packet.get("payload_type") == "Advert" and 
-            decoded.get("mode") == "Repeater"):
-            repeater_packets.append(packet)
-            logger.debug(f"Found repeater packet: {packet.get('decoded_payload', {}).get('name')} (id={packet.get('id')})")
+        if (view.payload_type == "Advert" and 
+            view.decoded.get("mode") == "Repeater"):
+            repeater_packets.append(item)
+            if debug:
+                logger.debug(f"Found repeater packet: {view.decoded.get('name')} (id={view.packet.get('id')})")
     
     logger.info(f"Filtered {len(repeater_packets)} repeater packets from {len(packets)} total")
     return repeater_packets
@@ -163,35 +850,30 @@ def aggregate_repeaters(packets):
     Aggregate repeater packets by public_key to get latest information.
     
     Args:
-        packets: List of repeater advertisement packets
+        packets: List of repeater advertisement packets (dicts or PacketViews)
         
     Returns:
-        Dictionary mapping public_key to latest packet info
+        Dictionary mapping canonical public_key to latest packet info
     """
     repeaters = {}
+    heard = {}
     
-    for packet in packets:
+    for view in iter_packet_views(packets):
         # Public key is in decoded_payload for Advert packets
-        decoded = packet.get("decoded_payload") or {}
-        public_key = decoded.get("public_key")
+        public_key = view.key
         if not public_key:
             continue
         
         # Keep only the most recent packet for each repeater
-        if public_key not in repeaters:
-            repeaters[public_key] = packet
-        else:
-            # Compare timestamps to keep the most recent
-            current_heard = repeaters[public_key].get("heard_at", "")
-            new_heard = packet.get("heard_at", "")
-            if new_heard > current_heard:
-                repeaters[public_key] = packet
+        if public_key not in repeaters or is_newer(view.heard_ms, heard[public_key]):
+            repeaters[public_key] = view.packet
+            heard[public_key] = view.heard_ms
     
     logger.info(f"Aggregated into {len(repeaters)} unique repeaters")
     return repeaters
 
 
-def filter_stale_repeaters(all_packets, repeaters, max_age_days=ADVERT_STALE_DAYS):
+def filter_stale_repeaters(all_packets, repeaters, max_age_days=ADVERT_STALE_DAYS, now=None):
     """
     Remove repeaters whose most recent payload_type=Advert packet is older
     than max_age_days.
@@ -200,236 +882,405 @@ def filter_stale_repeaters(all_packets, repeaters, max_age_days=ADVERT_STALE_DAY
     and uses the newest heard_at among those Adverts to decide freshness.
 
     Args:
-        all_packets: Full list of packets from the API
+        all_packets: Full list of packets (dicts or PacketViews) from the API
         repeaters: Dict mapping public_key to latest Advert packet (from
                    aggregate_repeaters)
         max_age_days: Maximum age in days for the latest Advert packet
+        now: Reference time (default: now)
 
     Returns:
         Filtered dict with stale repeaters removed
     """
-    now = datetime.now(timezone.utc)
-    cutoff = now - timedelta(days=max_age_days)
+    now = now or datetime.now(timezone.utc)
+    cutoff_ms = datetime_to_ms(now - timedelta(days=max_age_days))
 
-    # Find the latest Advert heard_at per repeater public key
-    latest_advert: dict[str, str] = {}
-    for packet in all_packets:
-        if packet.get("payload_type") != "Advert":
+    # Canonical repeater keys, computed once rather than per packet
+    wanted = {canonical_key(k) for k in repeaters}
+
+    # Find the latest Advert heard time per repeater public key
+    latest_advert: dict[str, int] = {}
+    for view in iter_packet_views(all_packets):
+        if view.payload_type != "Advert" or view.heard_ms is None:
             continue
-        decoded = packet.get("decoded_payload") or {}
-        pk = (decoded.get("public_key") or "").lower()
-        if pk and pk in {k.lower() for k in repeaters}:
-            heard_at_str = packet.get("heard_at", "")
-            if heard_at_str > latest_advert.get(pk, ""):
-                latest_advert[pk] = heard_at_str
+        pk = view.key
+        if pk in wanted:
+            if view.heard_ms > latest_advert.get(pk, -1):
+                latest_advert[pk] = view.heard_ms
+
+    return drop_stale_repeaters(repeaters, latest_advert, cutoff_ms, max_age_days)
+
+
+def drop_stale_repeaters(repeaters, latest_advert, cutoff_ms, max_age_days=ADVERT_STALE_DAYS):
+    """
+    Keep only repeaters whose latest Advert was heard at or after cutoff.
+
+    Args:
+        repeaters: Dict mapping public_key to latest Advert packet
+        latest_advert: Dict mapping canonical public_key to the newest
+                       valid Advert heard time (epoch ms) seen for that key
+        cutoff_ms: Oldest acceptable Advert time (epoch ms)
+        max_age_days: Age window in days (used for logging only)
 
+    Returns:
+        Filtered dict with stale repeaters removed
+    """
     filtered = {}
+    debug = logger.isEnabledFor(logging.DEBUG)
     for key, packet in repeaters.items():
-        heard_at_str = latest_advert.get(key.lower(), "")
-        if heard_at_str:
-            try:
-                heard_at = datetime.fromisoformat(heard_at_str.replace('Z', '+00:00'))
-                if heard_at >= cutoff:
-                    filtered[key] = packet
-                else:
-                    name = packet.get("node_name", key[:8])
-                    logger.debug(f"Excluding stale repeater '{name}' (last Advert: {heard_at_str[:19]})")
-            except (ValueError, AttributeError):
-                logger.warning(f"Invalid heard_at for repeater {key[:8]}, excluding")
+        heard_ms = latest_advert.get(canonical_key(key))
+        if heard_ms is not None:
+            if heard_ms >= cutoff_ms:
+                filtered[key] = packet
+            elif debug:
+                name = packet.get("node_name", key[:8])
+                logger.debug(f"Excluding stale repeater '{name}' (last Advert: {format_epoch_ms(heard_ms)[:19]})")
         else:
-            logger.warning(f"No Advert heard_at for repeater {key[:8]}, excluding")
+            logger.warning(f"No valid Advert heard_at for repeater {key[:8]}, excluding")
 
     removed = len(repeaters) - len(filtered)
     logger.info(f"Filtered out {removed} stale repeaters (no Advert in last {max_age_days} days), {len(filtered)} remain")
     return filtered
 
 
-def find_repeater_activity(all_packets, repeater_keys):
+def find_repeater_activity(all_packets, repeater_keys, index=None):
     """
     Scan all packets to find repeater activity.
     
     A packet is considered to involve a repeater if:
     1. The packet's decoded_payload.public_key matches a repeater's public key, OR
-    2. The first 2 characters of a repeater's public_key appear in the packet's path value
+    2. One of the hops in the packet's path equals the first byte (2 hex
+       characters) of a repeater's public_key
     
     Either match counts as a positive indicator that the repeater was active.
+    Path hops are looked up in a prefix -> keys index, so the cost per packet
+    depends on path length rather than on the number of repeaters. When
+    several repeaters share a hop prefix and an AttributionIndex is given,
+    the hop is credited only to the most likely of them.
     
     Args:
-        all_packets: List of all packet dicts from the API
+        all_packets: List of all packet dicts (or PacketViews) from the API
         repeater_keys: Set of repeater public keys (from Advert packets)
+        index: Optional AttributionIndex for ambiguous hop prefixes
         
     Returns:
         Dict mapping repeater_key -> {
             "last_heard_at": str (ISO timestamp),
-            "snr_values": list of floats,
-            "rssi_values": list of floats,
+            "last_heard_ms": int epoch ms, or None if never heard,
+            "snr": RunningStats of SNR readings,
+            "rssi": RunningStats of RSSI readings,
             "packet_count": int
         }
     """
-    # Build lookup structures with case-insensitive matching
-    normalized_keys = {k.lower(): k for k in repeater_keys}
+    # Build lookup structures keyed by canonical public key
+    normalized_keys = {canonical_key(k): k for k in repeater_keys}
     
-    # Map 2-char prefixes to their repeater keys
+    # Map 1-byte hop prefixes to their repeater keys
     key_prefixes = {}
     for key in repeater_keys:
-        prefix = key[:2].lower()
+        prefix = canonical_key(key)[:2]
         if prefix not in key_prefixes:
             key_prefixes[prefix] = []
         key_prefixes[prefix].append(key)
     
     # Initialize activity tracking for each repeater
-    activity = {
-        key: {"last_heard_at": "", "snr_values": [], "rssi_values": [], "packet_count": 0}
-        for key in repeater_keys
-    }
+    activity = {key: new_activity() for key in repeater_keys}
     
-    for packet in all_packets:
-        decoded = packet.get("decoded_payload") or {}
-        packet_public_key = (decoded.get("public_key") or "").lower()
-        path = str(packet.get("path", "")).lower()
-        heard_at = packet.get("heard_at", "")
+    for view in iter_packet_views(all_packets):
+        packet = view.packet
+        packet_public_key = view.key
         snr = packet.get("snr")
         rssi = packet.get("rssi")
         
-        matched_repeaters = set()
+        matched_repeaters = {}
         
         # Check 1: Does this packet's public_key match a known repeater?
         if packet_public_key and packet_public_key in normalized_keys:
-            matched_repeaters.add(normalized_keys[packet_public_key])
+            matched_repeaters[normalized_keys[packet_public_key]] = 1.0
         
-        # Check 2: Does any repeater's 2-char prefix appear in the path?
-        if path:
-            for prefix, keys in key_prefixes.items():
-                if prefix in path:
-                    for key in keys:
-                        matched_repeaters.add(key)
+        # Check 2: Does any hop in the path belong to a known repeater?
+        hops = parse_path_hops(packet.get("path"))
+        seen_hops = set()
+        for i, hop in enumerate(hops):
+            keys = key_prefixes.get(hop)
+            if not keys or hop in seen_hops:
+                continue
+            seen_hops.add(hop)  # a repeated hop is attributed by its first occurrence
+            if index is not None and hop in index.ambiguous:
+                nxt = hops[i + 1] if i + 1 < len(hops) else OBSERVER
+                key, confidence = index.resolve(hop, hops[i - 1] if i else None, nxt)
+                if key in normalized_keys:
+                    repeater_key = normalized_keys[key]
+                    matched_repeaters.setdefault(repeater_key, confidence)
+                continue
+            for repeater_key in keys:
+                matched_repeaters[repeater_key] = 1.0
         
         # Update activity for all matched repeaters
-        for repeater_key in matched_repeaters:
-            act = activity[repeater_key]
-            act["packet_count"] += 1
-            
-            if heard_at and heard_at > act["last_heard_at"]:
-                act["last_heard_at"] = heard_at
-            
-            if snr is not None:
-                try:
-                    act["snr_values"].append(float(snr))
-                except (ValueError, TypeError):
-                    pass
-            
-            if rssi is not None:
-                try:
-                    act["rssi_values"].append(float(rssi))
-                except (ValueError, TypeError):
-                    pass
+        for repeater_key, confidence in matched_repeaters.items():
+            record_activity(activity[repeater_key], view.heard_at, snr, rssi, view.heard_ms, confidence)
     
-    for key, act in activity.items():
-        logger.debug(f"Repeater {key[:8]}: {act['packet_count']} packets, last heard: {act['last_heard_at'][:19] if act['last_heard_at'] else 'never'}")
+    if logger.isEnabledFor(logging.DEBUG):
+        for key, act in activity.items():
+            logger.debug(f"Repeater {key[:8]}: {act['packet_count']} packets, last heard: {act['last_heard_at'][:19] if act['last_heard_at'] else 'never'}")
     
     logger.info(f"Scanned {len(all_packets)} packets for activity across {len(repeater_keys)} repeaters")
     return activity
 
 
-def count_companion_nodes(packets):
+@lru_cache(maxsize=8192)
+def _split_path(path):
+    """Split a path string into lowercase 2-character hop tokens."""
+    hops = []
+    for token in _PATH_SEPARATORS.split(path.lower()):
+        hops.extend(token[i:i + 2] for i in range(0, len(token) - 1, 2))
+    return tuple(hops)
+
+
+def parse_path_hops(path):
     """
-    Count unique Companion nodes active in the last 30 days.
-    
-    Filters for packets where decoded_payload.mode == "Companion"
-    and heard_at is within the last 30 days, then counts unique
-    public keys.
-    
+    Parse a packet path into its hop bytes.
+
+    Each hop in a MeshCore path is the first byte of the forwarding
+    repeater's public key. The API may give the path as a hex string
+    ("a0d3", "a0,d3", "a0 -> d3") or as a list of hex strings or ints.
+    Parsing on hop boundaries avoids false matches such as "0d" inside
+    "a0d3". Routes repeat heavily, so string paths are memoized.
+
     Args:
-        packets: List of all packet dicts from API
-        
+        path: Raw packet path value (str, list, int, or None)
+
     Returns:
-        int: Count of unique companion public keys
+        Tuple of lowercase 2-character hex hop strings
     """
-    now = datetime.now(timezone.utc)
-    thirty_days_ago = now - timedelta(days=30)
-    companion_keys = set()
-    
-    for packet in packets:
-        decoded = packet.get("decoded_payload") or {}
-        if decoded.get("mode") == "Companion":
-            heard_at_str = packet.get("heard_at", "")
-            if heard_at_str:
-                try:
-                    heard_at = datetime.fromisoformat(heard_at_str.replace('Z', '+00:00'))
-                    if heard_at >= thirty_days_ago:
-                        public_key = decoded.get("public_key")
-                        if public_key:
-                            companion_keys.add(public_key.lower())
-                except (ValueError, AttributeError):
-                    pass
-    
-    logger.info(f"Found {len(companion_keys)} unique companion nodes active in last 30 days")
-    return len(companion_keys)
+    if not path:
+        return ()
+    if isinstance(path, str):
+        return _split_path(path)
+    if isinstance(path, (list, tuple)):
+        hops = []
+        for hop in path:
+            if isinstance(hop, int):
+                hops.append(f"{hop & 0xff:02x}")
+            else:
+                hops.extend(_split_path(str(hop)))
+        return tuple(hops)
+    return _split_path(str(path))
+
+
+def is_newer(heard_ms, current_ms):
+    """True if heard_ms is later than current_ms; a missing time is never newer."""
+    return heard_ms is not None and (current_ms is None or heard_ms > current_ms)
+
 
+def new_activity():
+    """Return an empty per-repeater activity record."""
+    return {"last_heard_at": "", "last_heard_ms": None, "snr": RunningStats(), "rssi": RunningStats(),
+            "packet_count": 0, "confidence": 0.0}
 
-def count_messages(packets):
+
+def record_activity(act, heard_at, snr, rssi, heard_ms=None, confidence=1.0):
     """
-    Count text messages from the last 30 days.
-    
-    Counts packets where payload_type is "TextMessage" or "GroupText",
-    excluding any with decoded_payload.channel_hash == 81.
-    Only counts messages with heard_at within the last 30 days.
-    
+    Add one packet observation to an activity record.
+
     Args:
-        packets: List of all packet dicts from API
-        
-    Returns:
-        int: Count of distinct matching messages (deduplicated by hash)
+        act: Activity record from new_activity()
+        heard_at: ISO timestamp string of the packet
+        snr: Packet SNR (any numeric-like value or None)
+        rssi: Packet RSSI (any numeric-like value or None)
+        heard_ms: heard_at in epoch ms if already parsed (PacketView.heard_ms)
+        confidence: Probability that the packet involved this repeater
+                    (below 1 when an ambiguous hop prefix was attributed)
     """
-    now = datetime.now(timezone.utc)
-    thirty_days_ago = now - timedelta(days=30)
-    message_hashes = set()
+    act["packet_count"] += 1
+    act["confidence"] += confidence
     
-    for packet in packets:
-        payload_type = packet.get("payload_type", "")
-        if payload_type in ("TextMessage", "GroupText"):
-            decoded = packet.get("decoded_payload") or {}
-            if decoded.get("channel_hash") == 81:
-                continue
-            heard_at_str = packet.get("heard_at", "")
-            if heard_at_str:
-                try:
-                    heard_at = datetime.fromisoformat(heard_at_str.replace('Z', '+00:00'))
-                    if heard_at >= thirty_days_ago:
-                        msg_hash = packet.get("hash")
-                        if msg_hash:
-                            message_hashes.add(msg_hash)
-                except (ValueError, AttributeError):
-                    pass
+    if heard_ms is None and heard_at:
+        heard_ms = parse_heard_at_ms(heard_at)
+    if is_newer(heard_ms, act["last_heard_ms"]):
+        act["last_heard_ms"] = heard_ms
+        act["last_heard_at"] = heard_at
+    
+    if snr is not None:
+        try:
+            act["snr"].add(float(snr))
+        except (ValueError, TypeError):
+            pass
     
-    logger.info(f"Found {len(message_hashes)} distinct messages (TextMessage/GroupText, excl. channel_hash=81) in last 30 days")
-    return len(message_hashes)
+    if rssi is not None:
+        try:
+            act["rssi"].add(float(rssi))
+        except (ValueError, TypeError):
+            pass
 
 
-def calculate_online_status(heard_at_str, threshold_minutes=ONLINE_THRESHOLD_MINUTES):
+def merge_activity(act, other):
     """
-    Determine if repeater is online based on last heard time.
-    
+    Fold the activity record other into act in place.
+
+    Args:
+        act: Activity record to update
+        other: Activity record to merge from
+    """
+    act["packet_count"] += other["packet_count"]
+    act["confidence"] += other["confidence"]
+    if is_newer(other["last_heard_ms"], act["last_heard_ms"]):
+        act["last_heard_ms"] = other["last_heard_ms"]
+        act["last_heard_at"] = other["last_heard_at"]
+    act["snr"].merge(other["snr"])
+    act["rssi"].merge(other["rssi"])
+
+
+def build_attribution_index(packets, now=None, observer_keys=None):
+    """
+    Build the AttributionIndex for shared hop prefixes from Advert packets.
+
+    Candidates are the repeaters the status document will list: keys with
+    a Repeater-mode Advert whose newest Advert (any mode) is within
+    ADVERT_STALE_DAYS. Each candidate's newest location and time come from
+    its latest Repeater Advert, and the first hop of every one of its
+    Adverts (or the observer, for an empty path) is recorded as a link.
+
+    Args:
+        packets: Iterable of packet dicts or PacketViews (only Adverts are used)
+        now: Reference time for the staleness cutoff
+        observer_keys: Observer public keys; if exactly one of them sent
+                       an Advert with a location, last hops are scored by
+                       distance to it
+
+    Returns:
+        AttributionIndex
+    """
+    now = now or datetime.now(timezone.utc)
+    cutoff_ms = datetime_to_ms(now - timedelta(days=ADVERT_STALE_DAYS))
+    observer_keys = {canonical_key(k) for k in observer_keys or ()}
+    latest = {}  # key -> newest Advert heard_ms, any mode
+    repeaters = {}  # key -> (heard_ms, lat, lon) of the newest Repeater Advert
+    links = []
+    observer_locations = {}
+
+    for view in iter_packet_views(packets):
+        key = view.key
+        heard_ms = view.heard_ms
+        if view.payload_type != "Advert" or not key or heard_ms is None:
+            continue
+        if heard_ms > latest.get(key, -1):
+            latest[key] = heard_ms
+        decoded = view.decoded
+        if key in observer_keys:
+            observer_locations[key] = (decoded.get("lat"), decoded.get("lon"))
+        if decoded.get("mode") != "Repeater":
+            continue
+        current = repeaters.get(key)
+        if current is None or heard_ms > current[0]:
+            repeaters[key] = (heard_ms, decoded.get("lat"), decoded.get("lon"))
+        hops = parse_path_hops(view.packet.get("path"))
+        links.append((key, hops[0] if hops else OBSERVER))
+
+    index = AttributionIndex()
+    for key, (heard_ms, lat, lon) in repeaters.items():
+        if latest[key] >= cutoff_ms:
+            index.add_repeater(key, lat, lon, heard_ms)
+    for key, hop in links:
+        if latest[key] >= cutoff_ms:
+            index.add_link(key, hop)
+    if len(observer_locations) == 1:
+        index.set_observer_location(*next(iter(observer_locations.values())))
+    logger.info(f"Prefix attribution: {len(index.ambiguous)} hop prefixes shared by more than one repeater")
+    return index
+
+
+def count_companion_nodes(packets, now=None):
+    """
+    Count unique Companion nodes active in the last 30 days.
+    
+    Filters for packets where decoded_payload.mode == "Companion"
+    and heard_at is within the last 30 days, then counts unique
+    public keys.
+    
+    Args:
+        packets: List of all packet dicts (or PacketViews) from API
+        now: Reference time (default: now)
+        
+    Returns:
+        int: Count of unique companion public keys (exact up to
+             DISTINCT_EXACT_LIMIT keys, a HyperLogLog estimate above)
+    """
+    now = now or datetime.now(timezone.utc)
+    thirty_days_ago = datetime_to_ms(now - timedelta(days=30))
+    companion_keys = DistinctCounter(DISTINCT_PRECISION, DISTINCT_EXACT_LIMIT)
+    
+    for view in iter_packet_views(packets):
+        if view.decoded.get("mode") == "Companion":
+            heard_ms = view.heard_ms
+            if heard_ms is not None and heard_ms >= thirty_days_ago:
+                if view.key:
+                    companion_keys.add(view.key)
+    
+    count = companion_keys.count()
+    logger.info(f"Found {count} unique companion nodes active in last 30 days")
+    return count
+
+
+def count_messages(packets, now=None):
+    """
+    Count text messages from the last 30 days.
+    
+    Counts packets where payload_type is "TextMessage" or "GroupText",
+    excluding any with decoded_payload.channel_hash == 81.
+    Only counts messages with heard_at within the last 30 days.
+    
+    Args:
+        packets: List of all packet dicts (or PacketViews) from API
+        now: Reference time (default: now)
+        
+    Returns:
+        int: Count of distinct matching messages (deduplicated by hash;
+             exact up to DISTINCT_EXACT_LIMIT hashes, estimated above)
+    """
+    now = now or datetime.now(timezone.utc)
+    thirty_days_ago = datetime_to_ms(now - timedelta(days=30))
+    message_hashes = DistinctCounter(DISTINCT_PRECISION, DISTINCT_EXACT_LIMIT)
+    
+    for view in iter_packet_views(packets):
+        if view.payload_type in ("TextMessage", "GroupText"):
+            if view.decoded.get("channel_hash") == 81:
+                continue
+            heard_ms = view.heard_ms
+            if heard_ms is not None and heard_ms >= thirty_days_ago:
+                msg_hash = view.packet.get("hash")
+                if msg_hash:
+                    message_hashes.add(msg_hash)
+    
+    count = message_hashes.count()
+    logger.info(f"Found {count} distinct messages (TextMessage/GroupText, excl. channel_hash=81) in last 30 days")
+    return count
+
+
+def calculate_online_status(heard_at_str, threshold_minutes=ONLINE_THRESHOLD_MINUTES, heard_ms=None, now_ms=None):
+    """
+    Determine if repeater is online based on last heard time.
+    
     Args:
         heard_at_str: ISO format timestamp string
         threshold_minutes: Minutes within which to consider online
+        heard_ms: heard_at_str in epoch ms if already parsed
+        now_ms: Reference time in epoch ms (default: now)
         
     Returns:
         Tuple of (status_string, datetime_object)
     """
-    try:
-        # Parse ISO format timestamp
-        heard_at = datetime.fromisoformat(heard_at_str.replace('Z', '+00:00'))
-        now = datetime.now(timezone.utc)
-        time_diff = now - heard_at
-        
-        if time_diff < timedelta(minutes=threshold_minutes):
-            return "online", heard_at
-        else:
-            return "offline", heard_at
-    except (ValueError, AttributeError):
+    if heard_ms is None:
+        heard_ms = parse_heard_at_ms(heard_at_str)
+    if heard_ms is None:
         logger.warning(f"Invalid timestamp format: {heard_at_str}")
         return "unknown", None
+    
+    if now_ms is None:
+        now_ms = datetime_to_ms(datetime.now(timezone.utc))
+    if now_ms - heard_ms < threshold_minutes * 60_000:
+        return "online", ms_to_datetime(heard_ms)
+    else:
+        return "offline", ms_to_datetime(heard_ms)
 
 
 def calculate_rssi_percentage(rssi_dbm):
@@ -458,14 +1309,15 @@ def calculate_rssi_percentage(rssi_dbm):
         return None
 
 
-def build_node_record(public_key, packet, activity=None):
+def build_node_record(public_key, packet, activity=None, now_ms=None):
     """
     Build a node record from a repeater advertisement packet and activity data.
     
     Args:
-        public_key: Unique node identifier
+        public_key: Unique node identifier (canonical or as advertised)
         packet: API packet dictionary (Advert packet for metadata)
-        activity: Activity dict with last_heard_at, snr_values, rssi_values
+        activity: Activity dict with last_heard_at, snr, rssi (RunningStats)
+        now_ms: Reference time for the online status (default: now)
         
     Returns:
         Node record dictionary
@@ -473,39 +1325,37 @@ def build_node_record(public_key, packet, activity=None):
     decoded = packet.get("decoded_payload") or {}
     
     # Use activity-based heard_at if available, otherwise fall back to packet heard_at
-    if activity and activity.get("last_heard_at"):
+    if activity and activity.get("last_heard_ms") is not None:
         heard_at_str = activity["last_heard_at"]
+        heard_ms = activity["last_heard_ms"]
     else:
         heard_at_str = packet.get("heard_at", "")
+        heard_ms = None
     
-    status, heard_dt = calculate_online_status(heard_at_str)
+    status, heard_dt = calculate_online_status(heard_at_str, heard_ms=heard_ms, now_ms=now_ms)
     
     # Generate a simple ID from public key
-    node_id = f"node-{public_key[:12].lower()}"
+    node_id = f"node-{canonical_key(public_key)[:12]}"
     
     # Extract location
     latitude = decoded.get("lat")
     longitude = decoded.get("lon")
     
-    # Calculate average SNR from activity data
-    avg_snr = None
-    if activity and activity.get("snr_values"):
-        avg_snr = round(sum(activity["snr_values"]) / len(activity["snr_values"]), 1)
-    
-    # Calculate average RSSI from activity data
-    avg_rssi = None
-    if activity and activity.get("rssi_values"):
-        avg_rssi = round(sum(activity["rssi_values"]) / len(activity["rssi_values"]), 1)
+    # Calculate average SNR and RSSI from activity data
+    snr_stats = activity["snr"] if activity else None
+    rssi_stats = activity["rssi"] if activity else None
+    avg_snr = round(snr_stats.mean, 1) if snr_stats and snr_stats.count else None
+    avg_rssi = round(rssi_stats.mean, 1) if rssi_stats and rssi_stats.count else None
     
     record = {
         "id": node_id,
         "name": packet.get("node_name", f"Node {public_key[:8]}"),
         "status": status,
-        "publicKey": public_key,
+        "publicKey": decoded.get("public_key") or public_key,
         "location": {
             "latitude": latitude,
             "longitude": longitude,
-            "address": ""  # Could be enhanced with reverse geocoding
+            "address": ""  # Filled in by add_addresses()
         },
         "lastSeen": heard_at_str,
         "signalStrength": packet.get("rssi"),
@@ -513,7 +1363,11 @@ def build_node_record(public_key, packet, activity=None):
         "averageSNR": avg_snr,
         "averageRSSI": avg_rssi,
         "averageRSSIPercentage": calculate_rssi_percentage(avg_rssi),
+        "snrStats": snr_stats.summary() if snr_stats else None,
+        "rssiStats": rssi_stats.summary() if rssi_stats else None,
         "activityPacketCount": activity.get("packet_count", 0) if activity else 0,
+        "attributionConfidence": (round(activity["confidence"] / activity["packet_count"], 3)
+                                  if activity and activity.get("packet_count") else None),
         "batteryLevel": None,  # Not available from API
         "uptime": None,  # Not available from API
         "hardware": decoded.get("hw_model", "Unknown"),
@@ -540,6 +1394,7 @@ def calculate_network_stats(nodes, companion_count=0):
             "totalNodes": 0,
             "onlineNodes": 0,
             "offlineNodes": 0,
+            "healthPercentage": 0.0,
             "averageSignal": None,
             "averageSNR": None,
             "companionCount": companion_count,
@@ -591,6 +1446,622 @@ def calculate_network_stats(nodes, companion_count=0):
 
 
 
+# ============================================================================
+# Single-pass analysis engine
+#
+# main() used to walk the packet list once per statistic. The engine below
+# walks it exactly once and hands every packet to each registered consumer,
+# so adding a statistic means registering a consumer, not another scan.
+# ============================================================================
+
+class PacketConsumer:
+    """
+    Base class for a statistic computed by the AnalysisEngine.
+
+    Subclasses set a unique name, override consume() (called once per
+    packet) and result() (called once after the last packet). The value
+    returned by result() is published under name in the engine results.
+    merge() folds in a consumer of the same kind that saw other packets,
+    so --replay can split the packets between worker processes.
+    """
+    name = None
+
+    def consume(self, view):
+        """Process one packet (a PacketView)."""
+        raise NotImplementedError
+
+    def result(self):
+        """Return the finished statistic."""
+        raise NotImplementedError
+
+    def merge(self, other):
+        """
+        Fold in a consumer of the same kind that saw later packets.
+
+        Merging the consumers of consecutive time ranges, oldest first,
+        gives the result one consumer would have had after seeing all of
+        them in that order.
+        """
+        raise NotImplementedError
+
+
+class RepeaterAdvertConsumer(PacketConsumer):
+    """Latest Repeater-mode Advert per public key (filter + aggregate)."""
+    name = "repeaters"
+
+    def __init__(self):
+        self.packet_count = 0
+        self.repeaters = {}
+        self.heard = {}
+
+    def consume(self, view):
+        if view.payload_type != "Advert" or view.decoded.get("mode") != "Repeater":
+            return
+        self.packet_count += 1
+        public_key = view.key
+        if not public_key:
+            return
+        if public_key not in self.repeaters or is_newer(view.heard_ms, self.heard[public_key]):
+            self.repeaters[public_key] = view.packet
+            self.heard[public_key] = view.heard_ms
+
+    def result(self):
+        return {"packet_count": self.packet_count, "repeaters": self.repeaters}
+
+    def merge(self, other):
+        self.packet_count += other.packet_count
+        for public_key, packet in other.repeaters.items():
+            if public_key not in self.repeaters or is_newer(other.heard[public_key], self.heard[public_key]):
+                self.repeaters[public_key] = packet
+                self.heard[public_key] = other.heard[public_key]
+
+
+class LatestAdvertConsumer(PacketConsumer):
+    """Newest valid Advert heard time (epoch ms) per canonical public key (any mode)."""
+    name = "latest_advert"
+
+    def __init__(self):
+        self.latest = {}
+
+    def consume(self, view):
+        if view.payload_type != "Advert":
+            return
+        pk = view.key
+        if pk and view.heard_ms is not None and view.heard_ms > self.latest.get(pk, -1):
+            self.latest[pk] = view.heard_ms
+
+    def result(self):
+        return self.latest
+
+    def merge(self, other):
+        for pk, heard_ms in other.latest.items():
+            if heard_ms > self.latest.get(pk, -1):
+                self.latest[pk] = heard_ms
+
+
+class ActivityConsumer(PacketConsumer):
+    """
+    Repeater activity accumulated without knowing the repeater set up front.
+
+    The repeater list is only final after the whole stream has been seen, so
+    activity is bucketed by each distinct hop in the path plus a per-key
+    bucket for direct public_key matches whose own prefix is not one of the
+    hops. result() returns a function that resolves the buckets for a
+    given set of repeater keys; each packet is counted at most once per
+    repeater, exactly as in find_repeater_activity.
+
+    With an AttributionIndex, hops whose prefix several repeaters share
+    are resolved while scanning (one memoized lookup per hop) and credited
+    to the winning repeater's own bucket with the attribution confidence.
+    """
+    name = "activity"
+
+    def __init__(self, index=None):
+        self.index = index
+        self.by_prefix = {}
+        self.direct_only = {}
+        self.resolved = {}
+
+    def consume(self, view):
+        packet = view.packet
+        snr = packet.get("snr")
+        rssi = packet.get("rssi")
+
+        hops = parse_path_hops(packet.get("path"))
+        index = self.index
+        owners = ()
+        if index is not None and not index.ambiguous.isdisjoint(hops):
+            prefixes = set()
+            owners = set()
+            last = len(hops) - 1
+            for i, prefix in enumerate(hops):
+                if prefix in prefixes:
+                    continue
+                prefixes.add(prefix)
+                if prefix in index.ambiguous:
+                    key, confidence = index.resolve(prefix, hops[i - 1] if i else None,
+                                                    hops[i + 1] if i < last else OBSERVER)
+                    owners.add(key)
+                    act = self.resolved.get(key)
+                    if act is None:
+                        act = self.resolved[key] = new_activity()
+                    record_activity(act, view.heard_at, snr, rssi, view.heard_ms, confidence)
+                    continue
+                act = self.by_prefix.get(prefix)
+                if act is None:
+                    act = self.by_prefix[prefix] = new_activity()
+                record_activity(act, view.heard_at, snr, rssi, view.heard_ms)
+        else:
+            prefixes = set(hops)
+            for prefix in prefixes:
+                act = self.by_prefix.get(prefix)
+                if act is None:
+                    act = self.by_prefix[prefix] = new_activity()
+                record_activity(act, view.heard_at, snr, rssi, view.heard_ms)
+
+        pk = view.key
+        # A hop on pk's own prefix that was attributed to another repeater
+        # does not account for pk, so the public key match still counts
+        if pk and (pk[:2] not in prefixes or (owners and pk[:2] in index.ambiguous and pk not in owners)):
+            act = self.direct_only.get(pk)
+            if act is None:
+                act = self.direct_only[pk] = new_activity()
+            record_activity(act, view.heard_at, snr, rssi, view.heard_ms)
+
+    def activity_for(self, repeater_keys):
+        """
+        Resolve accumulated buckets into per-repeater activity records.
+
+        Args:
+            repeater_keys: Iterable of repeater public keys
+
+        Returns:
+            Dict mapping repeater_key -> activity record (same shape as
+            find_repeater_activity)
+        """
+        activity = {}
+        for key in repeater_keys:
+            pk = canonical_key(key)
+            act = new_activity()
+            bucket = self.by_prefix.get(pk[:2])
+            if bucket:
+                merge_activity(act, bucket)
+            direct = self.direct_only.get(pk)
+            if direct:
+                merge_activity(act, direct)
+            resolved = self.resolved.get(pk)
+            if resolved:
+                merge_activity(act, resolved)
+            activity[key] = act
+        return activity
+
+    def result(self):
+        return self.activity_for
+
+    def merge(self, other):
+        for mine, theirs in ((self.by_prefix, other.by_prefix), (self.direct_only, other.direct_only),
+                             (self.resolved, other.resolved)):
+            for key, act in theirs.items():
+                current = mine.get(key)
+                if current is None:
+                    mine[key] = act
+                else:
+                    merge_activity(current, act)
+
+
+class CompanionConsumer(PacketConsumer):
+    """Unique Companion public keys heard since cutoff_ms, as per-day DailyDistinct counters."""
+    name = "companions"
+
+    def __init__(self, cutoff_ms):
+        self.cutoff_ms = cutoff_ms
+        self.keys = DailyDistinct(DISTINCT_PRECISION, DISTINCT_EXACT_LIMIT)
+
+    def consume(self, view):
+        if view.decoded.get("mode") != "Companion":
+            return
+        heard_ms = view.heard_ms
+        if heard_ms is not None and heard_ms >= self.cutoff_ms and view.key:
+            self.keys.add(heard_ms, view.key)
+
+    def result(self):
+        return self.keys
+
+    def merge(self, other):
+        self.keys.merge(other.keys)
+
+
+class MessageConsumer(PacketConsumer):
+    """
+    Distinct TextMessage/GroupText hashes heard since cutoff_ms (excl.
+    channel_hash 81), as per-day DailyDistinct counters.
+    """
+    name = "messages"
+
+    def __init__(self, cutoff_ms):
+        self.cutoff_ms = cutoff_ms
+        self.hashes = DailyDistinct(DISTINCT_PRECISION, DISTINCT_EXACT_LIMIT)
+
+    def consume(self, view):
+        if view.payload_type not in ("TextMessage", "GroupText"):
+            return
+        if view.decoded.get("channel_hash") == 81:
+            return
+        heard_ms = view.heard_ms
+        if heard_ms is not None and heard_ms >= self.cutoff_ms:
+            msg_hash = view.packet.get("hash")
+            if msg_hash:
+                self.hashes.add(heard_ms, msg_hash)
+
+    def result(self):
+        return self.hashes
+
+    def merge(self, other):
+        self.hashes.merge(other.hashes)
+
+
+class RollupConsumer(PacketConsumer):
+    """
+    5-minute rollup buckets for packets inserted after since_ms.
+
+    Every run re-analyzes the whole window, so only packets stored after
+    the rollup store's high-water mark are counted (by inserted_ms, so a
+    late packet is counted on the run that stores it, in the bucket it was
+    heard in). Per-repeater buckets are
+    keyed by hop prefix and direct key, as in ActivityConsumer (including
+    its AttributionIndex handling of shared prefixes), and resolved by
+    buckets_for() once the repeater set is known. Network
+    messages are distinct hashes per bucket; per-repeater messages are
+    message packets the repeater carried.
+    """
+    name = "rollups"
+
+    def __init__(self, since_ms=None, index=None):
+        self.since_ms = since_ms
+        self.index = index
+        self.through_ms = None
+        self.by_prefix = {}
+        self.direct_only = {}
+        self.resolved = {}
+        self.network = {}
+        self.message_hashes = {}
+
+    def consume(self, view):
+        heard_ms = view.heard_ms
+        inserted_ms = view.inserted_ms
+        if heard_ms is None or (self.since_ms is not None and inserted_ms <= self.since_ms):
+            return
+        if self.through_ms is None or inserted_ms > self.through_ms:
+            self.through_ms = inserted_ms
+        packet = view.packet
+        snr = packet.get("snr")
+        rssi = packet.get("rssi")
+        start = rollups.bucket_start(heard_ms, rollups.RESOLUTIONS["5m"])
+        message = (view.payload_type in ("TextMessage", "GroupText")
+                   and view.decoded.get("channel_hash") != 81)
+
+        network = self.network.get(start)
+        if network is None:
+            network = self.network[start] = rollups.Bucket()
+        network.add_packet(snr, rssi)
+        if message and packet.get("hash"):
+            self.message_hashes.setdefault(start, set()).add(packet["hash"])
+
+        hops = parse_path_hops(packet.get("path"))
+        prefixes = set(hops)
+        owners = ()
+        index = self.index
+        if index is not None and not index.ambiguous.isdisjoint(prefixes):
+            owners = set()
+            seen = set()
+            last = len(hops) - 1
+            for i, prefix in enumerate(hops):
+                if prefix in index.ambiguous and prefix not in seen:
+                    seen.add(prefix)
+                    key, _ = index.resolve(prefix, hops[i - 1] if i else None,
+                                           hops[i + 1] if i < last else OBSERVER)
+                    owners.add(key)
+            for key in owners:
+                bucket = self.resolved.get((start, key))
+                if bucket is None:
+                    bucket = self.resolved[(start, key)] = rollups.Bucket()
+                bucket.add_packet(snr, rssi, message)
+            prefixes -= index.ambiguous
+        for prefix in prefixes:
+            bucket = self.by_prefix.get((start, prefix))
+            if bucket is None:
+                bucket = self.by_prefix[(start, prefix)] = rollups.Bucket()
+            bucket.add_packet(snr, rssi, message)
+        pk = view.key
+        if pk and (pk[:2] not in hops or (owners and pk[:2] in index.ambiguous and pk not in owners)):
+            bucket = self.direct_only.get((start, pk))
+            if bucket is None:
+                bucket = self.direct_only[(start, pk)] = rollups.Bucket()
+            bucket.add_packet(snr, rssi, message)
+
+    def buckets_for(self, repeater_keys):
+        """
+        Resolve the accumulated buckets for a set of repeaters.
+
+        Args:
+            repeater_keys: Iterable of repeater public keys
+
+        Returns:
+            Dict mapping (start_ms, canonical key or rollups.NETWORK_KEY)
+            -> rollups.Bucket
+        """
+        keys_by_prefix = {}
+        wanted = set()
+        for key in repeater_keys:
+            pk = canonical_key(key)
+            wanted.add(pk)
+            keys_by_prefix.setdefault(pk[:2], []).append(pk)
+
+        buckets = {}
+        for (start, prefix), bucket in self.by_prefix.items():
+            for pk in keys_by_prefix.get(prefix, ()):
+                buckets.setdefault((start, pk), rollups.Bucket()).merge(bucket)
+        for direct in (self.direct_only, self.resolved):
+            for (start, pk), bucket in direct.items():
+                if pk in wanted:
+                    buckets.setdefault((start, pk), rollups.Bucket()).merge(bucket)
+        for start, bucket in self.network.items():
+            bucket.messages = len(self.message_hashes.get(start, ()))
+            buckets[(start, rollups.NETWORK_KEY)] = bucket
+        return buckets
+
+    def result(self):
+        return self
+
+    def merge(self, other):
+        if is_newer(other.through_ms, self.through_ms):
+            self.through_ms = other.through_ms
+        for mine, theirs in ((self.by_prefix, other.by_prefix), (self.direct_only, other.direct_only),
+                             (self.resolved, other.resolved), (self.network, other.network)):
+            for key, bucket in theirs.items():
+                current = mine.get(key)
+                if current is None:
+                    mine[key] = bucket
+                else:
+                    current.merge(bucket)
+        for start, hashes in other.message_hashes.items():
+            self.message_hashes.setdefault(start, set()).update(hashes)
+
+
+class TopologyConsumer(PacketConsumer):
+    """Add the paths of packets inserted after the graph's high-water mark to a TopologyGraph."""
+    name = "topology"
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.since_ms = graph.through_ms
+
+    def consume(self, view):
+        heard_ms = view.heard_ms
+        if heard_ms is None or (self.since_ms is not None and view.inserted_ms <= self.since_ms):
+            return
+        packet = view.packet
+        self.graph.add(parse_path_hops(packet.get("path")), heard_ms, packet.get("snr"), packet.get("rssi"),
+                       view.inserted_ms)
+
+    def result(self):
+        return self.graph
+
+    def merge(self, other):
+        self.graph.merge(other.graph)
+
+
+class AnalysisEngine:
+    """
+    Feed a packet stream once through a set of PacketConsumers.
+
+    Usage:
+        engine = AnalysisEngine.with_default_consumers()
+        engine.register(MyConsumer())
+        results = engine.run(packets)
+    """
+
+    def __init__(self, now=None):
+        self.now = now or datetime.now(timezone.utc)
+        self.consumers = []
+        self.packet_count = 0
+
+    @classmethod
+    def with_default_consumers(cls, now=None, index=None):
+        """
+        Create an engine with every consumer needed for the status document.
+
+        Args:
+            now: Reference time for the windows
+            index: Optional AttributionIndex for ambiguous hop prefixes
+        """
+        engine = cls(now)
+        window_start = datetime_to_ms(engine.now - timedelta(days=STATS_WINDOW_DAYS))
+        engine.register(RepeaterAdvertConsumer())
+        engine.register(LatestAdvertConsumer())
+        engine.register(ActivityConsumer(index))
+        engine.register(CompanionConsumer(window_start))
+        engine.register(MessageConsumer(window_start))
+        return engine
+
+    def register(self, consumer):
+        """Add a consumer; its name must be unique within the engine."""
+        if any(c.name == consumer.name for c in self.consumers):
+            raise ValueError(f"Consumer '{consumer.name}' is already registered")
+        self.consumers.append(consumer)
+        return consumer
+
+    def run(self, packets):
+        """
+        Make a single pass over packets.
+
+        Args:
+            packets: Any iterable of packet dicts or PacketViews (a list
+                     or a stream)
+
+        Returns:
+            Dict mapping consumer name -> consumer result
+        """
+        consume_fns = [c.consume for c in self.consumers]
+        count = 0
+        for view in iter_packet_views(packets):
+            for consume in consume_fns:
+                consume(view)
+            count += 1
+        self.packet_count = count
+        logger.info(f"Analyzed {count} packets in a single pass ({len(consume_fns)} consumers)")
+        return {c.name: c.result() for c in self.consumers}
+
+
+def feed_consumer(packets, consumer):
+    """
+    Pass packets through to a caller while also feeding one consumer.
+
+    Lets a consumer see the same single pass when the statistics are not
+    computed by an AnalysisEngine (--columnar).
+    """
+    for view in iter_packet_views(packets):
+        consumer.consume(view)
+        yield view
+
+
+def attach_consumers(engine, packets, consumers, columnar=False):
+    """
+    Add extra consumers to the analysis pass.
+
+    Args:
+        engine: AnalysisEngine that will run over packets
+        packets: Packet iterable about to be analyzed
+        consumers: PacketConsumers to add (None entries are skipped)
+        columnar: Statistics come from analyze_columnar(), so the
+                  consumers are fed from the packet stream instead
+
+    Returns:
+        The packet iterable to analyze
+    """
+    for consumer in consumers:
+        if consumer is None:
+            continue
+        if columnar:
+            packets = feed_consumer(packets, consumer)
+        else:
+            engine.register(consumer)
+    return packets
+
+
+def analyze_columnar(packets, now, index=None):
+    """
+    Compute the engine results from a columnar PacketTable (--columnar).
+
+    Args:
+        packets: Iterable of packet dicts
+        now: Reference time for the companion/message window
+        index: Optional AttributionIndex for ambiguous hop prefixes
+
+    Returns:
+        Dict shaped like AnalysisEngine.run() results, or None if numpy
+        is not installed
+    """
+    try:
+        from packet_table import PacketTable
+    except ImportError:
+        logger.error("numpy not installed. Install with: pip install numpy")
+        return None
+    table = PacketTable.from_packets(iter_packet_views(packets), parse_path_hops, canonical_key)
+    logger.info(f"Built columnar table of {len(table)} packets")
+    return table.results(datetime_to_ms(now - timedelta(days=STATS_WINDOW_DAYS)),
+                         DISTINCT_PRECISION, DISTINCT_EXACT_LIMIT, index)
+
+
+def distinct_window_counts(daily, now):
+    """
+    Answer the DISTINCT_WINDOWS_DAYS windows from per-day distinct counters.
+
+    Windows are whole UTC days (see DailyDistinct.window); the 30-day
+    window is exact to the cutoff because older packets were never added.
+
+    Args:
+        daily: DailyDistinct from CompanionConsumer/MessageConsumer
+        now: Reference time
+
+    Returns:
+        Dict like {"7d": {"count": 42, "exact": True, "relativeError": 0.0}}
+    """
+    now_ms = datetime_to_ms(now)
+    counts = {}
+    for days in DISTINCT_WINDOWS_DAYS:
+        window = daily.window(days, now_ms)
+        counts[f"{days}d"] = {
+            "count": window.count(),
+            "exact": window.exact,
+            "relativeError": 0.0 if window.exact else round(relative_error(window.precision), 4),
+        }
+        if not window.exact:
+            logger.info(f"{days}-day distinct count is a HyperLogLog estimate "
+                        f"(+/-{relative_error(window.precision):.2%} standard error)")
+    return counts
+
+
+def build_status_document(results, now=None):
+    """
+    Turn AnalysisEngine results into the repeater-status.json document.
+
+    Args:
+        results: Output of AnalysisEngine.run() with the default consumers
+        now: Reference time for the staleness cutoff and online status
+
+    Returns:
+        Output document dictionary
+    """
+    now = now or datetime.now(timezone.utc)
+    repeaters = results["repeaters"]["repeaters"]
+    logger.info(f"Aggregated into {len(repeaters)} unique repeaters")
+
+    # Exclude repeaters with no Advert packet in the last N days
+    cutoff_ms = datetime_to_ms(now - timedelta(days=ADVERT_STALE_DAYS))
+    repeaters = drop_stale_repeaters(repeaters, results["latest_advert"], cutoff_ms)
+
+    activity = results["activity"](repeaters.keys())
+    companion_counts = distinct_window_counts(results["companions"], now)
+    message_counts = distinct_window_counts(results["messages"], now)
+    companion_count = companion_counts[f"{STATS_WINDOW_DAYS}d"]["count"]
+    message_count = message_counts[f"{STATS_WINDOW_DAYS}d"]["count"]
+    logger.info(f"Found {companion_count} unique companion nodes active in last 30 days")
+    logger.info(f"Found {message_count} distinct messages (TextMessage/GroupText, excl. channel_hash=81) in last 30 days")
+
+    # Build node records with activity data (includes avg SNR, avg RSSI, last heard)
+    now_ms = datetime_to_ms(now)
+    nodes = [
+        build_node_record(pk, packet, activity.get(pk), now_ms)
+        for pk, packet in repeaters.items()
+    ]
+
+    # Calculate network statistics (includes companion count)
+    stats = calculate_network_stats(nodes, companion_count)
+
+    return {
+        "lastUpdated": stats["lastUpdated"],
+        "totalNodes": stats["totalNodes"],
+        "onlineNodes": stats["onlineNodes"],
+        "offlineNodes": stats["offlineNodes"],
+        "healthPercentage": stats["healthPercentage"],
+        "networkHealth": stats["networkHealth"],
+        "averageSignal": stats["averageSignal"],
+        "averageSNR": stats["averageSNR"],
+        "companionCount": stats["companionCount"],
+        "messageCount": message_count,
+        "companionCounts": companion_counts,
+        "messageCounts": message_counts,
+        "nodes": sorted(nodes, key=lambda n: n["name"])
+    }
+
+
+
+def status_output():
+    """JsonOutput for the status file (and its .min/.gz/.br variants and backup)."""
+    return JsonOutput(OUTPUT_FILE, backup_path=BACKUP_FILE)
+
+
 def load_previous_data():
     """
     Load previously saved repeater status data from JSON file.
@@ -598,43 +2069,32 @@ def load_previous_data():
     Returns:
         Dictionary with previous data or None if file doesn't exist or is invalid
     """
-    try:
-        if OUTPUT_FILE.exists():
-            with open(OUTPUT_FILE, 'r') as f:
-                data = json.load(f)
-            logger.info(f"Loaded previous data from {OUTPUT_FILE}")
-            return data
-    except (json.JSONDecodeError, IOError) as e:
-        logger.warning(f"Could not load previous data: {e}")
-    return None
+    data = status_output().load()
+    if data is not None:
+        logger.info(f"Loaded previous data from {OUTPUT_FILE}")
+    return data
 
 
-def save_json_data(data):
+def save_json_data(data, force=False):
     """
     Save repeater status data to JSON file.
     
+    The file (and its minified/compressed variants) is replaced
+    atomically, and left untouched if nothing but lastUpdated changed,
+    so an idle network does not produce a commit every run.
+    
     Args:
         data: Dictionary to save
+        force: Write even if only lastUpdated changed
         
     Returns:
-        True if successful, False otherwise
+        True if successful (including when already current), False otherwise
     """
     try:
-        # Create backup of previous file
-        if OUTPUT_FILE.exists():
-            # Remove existing backup first (Windows doesn't allow rename to existing file)
-            if BACKUP_FILE.exists():
-                BACKUP_FILE.unlink()
-            OUTPUT_FILE.rename(BACKUP_FILE)
-        
-        # Ensure output directory exists
-        OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
-        
-        # Write new file with pretty formatting
-        with open(OUTPUT_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
-        
-        logger.info(f"Saved repeater status to {OUTPUT_FILE}")
+        if status_output().write(data, force=force):
+            logger.info(f"Saved repeater status to {OUTPUT_FILE}")
+        else:
+            logger.info(f"Repeater status unchanged - not rewriting {OUTPUT_FILE}")
         return True
         
     except Exception as e:
@@ -642,90 +2102,1015 @@ def save_json_data(data):
         return False
 
 
-def main():
+def iter_store_views(store, since_ms):
+    """Yield PacketViews of the stored packets heard since since_ms, with their inserted_ms."""
+    for packet, inserted_ms in store.iter_packets(since_ms=since_ms, with_inserted=True):
+        yield PacketView(packet, inserted_ms)
+
+
+def store_and_load_window(store, api_data, now):
+    """
+    Add freshly fetched packets to the store and return the analysis window.
+
+    Args:
+        store: Open PacketStore
+        api_data: Packets from this fetch
+        now: Reference time for the window
+
+    Returns:
+        Iterator over PacketViews of the stored packets heard in the last
+        STATS_WINDOW_DAYS
+    """
+    window_start = datetime_to_ms(now - timedelta(days=STATS_WINDOW_DAYS))
+    # With a streamed fetch this stage also covers the download
+    with METRICS.stage("store") as stage:
+        stage.packets = store.insert(api_data)
+        store.prune(window_start)
+    logger.info(f"Packet store holds {store.count()} packets from the last {STATS_WINDOW_DAYS} days")
+    return iter_store_views(store, window_start)
+
+
+def load_attribution_index(store, api_data, now, input_files=None):
+    """
+    Build the AttributionIndex for this run, before the analysis pass.
+
+    Adverts are read back from the packet store (an indexed scan of a
+    fraction of the window), from --input packet archives (only blocks
+    holding Adverts from the window are decompressed), or taken from a
+    fetched list. A streamed fetch or --input of JSON dumps without the
+    store cannot be read twice, so shared prefixes are then credited to
+    every candidate, as before.
+
+    Returns:
+        AttributionIndex, or None if unavailable
+    """
+    with METRICS.stage("attribution"):
+        observer_keys = [key for key, _ in FETCH_SOURCES]
+        window_start = datetime_to_ms(now - timedelta(days=STATS_WINDOW_DAYS))
+        if store is not None:
+            adverts = store.iter_packets(since_ms=window_start, payload_type="Advert")
+            return build_attribution_index(adverts, now, observer_keys)
+        if input_files and all(is_archive(f) for f in input_files):
+            adverts = iter_archives(input_files, since_ms=window_start, payload_types={"Advert"},
+                                    fields=ADVERT_FIELDS)
+            return build_attribution_index(adverts, now, observer_keys)
+        if isinstance(api_data, list):
+            return build_attribution_index(api_data, now, observer_keys)
+    logger.info("Prefix attribution needs the packet store or a buffered fetch - crediting shared prefixes to all candidates")
+    return None
+
+
+def publish_status(output):
+    """
+    Save the status document and log a summary.
+
+    Args:
+        output: Document from build_status_document()
+
+    Returns:
+        Process exit code
+    """
+    with METRICS.stage("save") as stage:
+        saved = save_json_data(output)
+        if saved and METRICS.enabled:
+            stage.bytes = OUTPUT_FILE.stat().st_size
+    if saved:
+        logger.info("=" * 60)
+        logger.info(f"SUCCESS: Found {output['totalNodes']} repeaters")
+        logger.info(f"  - Online: {output['onlineNodes']}")
+        logger.info(f"  - Offline: {output['offlineNodes']}")
+        logger.info(f"  - Network Health: {output['networkHealth']} ({output['healthPercentage']}%)")
+        logger.info(f"  - Avg Signal: {output['averageSignal']} dBm")
+        logger.info(f"  - Avg SNR: {output['averageSNR']} dB")
+        logger.info(f"  - Companion Nodes (30d): {output['companionCount']}")
+        logger.info(f"  - Messages (30d): {output['messageCount']}")
+        logger.info("=" * 60)
+        return 0
+    else:
+        logger.error("Failed to save output file")
+        return 1
+
+
+def update_rollups(rollup_store, consumer, output, now):
+    """
+    Append this run's rollup buckets, compact, and export history files.
+
+    Failures are logged and do not affect the status update.
+
+    Args:
+        rollup_store: Open rollups.RollupStore
+        consumer: RollupConsumer that saw this run's packets
+        output: Document from build_status_document()
+        now: Reference time (the status snapshot time)
+    """
+    now_ms = datetime_to_ms(now)
+    try:
+        with METRICS.stage("rollups") as stage:
+            keys = [node["publicKey"] for node in output["nodes"]]
+            buckets = rollups.merge_buckets(consumer.buckets_for(keys),
+                                            rollups.status_buckets(output, now_ms))
+            stage.packets = rollup_store.append(buckets, consumer.through_ms)
+            rollup_store.compact(now_ms)
+            rollup_store.export(HISTORY_DIR, output["nodes"], now_ms)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not update rollups: {e}")
+
+
+def update_topology(graph, output, now):
+    """
+    Prune, save and export the topology graph.
+
+    Failures are logged and do not affect the status update.
+
+    Args:
+        graph: TopologyGraph updated by this run's TopologyConsumer
+        output: Document from build_status_document()
+        now: Reference time
+    """
+    nodes_by_prefix = {}
+    for node in output["nodes"]:
+        location = node.get("location") or {}
+        nodes_by_prefix.setdefault(canonical_key(node["publicKey"])[:2], []).append({
+            "id": node["id"],
+            "name": node["name"],
+            "lat": location.get("latitude"),
+            "lon": location.get("longitude"),
+        })
+    try:
+        with METRICS.stage("topology") as stage:
+            graph.prune(datetime_to_ms(now - timedelta(days=STATS_WINDOW_DAYS)))
+            graph.save(TOPOLOGY_STATE_FILE)
+            document = graph.export(nodes_by_prefix, generated=now.isoformat())
+            write_atomic(TOPOLOGY_FILE, json.dumps(document, separators=(",", ":")).encode())
+            stage.packets = len(graph)
+        logger.info(f"Topology graph: {len(graph)} links between {len(document['nodes'])} hops")
+    except OSError as e:
+        logger.warning(f"Could not update topology: {e}")
+
+
+def update_shards(output, history_dir=None):
+    """
+    Write the summary, node index and per-node files for the website.
+
+    Failures are logged and do not affect the status update.
+
+    Args:
+        output: Document from build_status_document()
+        history_dir: Directory of this run's history exports to embed in
+                     the node files, or None
+    """
+    try:
+        with METRICS.stage("shards") as stage:
+            stats = write_shards(output, SHARD_DIR, history_dir)
+            stage.packets = stats["nodeFiles"]
+            stage.bytes = stats["summaryBytes"]
+        logger.info(f"Sharded status: {stats['nodeFiles']} node files updated, {stats['removed']} removed, "
+                    f"summary + index {stats['summaryBytes']} bytes")
+    except OSError as e:
+        logger.warning(f"Could not update status shards: {e}")
+
+
+def add_addresses(output, geocoder):
+    """
+    Reverse-geocode each node's location into location.address.
+
+    Failures are logged and leave the addresses empty.
+
+    Args:
+        output: Document from build_status_document() (updated in place)
+        geocoder: geocode.ReverseGeocoder
+    """
+    hits, misses = geocoder.hits, geocoder.misses
+    try:
+        with METRICS.stage("geocode") as stage:
+            for node in output["nodes"]:
+                location = node["location"]
+                location["address"] = geocoder.address(location["latitude"], location["longitude"])
+            geocoder.save()
+            stage.packets = geocoder.misses - misses
+    except OSError as e:
+        logger.warning(f"Could not update geocode cache: {e}")
+    logger.info(f"Geocoded {len(output['nodes'])} repeaters "
+                f"({geocoder.hits - hits} cached, {geocoder.misses - misses} looked up)")
+
+
+def status_content(document):
+    """Return the status document without its timestamps (lastUpdated and each node's lastSeen)."""
+    return semantic_content(document)
+
+
+# ============================================================================
+# Parallel replay of archived API dumps (--replay)
+#
+# Backfilling months of history from saved API responses is too slow on
+# one core. The dumps are first split by UTC day of heard_at (one task
+# per file), then each day is deduplicated and analyzed by a full set of
+# consumers (one task per day), and the per-day consumers are merged
+# oldest first. Duplicates of a packet share its heard_at, so they always
+# meet in the same day, and within a day packets keep their file order:
+# the merged result is what one pass over the deduplicated dumps, in
+# file name order, would have produced. The one exception is the SNR/RSSI
+# quantiles (p10/p50/p90): t-digests merge within their usual error
+# rather than bit for bit.
+# ============================================================================
+
+REPLAY_RANGE_MS = 86_400_000  # time range analyzed by one replay task (one UTC day)
+REPLAY_UNDATED = -1  # range of packets without a valid heard_at
+
+
+def replay_files(directory):
+    """Archived API responses (.json/.json.gz) and packet archives under directory, in path order."""
+    return sorted(path for path in Path(directory).rglob("*")
+                  if path.name.endswith((".json", ".json.gz", ARCHIVE_SUFFIX)) and path.is_file())
+
+
+def _range_path(spool, time_range, file_index):
+    return Path(spool) / f"{time_range}.{file_index:06d}.pickle"
+
+
+def split_replay_file(task):
+    """
+    Split one archived dump into per-day packet lists in the spool directory.
+
+    Runs in a worker process.
+
+    Args:
+        task: Tuple of (file index, dump path, spool directory)
+
+    Returns:
+        Tuple of (file index, sorted list of ranges written, packet count,
+        newest heard_ms or None)
+    """
+    file_index, path, spool = task
+    ranges = {}
+    newest = None
+    count = 0
+    for packet in iter_packet_file(path):
+        heard_ms = parse_heard_at_ms(packet.get("heard_at", ""))
+        if heard_ms is None:
+            time_range = REPLAY_UNDATED
+        else:
+            time_range = heard_ms // REPLAY_RANGE_MS
+            if newest is None or heard_ms > newest:
+                newest = heard_ms
+        ranges.setdefault(time_range, []).append(packet)
+        count += 1
+    for time_range, packets in ranges.items():
+        with open(_range_path(spool, time_range, file_index), "wb") as f:
+            pickle.dump(packets, f, pickle.HIGHEST_PROTOCOL)
+    return file_index, sorted(ranges), count, newest
+
+
+def iter_replay_range(paths, seen=None, copies=None):
+    """
+    Yield the packets of one time range in file order, skipping duplicates.
+
+    Observer copies are dropped as PacketStore.insert() would drop them.
+
+    Args:
+        paths: Spool files of the range, in file order
+        seen: Set of packet_store_key() values already yielded (updated)
+        copies: CopyIndex of the packets already yielded (updated)
+    """
+    seen = set() if seen is None else seen
+    copies = CopyIndex(parse_path_hops) if copies is None else copies
+    for path in paths:
+        with open(path, "rb") as f:
+            packets = pickle.load(f)
+        for packet in packets:
+            key = packet_store_key(packet)
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            if copies.is_copy(packet, parse_heard_at_ms(packet.get("heard_at"))):
+                continue
+            yield packet
+
+
+def replay_consumers(now, index, rollup_since=None, topology_since=None, rollup=True, topology=True):
+    """
+    Fresh consumers for one replay task: the engine defaults plus rollups and topology.
+
+    Args:
+        now: Reference time for the windows
+        index: AttributionIndex or None
+        rollup_since: Rollup store high-water mark (epoch ms) or None
+        topology_since: Topology graph high-water mark (epoch ms) or None
+        rollup: Include a RollupConsumer
+        topology: Include a TopologyConsumer
+
+    Returns:
+        List of PacketConsumers
+    """
+    consumers = AnalysisEngine.with_default_consumers(now, index).consumers
+    if rollup:
+        consumers.append(RollupConsumer(rollup_since, index))
+    if topology:
+        consumer = TopologyConsumer(TopologyGraph())
+        consumer.since_ms = topology_since
+        consumers.append(consumer)
+    return consumers
+
+
+def analyze_replay_range(task):
+    """
+    Deduplicate and analyze one time range.
+
+    Runs in a worker process.
+
+    Args:
+        task: Tuple of (spool files in file order, replay_consumers() arguments)
+
+    Returns:
+        Tuple of (consumers, packets analyzed)
+    """
+    paths, consumer_args = task
+    consumers = replay_consumers(*consumer_args)
+    consume_fns = [c.consume for c in consumers]
+    count = 0
+    for view in iter_packet_views(iter_replay_range(paths)):
+        for consume in consume_fns:
+            consume(view)
+        count += 1
+    for consumer in consumers:
+        # The parent has the index; do not send a copy back with every range
+        if hasattr(consumer, "index"):
+            consumer.index = None
+    return consumers, count
+
+
+def replay_archive(directory, workers=None, rollup_store=None, topology=None, geocoder=None):
+    """
+    Analyze a directory of archived API responses with a process pool.
+
+    The status is computed as of the newest packet in the archive, and
+    rollups and the topology graph are updated with every packet newer
+    than their high-water marks, so replaying into an empty rollup
+    directory backfills the full history.
+
+    Args:
+        directory: Directory searched (recursively) for .json/.json.gz
+                   dumps and packet archives
+        workers: Worker processes (default: one per CPU); 1 runs in-process
+        rollup_store: Optional rollups.RollupStore to update
+        topology: Optional TopologyGraph to update and export
+        geocoder: Optional geocode.ReverseGeocoder for node addresses
+
+    Returns:
+        Process exit code
+    """
+    paths = replay_files(directory)
+    if not paths:
+        logger.error(f"No .json, .json.gz or {ARCHIVE_SUFFIX} files found in {directory}")
+        return 1
+    workers = workers or os.cpu_count() or 1
+    logger.info(f"Replaying {len(paths)} archived responses from {directory} with {workers} workers")
+
+    with tempfile.TemporaryDirectory(prefix="replay-") as spool, \
+            (ProcessPoolExecutor(workers) if workers > 1 else nullcontext()) as pool:
+        map_fn = pool.map if pool is not None else map
+        ranges = {}  # time range -> spool files in file order
+        newest = None
+        total = 0
+        with METRICS.stage("fetch") as stage:
+            tasks = [(i, path, spool) for i, path in enumerate(paths)]
+            for file_index, file_ranges, count, file_newest in map_fn(split_replay_file, tasks):
+                for time_range in file_ranges:
+                    ranges.setdefault(time_range, []).append(_range_path(spool, time_range, file_index))
+                if is_newer(file_newest, newest):
+                    newest = file_newest
+                total += count
+            stage.packets = total
+        logger.info(f"Split {total} packets into {len(ranges)} daily ranges")
+
+        now = ms_to_datetime(newest) if newest is not None else datetime.now(timezone.utc)
+        logger.info(f"Replaying status as of {now.isoformat()}")
+        with METRICS.stage("attribution"):
+            # Same Adverts as the packet store would return: deduplicated, within the window
+            window_start = datetime_to_ms(now - timedelta(days=STATS_WINDOW_DAYS))
+            seen = set()
+            copies = CopyIndex(parse_path_hops)
+            window = itertools.chain.from_iterable(
+                iter_replay_range(ranges[r], seen, copies) for r in sorted(ranges)
+                if r >= window_start // REPLAY_RANGE_MS)
+            adverts = (view for view in iter_packet_views(window)
+                       if view.payload_type == "Advert" and view.heard_ms >= window_start)
+            index = build_attribution_index(adverts, now, [key for key, _ in FETCH_SOURCES])
+
+        if rollup_store is not None and rollup_store.through_ms is not None:
+            # Archived packets carry no store insertion time, so they are cut on heard time
+            logger.info(f"Rollups already cover packets stored through {format_epoch_ms(rollup_store.through_ms)}; "
+                        f"packets heard before it are not added (replay into an empty --rollups directory "
+                        f"to backfill)")
+        consumer_args = (now, index,
+                         rollup_store.through_ms if rollup_store is not None else None,
+                         topology.through_ms if topology is not None else None,
+                         rollup_store is not None, topology is not None)
+        # The partial graphs are merged into the caller's graph
+        consumers = replay_consumers(*consumer_args[:-1], topology=False)
+        if topology is not None:
+            consumers.append(TopologyConsumer(topology))
+        analyzed = 0
+        with METRICS.stage("analyze") as stage:
+            tasks = [(ranges[r], consumer_args) for r in sorted(ranges)]
+            # Ranges come back oldest first, so merging keeps the first-seen tie-breaking
+            for partial, count in map_fn(analyze_replay_range, tasks):
+                for consumer, other in zip(consumers, partial):
+                    consumer.merge(other)
+                analyzed += count
+            stage.packets = analyzed
+        logger.info(f"Analyzed {analyzed} distinct packets in {len(ranges)} ranges")
+
+    results = {c.name: c.result() for c in consumers}
+    if not results["repeaters"]["packet_count"]:
+        logger.warning("No repeater packets found in the archive - leaving existing data file unchanged")
+        return 0
+    rollup = results.get("rollups")
+    with METRICS.stage("build"):
+        output = build_status_document(results, now)
+    if geocoder is not None:
+        add_addresses(output, geocoder)
+    if rollup is not None:
+        update_rollups(rollup_store, rollup, output, now)
+    if topology is not None:
+        update_topology(topology, output, now)
+    update_shards(output, HISTORY_DIR if rollup is not None else None)
+    return publish_status(output)
+
+
+# ============================================================================
+# Daemon mode
+#
+# A scheduled run starts cold: it installs dependencies, solves the
+# Cloudflare challenge and re-reads the whole window every time. --daemon
+# keeps one process alive instead, with the scraper sessions (and their
+# clearance cookies) warm and the window held in memory as parsed
+# PacketViews, so each poll only fetches and parses what is new.
+# ============================================================================
+
+class StatusDaemon:
+    """
+    Poll the API on an interval and keep repeater-status.json current.
+
+    With a PollScheduler (--adaptive) the delay between polls follows
+    packet arrivals, upcoming offline crossings and errors instead.
+
+    Usage:
+        daemon = StatusDaemon(store)
+        daemon.run(stop_event)
+    """
+
+    def __init__(self, store=None, interval=DAEMON_INTERVAL, jitter=DAEMON_JITTER,
+                 max_backoff=DAEMON_MAX_BACKOFF, stream=False, columnar=False, rng=None,
+                 rollup_store=None, topology=None, geocoder=None, on_status=None, scheduler=None):
+        self.store = store
+        self.rollup_store = rollup_store
+        self.topology = topology
+        self.geocoder = geocoder
+        self.on_status = on_status  # called with every poll's status document
+        self.interval = interval
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.stream = stream
+        self.columnar = columnar
+        self.rng = rng or random.Random()
+        self.window = {}  # packet_store_key -> PacketView within the stats window
+        self.copies = CopyIndex(parse_path_hops)  # observer copies of the windowed packets
+        self.high_water = ""
+        self.high_water_ms = None
+        self.failures = 0
+        self.scheduler = scheduler  # PollScheduler replacing the fixed interval, if given
+        self.last_added = None  # packets new in the last poll
+        self.last_online = None  # last-heard times of the online repeaters after the last poll
+        self.published = status_content(load_previous_data())
+
+    def add_packets(self, packets, persist=True):
+        """
+        Add packets to the in-memory window, skipping ones already held
+        and observer copies of them.
+
+        Args:
+            packets: Iterable of packet dicts or PacketViews
+            persist: Also insert the new packets into the packet store
+                     (their views then take its inserted_ms stamp)
+
+        Returns:
+            Number of packets that were new
+        """
+        new_views = []
+        for view in iter_packet_views(packets):
+            packet = view.packet
+            key = packet_store_key(packet)
+            if key is None or key in self.window:
+                continue
+            if view.heard_ms is None or self.copies.is_copy(packet, view.heard_ms):
+                continue
+            self.window[key] = view
+            new_views.append(view)
+            if is_newer(view.heard_ms, self.high_water_ms):
+                self.high_water_ms = view.heard_ms
+                self.high_water = view.heard_at
+        if persist and self.store is not None and new_views:
+            self.store.insert(view.packet for view in new_views)
+            if self.store.last_inserted_ms is not None:
+                for view in new_views:
+                    view.inserted_ms = self.store.last_inserted_ms
+        return len(new_views)
+
+    def load_window(self, now=None):
+        """Fill the in-memory window from the packet store (once, at startup)."""
+        if self.store is None:
+            return
+        now = now or datetime.now(timezone.utc)
+        window_start = datetime_to_ms(now - timedelta(days=STATS_WINDOW_DAYS))
+        loaded = self.add_packets(iter_store_views(self.store, window_start), persist=False)
+        logger.info(f"Loaded {loaded} packets from the packet store")
+
+    def evict(self, now):
+        """Drop packets that have aged out of the stats window."""
+        window_start = datetime_to_ms(now - timedelta(days=STATS_WINDOW_DAYS))
+        before = len(self.window)
+        self.window = {k: v for k, v in self.window.items() if v.heard_ms >= window_start}
+        self.copies.prune(window_start)
+        if self.store is not None:
+            self.store.prune(window_start)
+        return before - len(self.window)
+
+    def poll(self, now=None):
+        """
+        Fetch new packets, recompute the status and write it if it changed.
+
+        Returns:
+            True if the fetch succeeded, False otherwise
+        """
+        self.last_added = self.last_online = None
+        if FETCH_CACHE is not None:
+            FETCH_CACHE.begin_run()
+        with METRICS.stage("fetch") as stage:
+            if self.stream:
+                packets = stream_sources(FETCH_SOURCES, since=self.high_water)
+            else:
+                packets = fetch_sources(FETCH_SOURCES, since=self.high_water)
+            if packets is None:
+                return False
+            try:
+                added = self.add_packets(packets)
+            except (FetchError, ValueError, OSError) as e:
+                logger.warning(f"Packet stream failed ({str(e)[:200]})")
+                return False
+            stage.packets = added
+        self.last_added = added
+        crossing_due = self.scheduler is not None and self.scheduler.crossing_due()
+        if not self.stream and not crossing_due and fetch_unchanged():
+            return True
+
+        now = now or datetime.now(timezone.utc)
+        evicted = self.evict(now)
+        logger.info(f"Window holds {len(self.window)} packets ({added} new, {evicted} expired)")
+
+        with METRICS.stage("analyze") as stage:
+            stage.packets = len(self.window)
+            index = build_attribution_index(self.window.values(), now, [key for key, _ in FETCH_SOURCES])
+            engine = AnalysisEngine.with_default_consumers(now, index)
+            rollup = RollupConsumer(self.rollup_store.through_ms, index) if self.rollup_store is not None else None
+            topology = TopologyConsumer(self.topology) if self.topology is not None else None
+            packets = attach_consumers(engine, self.window.values(), (rollup, topology), self.columnar)
+            results = analyze_columnar(packets, now, index) if self.columnar else None
+            if results is None:
+                results = engine.run(packets)
+        if not results["repeaters"]["packet_count"]:
+            logger.warning("No repeater packets in the window - leaving existing data file unchanged")
+            return True
+
+        with METRICS.stage("build"):
+            output = build_status_document(results, now)
+        if self.geocoder is not None:
+            add_addresses(output, self.geocoder)
+        if rollup is not None:
+            update_rollups(self.rollup_store, rollup, output, now)
+        if topology is not None:
+            update_topology(self.topology, output, now)
+        if self.on_status is not None:
+            self.on_status(output)
+        self.last_online = online_last_heard(output)
+        content = status_content(output)
+        if content == self.published:
+            logger.info("Repeater status unchanged - not rewriting the data file")
+        else:
+            update_shards(output, HISTORY_DIR if rollup is not None else None)
+            if publish_status(output) == 0:
+                self.published = content
+        mark_fetch_analyzed()
+        return True
+
+    def next_delay(self, ok):
+        """
+        Seconds to wait before the next poll.
+
+        Successful polls wait interval; each consecutive failure doubles
+        the wait up to max_backoff. Either way the delay is jittered by
+        +/- jitter so several daemons do not poll in lockstep.
+        """
+        if ok:
+            self.failures = 0
+            delay = self.interval
+        else:
+            self.failures += 1
+            delay = min(self.max_backoff, self.interval * 2 ** self.failures)
+        return max(1.0, delay * (1 + self.rng.uniform(-self.jitter, self.jitter)))
+
+    def run(self, stop=None):
+        """
+        Poll until stop is set.
+
+        Args:
+            stop: threading.Event that ends the loop (checked between polls)
+        """
+        stop = stop or threading.Event()
+        self.load_window()
+        while not stop.is_set():
+            requests = requests_sent()
+            try:
+                ok = self.poll()
+            except Exception as e:
+                logger.error(f"Poll failed: {str(e)[:200]}")
+                ok = False
+            METRICS.incr("polls")
+            if not ok:
+                METRICS.incr("poll_failures")
+            METRICS.flush()
+            if self.scheduler is not None:
+                delay = self.scheduler.record(ok, requests_sent() - requests, self.last_added, self.last_online)
+                logger.info(f"Next poll in {delay:.0f}s ({self.scheduler.reason})")
+            else:
+                delay = self.next_delay(ok)
+                logger.info(f"Next poll in {delay:.0f}s")
+            stop.wait(delay)
+
+
+def parse_listen(value):
+    """Parse a --serve value, [HOST:]PORT, into (host, port)."""
+    host, _, port = value.rpartition(":")
+    try:
+        return host or "127.0.0.1", int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected [HOST:]PORT, not {value!r}")
+
+
+def start_status_server(listen, history_dir=None):
+    """
+    Start the --serve HTTP server in a background thread.
+
+    Args:
+        listen: (host, port) to listen on
+        history_dir: Directory of history exports to include in node responses
+
+    Returns:
+        Tuple of (StatusState, server)
+    """
+    state = StatusState(history_dir)
+    previous = load_previous_data()
+    if previous and "nodes" in previous:
+        state.publish(previous)
+    server = make_server(state, *listen)
+    threading.Thread(target=server.serve_forever, name="status-server", daemon=True).start()
+    host, port = server.server_address[:2]
+    logger.info(f"Serving status at http://{host}:{port}/status.json (events at /events)")
+    return state, server
+
+
+def online_last_heard(output):
+    """Last-heard times (epoch ms) of the repeaters online in a status document."""
+    return [parse_heard_at_ms(node["lastSeen"]) for node in output["nodes"] if node["status"] == "online"]
+
+
+def fetch_unchanged():
+    """
+    True if this run's API responses all matched FETCH_CACHE (304s or
+    byte-identical bodies) and were analyzed within FETCH_UNCHANGED_MAX_AGE.
+
+    The last status then still stands; the age bound lets time-based
+    fields (online status, windows) catch up even when nothing new is heard.
+    """
+    if FETCH_CACHE is None or not FETCH_CACHE.unchanged(FETCH_UNCHANGED_MAX_AGE):
+        return False
+    METRICS.incr("analyses_skipped")
+    logger.info("API responses unchanged since the last analysis - leaving existing data files unchanged")
+    return True
+
+
+def mark_fetch_analyzed():
+    """Record in FETCH_CACHE that this run's responses were analyzed, and save it."""
+    if FETCH_CACHE is None:
+        return
+    FETCH_CACHE.mark_analyzed()
+    try:
+        FETCH_CACHE.save()
+    except OSError as e:
+        logger.warning(f"Could not save fetch cache: {e}")
+
+
+def scheduler_config(args, jitter=0.0):
+    """PollScheduler settings from --min-interval, --max-interval and --request-budget."""
+    return dict(min_interval=args.min_interval, max_interval=args.max_interval,
+                hourly_budget=args.request_budget, threshold_seconds=ONLINE_THRESHOLD_MINUTES * 60,
+                jitter=jitter)
+
+
+def run_daemon(store, args, rollup_store=None, topology=None, geocoder=None):
+    """Run StatusDaemon (and the --serve server) until SIGTERM or Ctrl-C."""
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    state = server = None
+    if args.serve:
+        state, server = start_status_server(args.serve, HISTORY_DIR if rollup_store is not None else None)
+    scheduler = PollScheduler(**scheduler_config(args, args.jitter)) if args.adaptive else None
+    daemon = StatusDaemon(store, interval=args.interval, jitter=args.jitter,
+                          stream=args.stream, columnar=args.columnar, rollup_store=rollup_store,
+                          topology=topology, geocoder=geocoder,
+                          on_status=state.publish if state is not None else None, scheduler=scheduler)
+    if scheduler is not None:
+        logger.info(f"Daemon mode: adaptive polling every {args.min_interval}-{args.max_interval}s, "
+                    f"at most {args.request_budget} requests per hour")
+    else:
+        logger.info(f"Daemon mode: polling every {args.interval}s (+/-{args.jitter:.0%})")
+    try:
+        daemon.run(stop)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server is not None:
+            state.close()
+            server.shutdown()
+            server.server_close()
+    logger.info("Daemon stopped")
+    return 0
+
+
+def parse_args(argv=None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Fetch repeater status from letsmesh.net")
+    parser.add_argument("--store", type=Path, default=PACKET_STORE_FILE,
+                        help="SQLite packet store path (default: %(default)s)")
+    parser.add_argument("--no-store", action="store_true",
+                        help="Analyze only this fetch, without the packet store")
+    parser.add_argument("--stream", action="store_true",
+                        help="Parse API responses incrementally instead of loading them whole")
+    parser.add_argument("--input", type=Path, nargs="+", metavar="FILE",
+                        help="Analyze archived API responses (.json/.json.gz) or packet archives (.pktar) "
+                             "instead of fetching; combine with --no-store for data older than the stats window")
+    parser.add_argument("--replay", type=Path, metavar="DIR",
+                        help="Backfill from a directory of archived API responses, analyzed in parallel "
+                             "(status as of the newest packet; does not use the packet store)")
+    parser.add_argument("--workers", type=int, metavar="N",
+                        help="Worker processes for --replay (default: one per CPU)")
+    parser.add_argument("--columnar", action="store_true",
+                        help="Compute statistics on NumPy columns instead of per-packet loops (needs numpy)")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Keep running and poll on an interval, writing only when the status changes")
+    parser.add_argument("--serve", type=parse_listen, metavar="[HOST:]PORT",
+                        help="Run as a daemon and serve the status over HTTP with live updates "
+                             "(Server-Sent Events at /events)")
+    parser.add_argument("--api-url", metavar="URL",
+                        help="Packet API endpoint, e.g. a local stub-letsmesh-server.py "
+                             "(default: $LETSMESH_API_URL or the letsmesh.net API)")
+    parser.add_argument("--fetch-cache", type=Path, default=FETCH_CACHE_DIR, metavar="DIR",
+                        help="Cookies, validators and last API responses kept between runs (default: %(default)s)")
+    parser.add_argument("--no-fetch-cache", action="store_true",
+                        help="Send unconditional requests and always analyze the fetched data")
+    parser.add_argument("--interval", type=float, default=DAEMON_INTERVAL,
+                        help="Seconds between polls in --daemon mode (default: %(default)s)")
+    parser.add_argument("--jitter", type=float, default=DAEMON_JITTER,
+                        help="Random +/- fraction applied to each poll delay (default: %(default)s)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Adapt the poll interval to packet arrivals, repeaters about to go offline and "
+                             "API errors (replaces --interval); without --daemon, runs that are not due yet "
+                             f"exit without fetching (schedule kept in {POLL_SCHEDULE_FILE})")
+    parser.add_argument("--min-interval", type=float, default=POLL_MIN_INTERVAL,
+                        help="Shortest delay between --adaptive polls, seconds (default: %(default)s)")
+    parser.add_argument("--max-interval", type=float, default=POLL_MAX_INTERVAL,
+                        help="Longest delay between --adaptive polls, seconds (default: %(default)s)")
+    parser.add_argument("--request-budget", type=int, default=POLL_REQUEST_BUDGET, metavar="N",
+                        help="Most API requests per hour with --adaptive (default: %(default)s)")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], type=str.upper,
+                        help="Logging level (default: $LOG_LEVEL or INFO)")
+    parser.add_argument("--metrics", type=Path, nargs="?", const=METRICS_FILE, metavar="PATH",
+                        help=f"Write per-stage timing/resource metrics as JSON (default path: {METRICS_FILE})")
+    parser.add_argument("--prometheus", type=Path, metavar="PATH",
+                        help="Also write metrics in Prometheus text format (e.g. for a textfile collector)")
+    parser.add_argument("--rollups", type=Path, default=ROLLUP_DIR, metavar="DIR",
+                        help="Directory of historical rollup files (default: %(default)s)")
+    parser.add_argument("--no-rollups", action="store_true",
+                        help=f"Do not update rollups or the history files in {HISTORY_DIR}")
+    parser.add_argument("--no-topology", action="store_true",
+                        help=f"Do not update the topology graph ({TOPOLOGY_FILE})")
+    parser.add_argument("--gazetteer", type=Path, default=GAZETTEER_FILE, metavar="PATH",
+                        help="Gazetteer for reverse-geocoding repeater locations (default: %(default)s)")
+    parser.add_argument("--no-geocode", action="store_true",
+                        help="Leave repeater addresses empty")
+    args = parser.parse_args(argv)
+    if args.serve:
+        args.daemon = True
+    if args.daemon and (args.input or args.replay):
+        parser.error("--daemon and --serve fetch from the API and cannot be combined with --input or --replay")
+    if args.replay and (args.input or args.columnar):
+        parser.error("--replay cannot be combined with --input or --columnar")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.adaptive and (args.input or args.replay):
+        parser.error("--adaptive schedules API polls and cannot be combined with --input or --replay")
+    if not 0 < args.min_interval <= args.max_interval:
+        parser.error("--min-interval must be positive and at most --max-interval")
+    if args.request_budget < 1:
+        parser.error("--request-budget must be at least 1")
+    return args
+
+
+def main(argv=None):
     """Main execution function."""
+    global API_ENDPOINT, FETCH_CACHE
+    args = parse_args(argv)
+    if args.api_url:
+        API_ENDPOINT = args.api_url
+    if args.log_level:
+        logging.getLogger().setLevel(args.log_level)
+    METRICS.configure(json_path=args.metrics, prometheus_path=args.prometheus)
+    
     logger.info("=" * 60)
     logger.info("Starting repeater status fetch from letsmesh.net API")
-    logger.info(f"Observer: {OBSERVER_PUBLIC_KEY[:16]}..." if OBSERVER_PUBLIC_KEY else "Observer: NOT SET")
-    logger.info(f"Region: {MESH_REGION}")
+    logger.info(f"API endpoint: {API_ENDPOINT}")
+    for observer_key, region in FETCH_SOURCES:
+        logger.info(f"Observer: {observer_key[:16]}... Region: {region}" if observer_key else f"Observer: NOT SET Region: {region}")
     logger.info("=" * 60)
     
-    # Fetch data from API using cloudscraper
-    api_data = fetch_api_data(OBSERVER_PUBLIC_KEY, MESH_REGION)
+    scheduler = None
+    if args.adaptive and not args.daemon:
+        scheduler = PollScheduler.load(POLL_SCHEDULE_FILE, **scheduler_config(args))
+        if not scheduler.due(POLL_DUE_SLACK):
+            logger.info(f"Next poll due in {scheduler.next_due - scheduler.clock():.0f}s "
+                        f"({scheduler.reason}) - not fetching")
+            return 0
+    
+    store = None
+    if not args.no_store and not args.replay:
+        try:
+            store = PacketStore(args.store, parse_path_hops)
+        except Exception as e:
+            logger.warning(f"Packet store unavailable, analyzing this fetch only: {e}")
+    
+    rollup_store = None
+    if not args.no_rollups:
+        try:
+            rollup_store = rollups.RollupStore(args.rollups)
+        except OSError as e:
+            logger.warning(f"Rollup store unavailable, skipping history: {e}")
+    topology = None if args.no_topology else TopologyGraph.load(TOPOLOGY_STATE_FILE)
+    geocoder = None if args.no_geocode else ReverseGeocoder(args.gazetteer, GEOCODE_CACHE_FILE)
+    if not (args.no_fetch_cache or args.input or args.replay):
+        FETCH_CACHE = FetchCache(args.fetch_cache)
+    
+    try:
+        if args.daemon:
+            return run_daemon(store, args, rollup_store, topology, geocoder)
+        if args.replay:
+            return replay_archive(args.replay, args.workers, rollup_store, topology, geocoder)
+        return run_once(store, stream=args.stream, input_files=args.input, columnar=args.columnar,
+                        rollup_store=rollup_store, topology=topology, geocoder=geocoder, scheduler=scheduler)
+    finally:
+        if scheduler is not None:
+            try:
+                scheduler.save(POLL_SCHEDULE_FILE)
+            except OSError as e:
+                logger.warning(f"Could not save poll schedule: {e}")
+        if FETCH_CACHE is not None:
+            try:
+                FETCH_CACHE.save()
+            except OSError as e:
+                logger.warning(f"Could not save fetch cache: {e}")
+        if store is not None:
+            store.close()
+        METRICS.flush()
+
+
+def count_heard_after(packets, since_ms, counts):
+    """Pass packets through, counting in counts["arrivals"] those heard after since_ms."""
+    for packet in packets:
+        if is_newer(parse_heard_at_ms(packet.get("heard_at")), since_ms):
+            counts["arrivals"] += 1
+        yield packet
+
+
+def run_once(store=None, stream=False, input_files=None, columnar=False, rollup_store=None,
+             topology=None, geocoder=None, scheduler=None):
+    """
+    Fetch, analyze and save one status update.
+    
+    Args:
+        store: Optional open PacketStore
+        stream: Parse API responses incrementally (see stream_sources)
+        input_files: Optional archived API responses or packet archives
+                     to analyze instead of fetching
+        columnar: Compute statistics with a NumPy PacketTable
+        rollup_store: Optional rollups.RollupStore to update
+        topology: Optional TopologyGraph to update and export
+        geocoder: Optional geocode.ReverseGeocoder for node addresses
+        scheduler: Optional PollScheduler told about this poll (--adaptive)
+        
+    Returns:
+        Process exit code
+    """
+    requests = requests_sent()
+    counts = {"arrivals": 0}
+    
+    def polled(ok, output=None):
+        if scheduler is None:
+            return
+        delay = scheduler.record(ok, requests_sent() - requests, counts["arrivals"] if ok else None,
+                                 online_last_heard(output) if output is not None else None)
+        logger.info(f"Next poll due in {delay:.0f}s ({scheduler.reason})")
+    
+    high_water = store.high_water_mark() if store is not None else None
+    if high_water:
+        logger.info(f"Packet store high-water mark: {high_water}")
+    
+    if FETCH_CACHE is not None:
+        FETCH_CACHE.begin_run()
+    with METRICS.stage("fetch") as stage:
+        if input_files:
+            api_data = itertools.chain.from_iterable(iter_packet_file(f) for f in input_files)
+        elif stream:
+            # Packets flow into the store/engine while the response downloads
+            api_data = stream_sources(FETCH_SOURCES, since=high_water)
+        else:
+            # Fetch data from all configured sources using cloudscraper
+            api_data = fetch_sources(FETCH_SOURCES, since=high_water)
+            stage.packets = len(api_data) if api_data is not None else None
     
     if api_data is None:
         logger.warning("Failed to fetch API data - leaving existing data file unchanged")
+        polled(False)
+        return 0
+    if scheduler is not None:
+        last_poll_ms = scheduler.last_poll * 1000 if scheduler.last_poll is not None else None
+        if stream:
+            api_data = count_heard_after(api_data, last_poll_ms, counts)
+        else:
+            counts["arrivals"] = sum(1 for packet in api_data
+                                     if is_newer(parse_heard_at_ms(packet.get("heard_at")), last_poll_ms))
+    crossing_due = scheduler is not None and scheduler.crossing_due()
+    if not (input_files or stream or crossing_due) and fetch_unchanged():
+        polled(True)
         return 0
     
-    # Step 1: Filter for repeater advertisement packets to identify repeaters
-    repeater_packets = filter_repeater_packets(api_data)
+    now = datetime.now(timezone.utc)
+    try:
+        packets = api_data
+        if store is not None:
+            packets = store_and_load_window(store, api_data, now)
+        index = load_attribution_index(store, api_data, now, input_files)
+        engine = AnalysisEngine.with_default_consumers(now, index)
+        rollup = RollupConsumer(rollup_store.through_ms, index) if rollup_store is not None else None
+        topology_consumer = TopologyConsumer(topology) if topology is not None else None
+        packets = attach_consumers(engine, packets, (rollup, topology_consumer), columnar)
+        
+        with METRICS.stage("analyze") as stage:
+            results = analyze_columnar(packets, now, index) if columnar else None
+            if results is None:
+                # Single pass over all packets feeds every statistic at once
+                results = engine.run(packets)
+                stage.packets = engine.packet_count
+    except (FetchError, ValueError, OSError) as e:
+        logger.warning(f"Packet stream failed ({str(e)[:200]}) - leaving existing data file unchanged")
+        polled(False)
+        return 0
     
-    if not repeater_packets:
+    if not results["repeaters"]["packet_count"]:
         logger.warning("No repeater packets found in API response")
         # Use previous data if available
         previous_data = load_previous_data()
         if previous_data:
             logger.info("Using previous repeater status data")
             save_json_data(previous_data)
+            polled(True)
             return 0
     
-    # Aggregate repeaters by public key (for metadata: name, location, hardware)
-    repeaters = aggregate_repeaters(repeater_packets)
-    
-    # Exclude repeaters with no Advert packet in the last N days
-    repeaters = filter_stale_repeaters(api_data, repeaters)
-    
-    repeater_keys = set(repeaters.keys())
-    
-    # Step 2: Scan ALL packets for repeater activity (public_key match or path match)
-    activity = find_repeater_activity(api_data, repeater_keys)
-    
-    # Step 3: Count unique Companion nodes active in last 30 days
-    companion_count = count_companion_nodes(api_data)
-    
-    # Step 4: Count text messages in last 30 days
-    message_count = count_messages(api_data)
-    
-    # Build node records with activity data (includes avg SNR, avg RSSI, last heard)
-    nodes = [
-        build_node_record(pk, packet, activity.get(pk))
-        for pk, packet in repeaters.items()
-    ]
-    
-    # Calculate network statistics (includes companion count)
-    stats = calculate_network_stats(nodes, companion_count)
-    
-    # Build output structure
-    output = {
-        "lastUpdated": stats["lastUpdated"],
-        "totalNodes": stats["totalNodes"],
-        "onlineNodes": stats["onlineNodes"],
-        "offlineNodes": stats["offlineNodes"],
-        "healthPercentage": stats["healthPercentage"],
-        "networkHealth": stats["networkHealth"],
-        "averageSignal": stats["averageSignal"],
-        "averageSNR": stats["averageSNR"],
-        "companionCount": stats["companionCount"],
-        "messageCount": message_count,
-        "nodes": sorted(nodes, key=lambda n: n["name"])
-    }
+    with METRICS.stage("build"):
+        output = build_status_document(results, now)
+    if geocoder is not None:
+        add_addresses(output, geocoder)
+    if rollup is not None:
+        update_rollups(rollup_store, rollup, output, now)
+    if topology is not None:
+        update_topology(topology, output, now)
+    update_shards(output, HISTORY_DIR if rollup is not None else None)
     
     # Save to file
-    if save_json_data(output):
-        logger.info("=" * 60)
-        logger.info(f"SUCCESS: Found {stats['totalNodes']} repeaters")
-        logger.info(f"  - Online: {stats['onlineNodes']}")
-        logger.info(f"  - Offline: {stats['offlineNodes']}")
-        logger.info(f"  - Network Health: {stats['networkHealth']} ({stats['healthPercentage']}%)")
-        logger.info(f"  - Avg Signal: {stats['averageSignal']} dBm")
-        logger.info(f"  - Avg SNR: {stats['averageSNR']} dB")
-        logger.info(f"  - Companion Nodes (30d): {stats['companionCount']}")
-        logger.info(f"  - Messages (30d): {message_count}")
-        logger.info("=" * 60)
-        return 0
-    else:
-        logger.error("Failed to save output file")
-        return 1
+    status = publish_status(output)
+    if status == 0 and not input_files:
+        mark_fetch_analyzed()
+    polled(status == 0, output)
+    return status
 
 
 if __name__ == "__main__":
@@ -0,0 +1,329 @@
+"""
+Persistent HTTP cache for the letsmesh.net fetch.
+
+Every scheduled run used to start cold: a new cloudscraper session had
+to pass the Cloudflare challenge again, and the full API response was
+downloaded and analyzed even when nothing had been heard since the last
+run. FetchCache keeps, between runs:
+
+- each host's session cookies and User-Agent (a Cloudflare clearance
+  cookie is only honoured together with the User-Agent that earned it)
+- per request URL: the ETag and Last-Modified validators, a SHA-256
+  digest of the body, its size on the wire and a gzip copy of the body
+
+Requests carry If-None-Match / If-Modified-Since from the last response
+for the same URL. A 304 answer is served from the cached body, and a 200
+whose body has the same digest as before counts as unchanged, so the
+caller can tell when a whole fetch brought nothing new (unchanged()).
+
+Layout (data/fetch-cache):
+
+    index.json              sessions, validators and digests per URL
+    bodies/<hash>.json.gz   last body of each URL
+
+Entries not requested for ENTRY_MAX_AGE_SECONDS are dropped on save(),
+so cursor URLs of old pages do not accumulate.
+
+Usage:
+    cache = FetchCache("data/fetch-cache")
+    cache.begin_run()
+    cache.restore_session(host, session)
+    headers = cache.request_headers(url)
+    ...
+    body = cache.cached_body(url)              # after a 304
+    cache.store(url, response.headers, body)   # after a 200
+    cache.save_session(host, session)
+    cache.save()
+"""
+
+import gzip
+import hashlib
+import http.cookiejar
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from output_writer import write_atomic
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.json"
+BODY_DIR = "bodies"
+CACHE_VERSION = 1
+ENTRY_MAX_AGE_SECONDS = 86_400  # drop URLs not requested for a day
+
+
+def _url_key(url):
+    return hashlib.sha256(url.encode()).hexdigest()[:16]
+
+
+def _cookie_to_dict(cookie):
+    return {"name": cookie.name, "value": cookie.value, "domain": cookie.domain,
+            "path": cookie.path, "secure": cookie.secure, "expires": cookie.expires}
+
+
+def _cookie_from_dict(data):
+    domain = data.get("domain") or ""
+    return http.cookiejar.Cookie(
+        version=0, name=data["name"], value=data["value"], port=None, port_specified=False,
+        domain=domain, domain_specified=bool(domain), domain_initial_dot=domain.startswith("."),
+        path=data.get("path") or "/", path_specified=True, secure=bool(data.get("secure")),
+        expires=data.get("expires"), discard=False, comment=None, comment_url=None, rest={},
+    )
+
+
+class FetchCache:
+    """
+    Cookies, validators and last bodies of API requests, kept on disk.
+
+    Thread-safe: the concurrent source fetches share one cache.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.lock = threading.Lock()
+        self.sessions = {}  # host -> {"userAgent", "cookies"}
+        self.entries = {}  # url -> {"etag", "lastModified", "digest", "size", "wireSize", "usedAt"}
+        self.analyzed_at = None  # epoch seconds of the last analysis of fetched data
+        self.responses = 0  # responses this run
+        self.changed = False  # a response this run differed from the cached one
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        path = self.directory / INDEX_FILE
+        if not path.exists():
+            return
+        try:
+            data = json.loads(path.read_text())
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Could not load fetch cache, starting over: {e}")
+            return
+        if data.get("version") != CACHE_VERSION:
+            return
+        self.sessions = data.get("sessions", {})
+        self.entries = data.get("entries", {})
+        self.analyzed_at = data.get("analyzedAt")
+
+    def _body_path(self, url):
+        return self.directory / BODY_DIR / f"{_url_key(url)}.json.gz"
+
+    def begin_run(self):
+        """Start counting responses for a new fetch."""
+        with self.lock:
+            self.responses = 0
+            self.changed = False
+
+    # Sessions
+
+    def restore_session(self, host, session):
+        """Load saved cookies and User-Agent for host into a new requests/cloudscraper session."""
+        with self.lock:
+            saved = self.sessions.get(host)
+        if not saved:
+            return False
+        now = time.time()
+        restored = 0
+        for data in saved.get("cookies", []):
+            if data.get("expires") is not None and data["expires"] <= now:
+                continue
+            session.cookies.set_cookie(_cookie_from_dict(data))
+            restored += 1
+        if saved.get("userAgent"):
+            session.headers["User-Agent"] = saved["userAgent"]
+        logger.info(f"Restored {restored} cookies for {host} from the fetch cache")
+        return True
+
+    def save_session(self, host, session):
+        """Remember host's current cookies and User-Agent."""
+        saved = {
+            "userAgent": session.headers.get("User-Agent"),
+            "cookies": [_cookie_to_dict(cookie) for cookie in session.cookies],
+        }
+        with self.lock:
+            if self.sessions.get(host) != saved:
+                self.sessions[host] = saved
+                self._dirty = True
+
+    def forget_session(self, host):
+        """Drop host's saved session (its clearance no longer works)."""
+        with self.lock:
+            if self.sessions.pop(host, None) is not None:
+                self._dirty = True
+
+    # Responses
+
+    def request_headers(self, url):
+        """Conditional request headers for url (empty without a cached body)."""
+        with self.lock:
+            entry = self.entries.get(url)
+        if not entry or not self._body_path(url).exists():
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("lastModified"):
+            headers["If-Modified-Since"] = entry["lastModified"]
+        return headers
+
+    def cached_body(self, url):
+        """
+        The cached body of url, for a 304 response.
+
+        Returns:
+            Body bytes, or None if nothing usable is cached
+        """
+        try:
+            body = gzip.decompress(self._body_path(url).read_bytes())
+        except (OSError, EOFError) as e:
+            logger.warning(f"Cached response unreadable, refetching: {e}")
+            self.forget(url)
+            return None
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                return None
+            entry["usedAt"] = time.time()
+            self.responses += 1
+            self._dirty = True
+        return body
+
+    def store(self, url, headers, body, wire_size=None):
+        """
+        Cache a 200 response.
+
+        Args:
+            url: Request URL
+            headers: Response headers (case-insensitive mapping)
+            body: Decoded body bytes
+            wire_size: Bytes transferred, if known
+
+        Returns:
+            True if the body differs from the cached one for url
+        """
+        writer = self.body_writer(url)
+        writer.write(body)
+        return writer.commit(headers, wire_size)
+
+    def body_writer(self, url):
+        """A BodyWriter that caches a response body as it streams in."""
+        return BodyWriter(self, url)
+
+    def _commit(self, url, headers, digest, size, wire_size):
+        with self.lock:
+            previous = self.entries.get(url)
+            changed = previous is None or previous.get("digest") != digest
+            self.entries[url] = {
+                "etag": headers.get("ETag"),
+                "lastModified": headers.get("Last-Modified"),
+                "digest": digest,
+                "size": size,
+                "wireSize": wire_size,
+                "usedAt": time.time(),
+            }
+            self.responses += 1
+            self.changed = self.changed or changed
+            self._dirty = True
+        return changed
+
+    def forget(self, url):
+        """Drop url from the cache."""
+        with self.lock:
+            self.entries.pop(url, None)
+            self._dirty = True
+        self._body_path(url).unlink(missing_ok=True)
+
+    # Runs
+
+    def unchanged(self, max_age_seconds):
+        """
+        True if every response of this run matched the cache and the data
+        was analyzed less than max_age_seconds ago.
+
+        The age bound keeps time-based results current (a repeater goes
+        offline when it has not been heard for a while, even if the API
+        response stays the same).
+        """
+        with self.lock:
+            if not self.responses or self.changed or self.analyzed_at is None:
+                return False
+            return time.time() - self.analyzed_at < max_age_seconds
+
+    def mark_analyzed(self):
+        """Record that this run's responses were analyzed."""
+        with self.lock:
+            self.analyzed_at = time.time()
+            self._dirty = True
+
+    def save(self):
+        """Write the index and drop entries not used for ENTRY_MAX_AGE_SECONDS."""
+        cutoff = time.time() - ENTRY_MAX_AGE_SECONDS
+        with self.lock:
+            expired = [url for url, entry in self.entries.items() if entry.get("usedAt", 0) < cutoff]
+            for url in expired:
+                del self.entries[url]
+            if not self._dirty and not expired:
+                return
+            data = {"version": CACHE_VERSION, "analyzedAt": self.analyzed_at,
+                    "sessions": self.sessions, "entries": self.entries}
+            write_atomic(self.directory / INDEX_FILE, json.dumps(data, separators=(",", ":")).encode())
+            self._dirty = False
+        for url in expired:
+            self._body_path(url).unlink(missing_ok=True)
+
+
+class BodyWriter:
+    """
+    Gzip and hash a response body chunk by chunk, so streamed responses are
+    cached without holding them in memory.
+
+    The body replaces the cached one only on commit(); abort() (or a
+    response that fails part way) leaves the previous body in place.
+    """
+
+    def __init__(self, cache, url):
+        self.cache = cache
+        self.url = url
+        self.path = cache._body_path(url)
+        self.tmp = self.path.with_name(self.path.name + ".tmp")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.raw = open(self.tmp, "wb")
+        self.file = gzip.GzipFile(fileobj=self.raw, mode="wb", compresslevel=6, mtime=0)
+
+    def write(self, chunk):
+        self.digest.update(chunk)
+        self.size += len(chunk)
+        self.file.write(chunk)
+
+    def commit(self, headers, wire_size=None):
+        """
+        Make the written body the cached response for the URL.
+
+        Args:
+            headers: Response headers (ETag / Last-Modified are kept)
+            wire_size: Bytes transferred, if known
+
+        Returns:
+            True if the body differs from the previously cached one
+        """
+        self.file.close()
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        self.raw.close()
+        changed = self.cache._commit(self.url, headers, self.digest.hexdigest(), self.size, wire_size)
+        if changed or not self.path.exists():
+            os.replace(self.tmp, self.path)
+        else:
+            self.tmp.unlink(missing_ok=True)
+        return changed
+
+    def abort(self):
+        """Discard the partial body."""
+        self.file.close()
+        self.raw.close()
+        self.tmp.unlink(missing_ok=True)
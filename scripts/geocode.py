@@ -0,0 +1,251 @@
+"""
+Offline reverse geocoding for fetch-repeater-data.py.
+
+Repeater Adverts carry a latitude/longitude but no address. We cannot
+call a web geocoder from the runner, so addresses come from a local
+gazetteer of place (or street) centroids held in a grid index: the
+nearest entry within MAX_DISTANCE_KM of a repeater names its address.
+
+Results are cached on disk keyed by the location rounded to
+CACHE_PRECISION decimal places (~110 m), so a repeater that has not
+moved is answered from the cache and the gazetteer is only loaded when
+a new location shows up. The cache is dropped when the gazetteer file
+changes.
+
+Gazetteer formats (optionally gzip-compressed, .gz):
+- a GeoNames dump (cities500.txt, US.txt, ...): tab-separated, no
+  header; only populated places (feature class P) are used
+- CSV with a header row: name, lat/latitude, lon/longitude and optional
+  region and country columns
+
+Usage:
+    geocoder = ReverseGeocoder("data/gazetteer.txt.gz", "data/geocode-cache.json")
+    address = geocoder.address(40.12, -82.93)  # "Westerville, OH"
+    geocoder.save()
+"""
+
+import csv
+import gzip
+import json
+import logging
+import math
+from pathlib import Path
+
+from attribution import distance_km, parse_location
+from output_writer import write_atomic
+
+logger = logging.getLogger(__name__)
+
+GRID_DEGREES = 0.1  # grid cell size (~11 km of latitude)
+MAX_DISTANCE_KM = 15  # farther than this from every entry -> no address
+CACHE_PRECISION = 3  # decimal places of the cache key (~110 m)
+KM_PER_DEGREE = 111.2
+
+# GeoNames dump columns (https://download.geonames.org/export/dump/readme.txt)
+_GEONAMES_NAME = 1
+_GEONAMES_LAT = 4
+_GEONAMES_LON = 5
+_GEONAMES_CLASS = 6
+_GEONAMES_COUNTRY = 8
+_GEONAMES_ADMIN1 = 10
+
+
+def place_label(name, region="", country=""):
+    """Address text for a gazetteer entry: "Name, Region", or "Name, Country" without a region."""
+    return ", ".join(part for part in (name, region or country) if part)
+
+
+def _open_text(path):
+    path = Path(path)
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def _read_geonames(f):
+    for line in f:
+        row = line.rstrip("\n").split("\t")
+        if len(row) <= _GEONAMES_ADMIN1 or row[_GEONAMES_CLASS] != "P":
+            continue
+        country = row[_GEONAMES_COUNTRY]
+        # admin1 codes are postal abbreviations for the US, numeric elsewhere
+        region = row[_GEONAMES_ADMIN1] if country == "US" else ""
+        yield row[_GEONAMES_LAT], row[_GEONAMES_LON], place_label(row[_GEONAMES_NAME], region, country)
+
+
+def _read_csv(f):
+    for row in csv.DictReader(f):
+        row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+        yield (row.get("lat", row.get("latitude")), row.get("lon", row.get("longitude")),
+               place_label(row.get("name", ""), row.get("region", ""), row.get("country", "")))
+
+
+class Gazetteer:
+    """
+    Place centroids in a fixed-size lat/lon grid for nearest-entry lookups.
+
+    A lookup scans only the cells within max_km of the point (a handful
+    at the default sizes), so it costs the same for a town-level file
+    as for a street-level one of the same density.
+    """
+
+    def __init__(self, entries=(), cell_degrees=GRID_DEGREES):
+        """
+        Args:
+            entries: Iterable of (lat, lon, label)
+            cell_degrees: Grid cell size in degrees
+        """
+        self.cell_degrees = cell_degrees
+        self.columns = round(360 / cell_degrees)
+        self.grid = {}  # (row, column) -> list of (lat, lon, label)
+        self.size = 0
+        for lat, lon, label in entries:
+            location = parse_location(lat, lon)
+            if location is None or not label:
+                continue
+            self.grid.setdefault(self._cell(*location), []).append((*location, label))
+            self.size += 1
+
+    def __len__(self):
+        return self.size
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_degrees),
+                math.floor(lon / self.cell_degrees) % self.columns)
+
+    @classmethod
+    def load(cls, path, cell_degrees=GRID_DEGREES):
+        """Load a GeoNames dump, or a CSV file if the name ends in .csv (or .csv.gz)."""
+        path = Path(path)
+        reader = _read_csv if path.name.removesuffix(".gz").endswith(".csv") else _read_geonames
+        with _open_text(path) as f:
+            return cls(reader(f), cell_degrees)
+
+    def nearest(self, lat, lon, max_km=MAX_DISTANCE_KM):
+        """
+        Find the entry closest to a point.
+
+        Args:
+            lat: Latitude
+            lon: Longitude
+            max_km: Ignore entries farther away than this
+
+        Returns:
+            Tuple of (label, distance in km), or (None, None) if no entry
+            is within max_km
+        """
+        row, column = self._cell(lat, lon)
+        cell_km = self.cell_degrees * KM_PER_DEGREE
+        rows = math.ceil(max_km / cell_km)
+        columns = min(self.columns // 2, math.ceil(max_km / (cell_km * max(math.cos(math.radians(lat)), 0.01))))
+        best_label, best_km = None, None
+        for r in range(row - rows, row + rows + 1):
+            for c in range(column - columns, column + columns + 1):
+                for entry_lat, entry_lon, label in self.grid.get((r, c % self.columns), ()):
+                    km = distance_km((lat, lon), (entry_lat, entry_lon))
+                    if km <= max_km and (best_km is None or km < best_km):
+                        best_label, best_km = label, km
+        return best_label, best_km
+
+
+class ReverseGeocoder:
+    """
+    Gazetteer lookups behind a persistent cache of rounded locations.
+
+    The gazetteer is loaded on the first cache miss, so runs in which no
+    repeater moved never read it.
+    """
+
+    def __init__(self, gazetteer_path, cache_path, precision=CACHE_PRECISION, max_km=MAX_DISTANCE_KM):
+        self.gazetteer_path = Path(gazetteer_path)
+        self.cache_path = Path(cache_path)
+        self.precision = precision
+        self.max_km = max_km
+        self.hits = 0
+        self.misses = 0
+        self._gazetteer = None
+        self._dirty = False
+        self._fingerprint = self._gazetteer_fingerprint()
+        if self._fingerprint is None:
+            logger.info(f"No gazetteer at {self.gazetteer_path} - only cached addresses are available")
+        self.cache = self._load_cache()  # "lat,lon" -> address ("" if nothing nearby)
+
+    def _gazetteer_fingerprint(self):
+        try:
+            return f"{self.gazetteer_path.name}:{self.gazetteer_path.stat().st_size}"
+        except OSError:
+            return None
+
+    def _load_cache(self):
+        if not self.cache_path.exists():
+            return {}
+        try:
+            data = json.loads(self.cache_path.read_text())
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Could not load geocode cache, starting over: {e}")
+            return {}
+        if data.get("precision") != self.precision:
+            return {}
+        # Without the gazetteer, keep serving what was cached from it
+        if self._fingerprint is not None and data.get("gazetteer") != self._fingerprint:
+            logger.info("Gazetteer changed - discarding the geocode cache")
+            self._dirty = True
+            return {}
+        return data.get("addresses", {})
+
+    @property
+    def gazetteer(self):
+        """The loaded Gazetteer, or None if the file is missing or unreadable."""
+        if self._gazetteer is None and self._fingerprint is not None:
+            try:
+                self._gazetteer = Gazetteer.load(self.gazetteer_path)
+                logger.info(f"Loaded {len(self._gazetteer)} gazetteer entries from {self.gazetteer_path}")
+            except (OSError, UnicodeDecodeError, csv.Error) as e:
+                logger.warning(f"Could not load gazetteer {self.gazetteer_path}: {e}")
+                self._fingerprint = None
+        return self._gazetteer
+
+    def key(self, lat, lon):
+        """Cache key for a location (lat/lon rounded to precision)."""
+        return f"{lat:.{self.precision}f},{lon:.{self.precision}f}"
+
+    def address(self, lat, lon):
+        """
+        Reverse-geocode a location.
+
+        Args:
+            lat: Latitude (number or numeric string)
+            lon: Longitude
+
+        Returns:
+            Address text, or "" if the location is invalid or nothing in
+            the gazetteer is within max_km
+        """
+        location = parse_location(lat, lon)
+        if location is None:
+            return ""
+        key = self.key(*location)
+        address = self.cache.get(key)
+        if address is not None:
+            self.hits += 1
+            return address
+        self.misses += 1
+        gazetteer = self.gazetteer
+        if gazetteer is None:
+            return ""  # not cached, so the address is filled once a gazetteer is available
+        # Look up the rounded point so every location sharing the key gets the same answer
+        label, _ = gazetteer.nearest(*map(float, key.split(",")), self.max_km)
+        address = self.cache[key] = label or ""
+        self._dirty = True
+        return address
+
+    def save(self):
+        """Write the cache (via a temporary file) if it changed."""
+        if not self._dirty:
+            return
+        write_atomic(self.cache_path, json.dumps({
+            "gazetteer": self._fingerprint,
+            "precision": self.precision,
+            "addresses": dict(sorted(self.cache.items())),
+        }, separators=(",", ":")).encode())
+        self._dirty = False
@@ -0,0 +1,176 @@
+"""
+Pipeline instrumentation for fetch-repeater-data.py.
+
+Records wall time, CPU time, peak RSS, packet counts and bytes for each
+pipeline stage, plus counters such as fetch retries and Cloudflare
+challenge hits. Results are written as JSON and, optionally, in the
+Prometheus text exposition format (for node_exporter's textfile
+collector). Everything is a no-op until configure() is given an output
+path, so the disabled cost is one attribute check per stage or counter.
+
+Usage:
+    from metrics import METRICS
+    METRICS.configure(json_path="data/repeater-metrics.json")
+    with METRICS.stage("fetch") as stage:
+        packets = fetch()
+        stage.packets = len(packets)
+    METRICS.incr("fetch_retries")
+    METRICS.flush()
+"""
+
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from output_writer import write_atomic
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_PREFIX = "repeater_pipeline"
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageRecord:
+    """Measurements for one run of a stage; packets and bytes are set by the caller."""
+
+    __slots__ = ("wall_seconds", "cpu_seconds", "peak_rss_bytes", "packets", "bytes")
+
+    def __init__(self):
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.peak_rss_bytes = None
+        self.packets = None
+        self.bytes = None
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Metrics:
+    """Collects stage measurements and counters for one process."""
+
+    def __init__(self):
+        self.enabled = False
+        self.json_path = None
+        self.prometheus_path = None
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._started_cpu = time.process_time()
+
+    def configure(self, json_path=None, prometheus_path=None):
+        """Set the output files; metrics are collected only if one is set."""
+        self.json_path = Path(json_path) if json_path else None
+        self.prometheus_path = Path(prometheus_path) if prometheus_path else None
+        self.enabled = bool(self.json_path or self.prometheus_path)
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time the enclosed block as stage name.
+
+        Yields:
+            StageRecord whose packets/bytes the block may fill in; the
+            record of the last run is kept for each stage name
+        """
+        record = StageRecord()
+        if not self.enabled:
+            yield record
+            return
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record.wall_seconds = round(time.perf_counter() - wall, 6)
+            record.cpu_seconds = round(time.process_time() - cpu, 6)
+            record.peak_rss_bytes = peak_rss_bytes()
+            with self._lock:
+                self.stages[name] = record
+
+    def incr(self, name, value=1):
+        """Add value to counter name (thread-safe)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self):
+        """Return all measurements as a JSON-compatible dict."""
+        with self._lock:
+            return {
+                "generated": datetime.now(timezone.utc).isoformat(),
+                "total": {
+                    "wall_seconds": round(time.perf_counter() - self._started, 6),
+                    "cpu_seconds": round(time.process_time() - self._started_cpu, 6),
+                    "peak_rss_bytes": peak_rss_bytes(),
+                },
+                "stages": {name: record.to_dict() for name, record in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+
+    def to_prometheus(self):
+        """Return all measurements in the Prometheus text exposition format."""
+        data = self.to_dict()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                if value is not None:
+                    lines.append(f"{PROMETHEUS_PREFIX}_{name}{labels} {value}")
+
+        stages = data["stages"]
+        for field, help_text in (("wall_seconds", "Wall time of the last run of each stage"),
+                                 ("cpu_seconds", "CPU time of the last run of each stage"),
+                                 ("peak_rss_bytes", "Process peak RSS at the end of each stage"),
+                                 ("packets", "Packets handled by the last run of each stage"),
+                                 ("bytes", "Bytes handled by the last run of each stage")):
+            metric(f"stage_{field}", "gauge", help_text,
+                   [(f'{{stage="{name}"}}', record[field]) for name, record in stages.items()])
+        for field in ("wall_seconds", "cpu_seconds", "peak_rss_bytes"):
+            metric(f"process_{field}", "gauge", f"Process {field.replace('_', ' ')} so far",
+                   [("", data["total"][field])])
+        for name, value in sorted(data["counters"].items()):
+            metric(f"{name}_total", "counter", f"Count of {name.replace('_', ' ')}", [("", value)])
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """
+        Write the configured output files; failures are logged, not raised.
+
+        Both are replaced atomically, so the textfile collector never
+        scrapes a half-written file.
+        """
+        if not self.enabled:
+            return
+        try:
+            if self.json_path:
+                write_atomic(self.json_path, json.dumps(self.to_dict(), indent=2).encode("utf-8"))
+            if self.prometheus_path:
+                write_atomic(self.prometheus_path, self.to_prometheus().encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"Could not write metrics: {e}")
+
+
+METRICS = Metrics()
@@ -0,0 +1,162 @@
+"""
+Atomic, change-aware writer for the published JSON files.
+
+The site reads data/repeater-status.json straight from the repository,
+so a write must never leave it missing or half-written, and a run whose
+only difference is its timestamps should not touch it at all (each
+rewrite becomes a commit in the scheduled workflow). JsonOutput writes
+every file through a temporary file and os.replace(), compares the new
+document with the one on disk ignoring the volatile fields (the
+top-level VOLATILE_KEYS, lastUpdated, and the VOLATILE_NODE_KEYS of
+every entry in "nodes", lastSeen), and next to the pretty file writes a
+minified copy plus
+pre-compressed .gz and .br versions of it for servers that can serve
+them directly (nginx gzip_static/brotli_static, CDNs).
+
+Usage:
+    output = JsonOutput("data/repeater-status.json", backup_path="data/repeater-status.json.bak")
+    written = output.write(document)  # False if nothing but timestamps changed
+"""
+
+import gzip
+import json
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+VOLATILE_KEYS = ("lastUpdated",)  # top-level keys that change on every run
+VOLATILE_NODE_KEYS = ("lastSeen",)  # keys of each "nodes" entry that move with every packet heard
+
+
+def write_atomic(path, data):
+    """
+    Write bytes to path via a temporary file in the same directory.
+
+    Readers see either the old file or the complete new one, and a
+    crash mid-write leaves only the temporary file behind.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def semantic_content(document, volatile_keys=VOLATILE_KEYS, volatile_node_keys=VOLATILE_NODE_KEYS):
+    """
+    Return the document without its volatile fields (None for no document).
+
+    Args:
+        document: JSON document (dict), or None
+        volatile_keys: Top-level keys to drop
+        volatile_node_keys: Keys to drop from each dict in document["nodes"]
+
+    Returns:
+        Dict to compare with another document's semantic content
+    """
+    if not document:
+        return None
+    content = {k: v for k, v in document.items() if k not in volatile_keys}
+    nodes = content.get("nodes")
+    if isinstance(nodes, list) and volatile_node_keys:
+        content["nodes"] = [
+            {k: v for k, v in node.items() if k not in volatile_node_keys} if isinstance(node, dict) else node
+            for node in nodes
+        ]
+    return content
+
+
+def compress_variants(data):
+    """
+    Pre-compressed copies of data, keyed by file suffix.
+
+    Gzip output is deterministic (no embedded mtime), so unchanged
+    content produces an unchanged file. Brotli needs the optional brotli
+    package and is skipped without it.
+    """
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        logger.debug("brotli not installed, skipping .br output. Install with: pip install brotli")
+    else:
+        variants[".br"] = brotli.compress(data, quality=11)
+    return variants
+
+
+class JsonOutput:
+    """
+    A published JSON document: the pretty file, its minified copy and
+    the compressed copies of the minified file.
+    """
+
+    def __init__(self, path, backup_path=None, volatile_keys=VOLATILE_KEYS):
+        self.path = Path(path)
+        self.backup_path = Path(backup_path) if backup_path else None
+        self.volatile_keys = volatile_keys
+
+    @property
+    def minified_path(self):
+        """foo.json -> foo.min.json"""
+        return self.path.with_name(f"{self.path.stem}.min{self.path.suffix}")
+
+    def variant_paths(self):
+        """Every file write() produces, pretty file first."""
+        minified = self.minified_path
+        return [self.path, minified, *(minified.with_name(minified.name + suffix) for suffix in (".gz", ".br"))]
+
+    def load(self):
+        """The document currently on disk, or None if missing or unreadable."""
+        try:
+            return json.loads(self.path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Could not read {self.path}: {e}")
+            return None
+
+    def write(self, document, force=False):
+        """
+        Write the document and its variants unless only volatile keys changed.
+
+        The previous pretty file becomes the backup. The pretty file is
+        replaced last, so once it shows the new content every variant does
+        too.
+
+        Args:
+            document: JSON-serializable dict
+            force: Write even if the content is unchanged
+
+        Returns:
+            True if the files were written, False if they were already current
+        """
+        previous = None
+        if self.path.exists():
+            previous = self.path.read_bytes()
+            if not force:
+                try:
+                    current = json.loads(previous)
+                except json.JSONDecodeError:
+                    current = None
+                if current is not None and (semantic_content(current, self.volatile_keys)
+                                            == semantic_content(document, self.volatile_keys)):
+                    return False
+
+        minified = json.dumps(document, separators=(",", ":")).encode()
+        write_atomic(self.minified_path, minified)
+        variants = compress_variants(minified)
+        for path in self.variant_paths()[2:]:
+            data = variants.get(path.name[len(self.minified_path.name):])
+            if data is not None:
+                write_atomic(path, data)
+            else:
+                path.unlink(missing_ok=True)  # never leave a stale variant behind
+        if previous is not None and self.backup_path is not None:
+            write_atomic(self.backup_path, previous)
+        write_atomic(self.path, json.dumps(document, indent=2).encode())
+        return True
@@ -0,0 +1,438 @@
+"""
+Compressed, column-oriented archive of raw packets (.pktar).
+
+A JSON dump has to be parsed whole before a single packet can be looked
+at. An archive keeps packets sorted by heard time in blocks of up to
+BLOCK_ROWS rows, and within a block every top-level packet field is a
+separately compressed column. Each block starts with a fixed-size header
+holding its row count, min/max heard time and a bitmap of the payload
+types it contains. PacketArchive memory-maps the file and reads only
+those headers until a block can match the query. Blocks outside the
+time window or without a wanted payload type are never decompressed, and
+within a matching block only the requested columns are.
+
+File layout (integers little-endian):
+
+    "PKTAR01\\n"                              file magic
+    block*                                    see below
+    footer                                    JSON: codec, payload type names, block offsets
+    footer offset (u64) + "PKTAR01\\n"         trailer
+
+    block:  "PBLK" rows (u32) min_ms (i64) max_ms (i64) types (u64) directory length (u32)
+            directory                          JSON: {field: [offset, length]} after the directory
+            columns                            heard_ms as i64, payload type codes as u8,
+                                               every other field as JSON
+
+Payload types are numbered in the footer in the order first written;
+bit n of a block's types bitmap is set if the block holds type n (types
+from 63 on share bit 63). Packets without a valid heard_at are stored
+with heard_ms NO_TIME and only match queries without a time bound.
+
+Columns are zstd-compressed when the zstandard module is installed,
+else zlib (the codec is recorded per file).
+
+Usage:
+    write_archive("data/archive/2026-05.pktar", packets)
+    with PacketArchive("data/archive/2026-05.pktar") as archive:
+        for packet in archive.iter_packets(since_ms=..., payload_types={"TextMessage", "GroupText"},
+                                           fields=("hash", "heard_at", "payload_type", "decoded_payload")):
+            ...
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+
+from timestamps import parse_heard_at_ms
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIX = ".pktar"
+MAGIC = b"PKTAR01\n"
+BLOCK_MAGIC = b"PBLK"
+BLOCK_HEADER = struct.Struct("<4sIqqQI")
+TRAILER = struct.Struct("<Q8s")
+BLOCK_ROWS = 4096  # packets per block
+NO_TIME = -(2 ** 63)  # heard_ms of packets without a valid heard_at
+TYPE_BITS = 64
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+TIME_FIELD = "heard_ms"  # derived column; not a packet field
+TYPE_FIELD = "payload_type"
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+class _Codec:
+    """Column compression: "zstd" or "zlib"."""
+
+    def __init__(self, name):
+        self.name = name
+        if name == "zstd":
+            zstandard = _zstd()
+            if zstandard is None:
+                raise ValueError("Archive is zstd-compressed but zstandard is not installed. "
+                                 "Install with: pip install zstandard")
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+            self._decompressor = zstandard.ZstdDecompressor()
+        elif name != "zlib":
+            raise ValueError(f"Unknown archive codec: {name}")
+
+    @classmethod
+    def best(cls):
+        """zstd if available, else zlib."""
+        if _zstd() is None:
+            logger.debug("zstandard not installed, archiving with zlib. Install with: pip install zstandard")
+            return cls("zlib")
+        return cls("zstd")
+
+    def compress(self, data):
+        if self.name == "zstd":
+            return self._compressor.compress(data)
+        return zlib.compress(data, ZLIB_LEVEL)
+
+    def decompress(self, data):
+        if self.name == "zstd":
+            return self._decompressor.decompress(data)
+        return zlib.decompress(data)
+
+
+def _int_column(typecode, values):
+    column = array(typecode, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column.tobytes()
+
+
+def _read_int_column(typecode, data):
+    column = array(typecode)
+    column.frombytes(data)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+def _type_bit(code):
+    return 1 << min(code, TYPE_BITS - 1)
+
+
+class PacketArchiveWriter:
+    """
+    Write packets to a .pktar file block by block.
+
+    Each block is sorted by heard time; feed packets in time order (as
+    PacketStore.iter_packets() yields them) for blocks that do not
+    overlap, or use write_archive() to sort a whole batch. The file is
+    written under a temporary name and moved into place by close().
+
+    Usage:
+        with PacketArchiveWriter(path) as writer:
+            writer.extend(packets)
+    """
+
+    def __init__(self, path, block_rows=BLOCK_ROWS, codec=None):
+        """
+        Args:
+            path: Output file
+            block_rows: Packets per block
+            codec: "zstd", "zlib" or None for the best available
+        """
+        self.path = Path(path)
+        self.block_rows = block_rows
+        self.codec = _Codec(codec) if codec else _Codec.best()
+        self.types = {}  # payload type (None if missing) -> code
+        self.blocks = []  # file offsets
+        self.count = 0
+        self.rows = []
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self.file = open(self.tmp_path, "wb")
+        self.file.write(MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add(self, packet):
+        """Add one packet dict."""
+        heard_ms = parse_heard_at_ms(packet.get("heard_at"))
+        self.rows.append((NO_TIME if heard_ms is None else heard_ms, packet))
+        if len(self.rows) >= self.block_rows:
+            self._flush()
+
+    def extend(self, packets):
+        """Add packets from any iterable; returns the number added."""
+        before = self.count + len(self.rows)
+        for packet in packets:
+            self.add(packet)
+        return self.count + len(self.rows) - before
+
+    def _flush(self):
+        if not self.rows:
+            return
+        rows = sorted(self.rows, key=lambda row: row[0])
+        self.rows = []
+        times = [heard_ms for heard_ms, _ in rows]
+        codes = []
+        bitmap = 0
+        fields = {}  # field -> (row numbers, values)
+        for i, (_, packet) in enumerate(rows):
+            payload_type = packet.get(TYPE_FIELD)
+            code = self.types.get(payload_type)
+            if code is None:
+                code = self.types[payload_type] = len(self.types)
+                if code > 255:
+                    raise ValueError("Too many distinct payload types for one archive")
+            codes.append(code)
+            bitmap |= _type_bit(code)
+            for field, value in packet.items():
+                if field == TYPE_FIELD:
+                    continue
+                column = fields.get(field)
+                if column is None:
+                    column = fields[field] = ([], [])
+                column[0].append(i)
+                column[1].append(value)
+
+        columns = {TIME_FIELD: _int_column("q", times), TYPE_FIELD: _int_column("B", codes)}
+        for field, (row_numbers, values) in fields.items():
+            # Fields present in every row are stored without row numbers
+            present = None if len(row_numbers) == len(rows) else row_numbers
+            columns[field] = json.dumps({"rows": present, "values": values},
+                                        separators=(",", ":")).encode()
+        directory = {}
+        body = []
+        offset = 0
+        for field, data in columns.items():
+            data = self.codec.compress(data)
+            directory[field] = [offset, len(data)]
+            body.append(data)
+            offset += len(data)
+        directory_data = json.dumps(directory, separators=(",", ":")).encode()
+
+        self.blocks.append(self.file.tell())
+        self.file.write(BLOCK_HEADER.pack(BLOCK_MAGIC, len(rows), times[0], times[-1], bitmap,
+                                          len(directory_data)))
+        self.file.write(directory_data)
+        for data in body:
+            self.file.write(data)
+        self.count += len(rows)
+
+    def close(self):
+        """Write the last block and the footer, and move the file into place."""
+        if self.file is None:
+            return
+        self._flush()
+        footer_offset = self.file.tell()
+        types = sorted(self.types, key=self.types.get)
+        footer = {"codec": self.codec.name, "types": types, "blocks": self.blocks, "count": self.count}
+        self.file.write(json.dumps(footer, separators=(",", ":")).encode())
+        self.file.write(TRAILER.pack(footer_offset, MAGIC))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.file = None
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """Discard the partly written file."""
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        self.tmp_path.unlink(missing_ok=True)
+
+
+def write_archive(path, packets, block_rows=BLOCK_ROWS, codec=None):
+    """
+    Write packets to a new archive, sorted by heard time.
+
+    Args:
+        path: Output file
+        packets: Iterable of packet dicts
+        block_rows: Packets per block
+        codec: "zstd", "zlib" or None for the best available
+
+    Returns:
+        Number of packets written
+    """
+    packets = sorted(packets, key=lambda p: parse_heard_at_ms(p.get("heard_at")) or NO_TIME)
+    with PacketArchiveWriter(path, block_rows, codec) as writer:
+        writer.extend(packets)
+    return writer.count
+
+
+class BlockInfo:
+    """Header of one archive block."""
+
+    __slots__ = ("offset", "rows", "min_ms", "max_ms", "types", "directory_length")
+
+    def __init__(self, offset, rows, min_ms, max_ms, types, directory_length):
+        self.offset = offset
+        self.rows = rows
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.types = types
+        self.directory_length = directory_length
+
+
+class PacketArchive:
+    """
+    Memory-mapped reader for .pktar files.
+
+    blocks_read and blocks_skipped count the blocks iter_packets() had to
+    decompress and the ones its headers ruled out.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_footer()
+        except (ValueError, struct.error, KeyError, TypeError) as e:
+            self.close()
+            raise ValueError(f"{self.path} is not a packet archive: {e}") from e
+        self.blocks_read = 0
+        self.blocks_skipped = 0
+
+    def _read_footer(self):
+        data = self.map
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("bad magic")
+        footer_offset, magic = TRAILER.unpack_from(data, len(data) - TRAILER.size)
+        if magic != MAGIC:
+            raise ValueError("missing trailer")
+        footer = json.loads(data[footer_offset:len(data) - TRAILER.size])
+        self.codec = _Codec(footer["codec"])
+        self.types = footer["types"]
+        self.count = footer["count"]
+        self.blocks = []
+        for offset in footer["blocks"]:
+            magic, *fields = BLOCK_HEADER.unpack_from(data, offset)
+            if magic != BLOCK_MAGIC:
+                raise ValueError(f"bad block header at {offset}")
+            self.blocks.append(BlockInfo(offset, *fields))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    @property
+    def max_ms(self):
+        """Latest heard time in the archive (epoch ms), or None."""
+        times = [b.max_ms for b in self.blocks if b.max_ms != NO_TIME]
+        return max(times) if times else None
+
+    def _column(self, block, directory, field):
+        offset, length = directory[field]
+        start = block.offset + BLOCK_HEADER.size + block.directory_length + offset
+        return self.codec.decompress(self.map[start:start + length])
+
+    def iter_packets(self, since_ms=None, until_ms=None, payload_types=None, fields=None):
+        """
+        Yield packets in the window, in heard time order within each block.
+
+        Args:
+            since_ms: Only packets heard at or after this epoch ms
+            until_ms: Only packets heard before this epoch ms
+            payload_types: Only packets of these payload types
+            fields: Packet fields to decode (default: all); other fields
+                    are left out of the yielded dicts
+
+        Yields:
+            Packet dictionaries
+        """
+        codes = None
+        mask = 0
+        if payload_types is not None:
+            codes = {code for code, name in enumerate(self.types) if name in payload_types}
+            if not codes:
+                self.blocks_skipped += len(self.blocks)
+                return
+            for code in codes:
+                mask |= _type_bit(code)
+        lower = NO_TIME + 1 if since_ms is None and until_ms is not None else since_ms
+        types = self.types
+
+        for block in self.blocks:
+            if ((since_ms is not None and block.max_ms < since_ms)
+                    or (until_ms is not None and (block.min_ms >= until_ms or block.max_ms == NO_TIME))
+                    or (codes is not None and not block.types & mask)):
+                self.blocks_skipped += 1
+                continue
+            self.blocks_read += 1
+            start = block.offset + BLOCK_HEADER.size
+            directory = json.loads(self.map[start:start + block.directory_length])
+            block_codes = _read_int_column("B", self._column(block, directory, TYPE_FIELD))
+            rows = range(block.rows)
+            if lower is not None or until_ms is not None:
+                times = _read_int_column("q", self._column(block, directory, TIME_FIELD))
+                rows = [i for i in rows
+                        if (lower is None or times[i] >= lower) and (until_ms is None or times[i] < until_ms)]
+            if codes is not None:
+                rows = [i for i in rows if block_codes[i] in codes]
+            if not rows:
+                continue
+
+            packets = {i: {} for i in rows}
+            for field in directory:
+                if field in (TIME_FIELD, TYPE_FIELD) or (fields is not None and field not in fields):
+                    continue
+                column = json.loads(self._column(block, directory, field))
+                values = column["values"]
+                present = column["rows"]
+                if present is None:
+                    for i in rows:
+                        packets[i][field] = values[i]
+                else:
+                    position = {row: n for n, row in enumerate(present)}
+                    for i in rows:
+                        n = position.get(i)
+                        if n is not None:
+                            packets[i][field] = values[n]
+            keep_type = fields is None or TYPE_FIELD in fields
+            for i in rows:
+                packet = packets[i]
+                if keep_type and types[block_codes[i]] is not None:
+                    packet[TYPE_FIELD] = types[block_codes[i]]
+                yield packet
+
+
+def is_archive(path):
+    """True if path names a packet archive."""
+    return Path(path).suffix == ARCHIVE_SUFFIX
+
+
+def iter_archives(paths, **query):
+    """Yield the packets matching query (see PacketArchive.iter_packets) from several archives."""
+    for path in paths:
+        with PacketArchive(path) as archive:
+            yield from archive.iter_packets(**query)
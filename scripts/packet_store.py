@@ -0,0 +1,355 @@
+"""
+On-disk packet store for fetch-repeater-data.py.
+
+Keeps every packet fetched from the letsmesh.net API in a SQLite file so
+that windowed statistics (30-day companions/messages) cover the whole
+window instead of whatever fits in one API response. Packets are keyed
+by their API id (or hash when no id is present), so re-fetching an
+overlapping range is a no-op. heard_at is also stored as epoch
+milliseconds (heard_ms), which is indexed and used for window scans.
+
+Each observer reports its own copy of a transmission under its own id.
+Copies are matched on hash and path (copy_key) and a copy heard within
+COPY_WINDOW_MS of a stored one is not inserted, whichever fetch or run
+it arrives in.
+
+Every insert() call stamps its rows with inserted_ms, a strictly
+increasing insertion time. Consumers that must see each packet once
+(rollups, topology) resume from the last stamp they saw, so a packet
+that arrives late (heard before packets already stored) is still
+picked up on the run that stores it. Rows migrated from older stores,
+and rows inserted into an empty store, are stamped with heard_ms
+instead, so a store rebuilt next to existing rollups does not count its
+packets twice.
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+
+from timestamps import format_epoch_ms, parse_heard_at_ms
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packets (
+    packet_key   TEXT PRIMARY KEY,
+    hash         TEXT,
+    heard_at     TEXT NOT NULL,
+    payload_type TEXT,
+    body         TEXT NOT NULL,
+    heard_ms     INTEGER,
+    copy_key     TEXT,
+    inserted_ms  INTEGER
+);
+"""
+
+INDEXES = """
+DROP INDEX IF EXISTS packets_heard_at;
+CREATE INDEX IF NOT EXISTS packets_heard_ms ON packets (heard_ms);
+CREATE INDEX IF NOT EXISTS packets_copy_key ON packets (copy_key, heard_ms);
+CREATE INDEX IF NOT EXISTS packets_inserted_ms ON packets (inserted_ms);
+"""
+
+# Copies of one transmission reach the observers within seconds of each
+# other; the same hash and path heard further apart is a new transmission.
+COPY_WINDOW_MS = 60_000
+
+
+def packet_store_key(packet):
+    """
+    Return the deduplication key for a packet.
+
+    Args:
+        packet: Packet dictionary from the API
+
+    Returns:
+        The packet id as a string, else its hash combined with heard_at,
+        else None
+    """
+    packet_id = packet.get("id")
+    if packet_id is not None and packet_id != "":
+        return str(packet_id)
+    packet_hash = packet.get("hash")
+    if packet_hash:
+        return f"hash:{packet_hash}:{packet.get('heard_at', '')}"
+    return None
+
+
+def copy_key(packet, path_hops=None):
+    """
+    Return the key shared by every observer's copy of a transmission.
+
+    Args:
+        packet: Packet dictionary from the API
+        path_hops: Optional function normalizing a raw path to its hops
+                   (parse_path_hops); without it the raw path is compared
+
+    Returns:
+        "<hash>|<hops>", or None for a packet without a hash
+    """
+    packet_hash = packet.get("hash")
+    if not packet_hash:
+        return None
+    path = packet.get("path")
+    if path_hops is not None:
+        return f"{packet_hash}|{','.join(path_hops(path))}"
+    return f"{packet_hash}|{path or ''}"
+
+
+class CopyIndex:
+    """
+    In-memory copy check for packets that do not go through the store.
+
+    Remembers the heard_ms of the last kept copy of each transmission, so
+    a stream deduplicates the way PacketStore.insert() does.
+
+    Usage:
+        copies = CopyIndex(parse_path_hops)
+        fresh = [p for p in packets if not copies.is_copy(p, parse_heard_at_ms(p["heard_at"]))]
+    """
+
+    def __init__(self, path_hops=None, window_ms=COPY_WINDOW_MS):
+        self.path_hops = path_hops
+        self.window_ms = window_ms
+        self.kept = {}  # copy_key -> heard_ms of the kept copy
+
+    def __len__(self):
+        return len(self.kept)
+
+    def is_copy(self, packet, heard_ms):
+        """
+        Return True if a kept copy of the packet was heard within the window.
+
+        A packet that is not a copy is recorded as the kept one.
+        """
+        key = copy_key(packet, self.path_hops)
+        if key is None or heard_ms is None:
+            return False
+        kept_ms = self.kept.get(key)
+        if kept_ms is not None and abs(heard_ms - kept_ms) <= self.window_ms:
+            return True
+        self.kept[key] = heard_ms
+        return False
+
+    def prune(self, before_ms):
+        """Forget copies too old to match a packet heard at or after before_ms."""
+        cutoff = before_ms - self.window_ms
+        self.kept = {k: v for k, v in self.kept.items() if v >= cutoff}
+
+
+class PacketStore:
+    """
+    SQLite-backed packet store.
+
+    Usage:
+        with PacketStore(path, parse_path_hops) as store:
+            store.insert(packets)
+            for packet in store.iter_packets(since_ms=1769904000000):
+                ...
+    """
+
+    def __init__(self, path, path_hops=None):
+        self.path = Path(path)
+        self.path_hops = path_hops  # path normalizer for copy_key()
+        self.last_inserted_ms = None  # inserted_ms stamp of the last insert() call (None: heard_ms)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.conn.executescript(INDEXES)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Commit and close the database connection."""
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def _migrate(self):
+        """Add and backfill columns missing from stores created before they existed."""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(packets)")}
+        if "heard_ms" not in columns:
+            self._add_heard_ms()
+        if "copy_key" not in columns:
+            self._add_copy_key()
+        if "inserted_ms" not in columns:
+            # Rollups and topology used to resume from heard_ms, so their saved
+            # high-water marks stay valid as insertion cursors
+            with self.conn:
+                self.conn.execute("ALTER TABLE packets ADD COLUMN inserted_ms INTEGER")
+                self.conn.execute("UPDATE packets SET inserted_ms = heard_ms")
+
+    def _add_heard_ms(self):
+        with self.conn:
+            self.conn.execute("ALTER TABLE packets ADD COLUMN heard_ms INTEGER")
+            rows = [
+                (parse_heard_at_ms(heard_at), key)
+                for key, heard_at in self.conn.execute("SELECT packet_key, heard_at FROM packets")
+            ]
+            self.conn.executemany("UPDATE packets SET heard_ms = ? WHERE packet_key = ?", rows)
+            deleted = self.conn.execute("DELETE FROM packets WHERE heard_ms IS NULL").rowcount
+        logger.info(f"Added heard_ms to {len(rows)} stored packets ({deleted} unparseable removed)")
+
+    def _add_copy_key(self):
+        """Add copy_key and drop the observer copies stored before it existed."""
+        copies = CopyIndex(self.path_hops)
+        rows = []
+        duplicates = []
+        with self.conn:
+            self.conn.execute("ALTER TABLE packets ADD COLUMN copy_key TEXT")
+            for key, body, heard_ms in self.conn.execute(
+                    "SELECT packet_key, body, heard_ms FROM packets ORDER BY heard_ms"):
+                packet = json.loads(body)
+                if copies.is_copy(packet, heard_ms):
+                    duplicates.append((key,))
+                else:
+                    rows.append((copy_key(packet, self.path_hops), key))
+            self.conn.executemany("UPDATE packets SET copy_key = ? WHERE packet_key = ?", rows)
+            self.conn.executemany("DELETE FROM packets WHERE packet_key = ?", duplicates)
+        logger.info(f"Added copy_key to {len(rows)} stored packets ({len(duplicates)} observer copies removed)")
+
+    def high_water_mark(self):
+        """Return the heard_at string of the newest stored packet, or "" if the store is empty."""
+        row = self.conn.execute(
+            "SELECT heard_at FROM packets ORDER BY heard_ms DESC LIMIT 1"
+        ).fetchone()
+        return row[0] if row else ""
+
+    def count(self):
+        """Return the number of stored packets."""
+        return self.conn.execute("SELECT COUNT(*) FROM packets").fetchone()[0]
+
+    def insert(self, packets, batch_size=1000):
+        """
+        Insert packets, ignoring any already stored.
+
+        Packets are written in batches, so a streamed iterable is consumed
+        without being materialized. A copy of a stored or earlier packet
+        (same copy_key within COPY_WINDOW_MS) is skipped, so each
+        transmission is stored once however many observers heard it.
+        The new rows share one inserted_ms stamp, later than any stored
+        one, which is kept in last_inserted_ms (None when the store was
+        empty and each row was stamped with its heard_ms).
+
+        Args:
+            packets: Iterable of packet dictionaries
+            batch_size: Rows per executemany() call
+
+        Returns:
+            Number of packets that were new
+        """
+        before = self.conn.total_changes
+        offered = 0
+        copies = 0
+        pending = CopyIndex(self.path_hops)  # copies within the unwritten batch
+        rows = []
+        stamp = self._next_inserted_ms()
+        with self.conn:
+            for packet in packets:
+                key = packet_store_key(packet)
+                heard_at = packet.get("heard_at")
+                heard_ms = parse_heard_at_ms(heard_at)
+                if key is None or heard_ms is None:
+                    continue
+                shared_key = copy_key(packet, self.path_hops)
+                if self._has_copy(shared_key, heard_ms) or pending.is_copy(packet, heard_ms):
+                    copies += 1
+                    continue
+                rows.append((key, packet.get("hash"), heard_at, packet.get("payload_type"),
+                             json.dumps(packet, separators=(",", ":")), heard_ms, shared_key,
+                             heard_ms if stamp is None else stamp))
+                if len(rows) >= batch_size:
+                    self._insert_rows(rows)
+                    offered += len(rows)
+                    rows = []
+                    pending = CopyIndex(self.path_hops)
+            if rows:
+                self._insert_rows(rows)
+                offered += len(rows)
+        inserted = self.conn.total_changes - before
+        self.last_inserted_ms = stamp
+        logger.info(f"Stored {inserted} new packets ({offered - inserted + copies} already known "
+                    f"or observer copies)")
+        return inserted
+
+    def _next_inserted_ms(self):
+        """
+        Return the stamp for the next insert() call.
+
+        Returns:
+            The current time in epoch ms, or one past the newest stamp if
+            that is later; None if the store is empty
+        """
+        newest = self.conn.execute("SELECT MAX(inserted_ms) FROM packets").fetchone()[0]
+        if newest is None:
+            return None
+        now_ms = int(time.time() * 1000)
+        return now_ms if now_ms > newest else newest + 1
+
+    def _has_copy(self, shared_key, heard_ms):
+        """Return True if a stored packet with this copy_key was heard within COPY_WINDOW_MS."""
+        if shared_key is None:
+            return False
+        row = self.conn.execute(
+            "SELECT 1 FROM packets WHERE copy_key = ? AND heard_ms BETWEEN ? AND ? LIMIT 1",
+            (shared_key, heard_ms - COPY_WINDOW_MS, heard_ms + COPY_WINDOW_MS),
+        ).fetchone()
+        return row is not None
+
+    def _insert_rows(self, rows):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO packets "
+            "(packet_key, hash, heard_at, payload_type, body, heard_ms, copy_key, inserted_ms) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def iter_packets(self, since_ms=None, payload_type=None, with_inserted=False):
+        """
+        Yield stored packets in heard time order without loading them all.
+
+        Args:
+            since_ms: Optional epoch ms; only packets heard at or after it
+            payload_type: Optional payload type; only packets of that type
+                          (filtered before their bodies are decoded)
+            with_inserted: Yield (packet, inserted_ms) tuples
+
+        Yields:
+            Packet dictionaries (or tuples, see with_inserted)
+        """
+        conditions = []
+        params = []
+        if since_ms is not None:
+            conditions.append("heard_ms >= ?")
+            params.append(since_ms)
+        if payload_type is not None:
+            conditions.append("payload_type = ?")
+            params.append(payload_type)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        cursor = self.conn.execute(f"SELECT body, inserted_ms FROM packets {where}ORDER BY heard_ms", params)
+        for body, inserted_ms in cursor:
+            yield (json.loads(body), inserted_ms) if with_inserted else json.loads(body)
+
+    def prune(self, before_ms):
+        """
+        Delete packets heard before the given epoch ms.
+
+        Returns:
+            Number of packets deleted
+        """
+        with self.conn:
+            deleted = self.conn.execute(
+                "DELETE FROM packets WHERE heard_ms < ?", (before_ms,)
+            ).rowcount
+        if deleted:
+            logger.info(f"Pruned {deleted} packets older than {format_epoch_ms(before_ms)[:19]}")
+        return deleted
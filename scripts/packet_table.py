@@ -0,0 +1,378 @@
+"""
+Columnar packet table for fetch-repeater-data.py --columnar.
+
+Packets are unpacked once into NumPy arrays (heard time, SNR, RSSI,
+payload type and mode codes, interned public key and hash indexes, path
+hops), and the window statistics are computed with masks and group-bys
+instead of per-packet Python loops. PacketTable.results() returns the
+same shape as AnalysisEngine.run() with the default consumers, so
+build_status_document() works unchanged on either.
+
+Requires numpy (optional dependency): pip install numpy
+"""
+
+import numpy as np
+
+from distinct_sketch import DAY_MS, DEFAULT_EXACT_LIMIT, DEFAULT_PRECISION, DailyDistinct
+from topology import OBSERVER
+
+PAYLOAD_TYPES = ("Advert", "TextMessage", "GroupText")  # coded 1..n, anything else 0
+MODES = ("Repeater", "Companion")  # coded 1..n, anything else 0
+MESSAGE_TYPES = (PAYLOAD_TYPES.index("TextMessage") + 1, PAYLOAD_TYPES.index("GroupText") + 1)
+ADVERT = PAYLOAD_TYPES.index("Advert") + 1
+REPEATER = MODES.index("Repeater") + 1
+COMPANION = MODES.index("Companion") + 1
+MISSING = -1  # heard_ms / index value for missing or invalid fields (and "no previous hop")
+OBSERVER_HOP = 256  # hop code standing for the observer after the last hop
+EXCLUDED_CHANNEL_HASH = 81
+
+
+def _to_float(value):
+    """Convert a numeric-like API value to float, or NaN if missing/invalid."""
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+class ColumnStats:
+    """
+    Statistics over one group of values, with the RunningStats interface
+    that build_node_record() uses (count, mean, summary()).
+
+    Quantiles are exact, using the same midpoint convention as
+    stream_stats.TDigest (numpy's "hazen" method).
+    """
+
+    def __init__(self, values):
+        self.values = np.sort(values[~np.isnan(values)])
+        self.count = int(self.values.size)
+
+    @property
+    def mean(self):
+        """Arithmetic mean, or None if empty."""
+        return float(self.values.mean()) if self.count else None
+
+    @property
+    def stddev(self):
+        """Sample standard deviation, or None with fewer than two values."""
+        return float(self.values.std(ddof=1)) if self.count > 1 else None
+
+    def quantile(self, q):
+        """q-quantile, or None if empty."""
+        if not self.count:
+            return None
+        position = min(max(q * self.count - 0.5, 0.0), self.count - 1)
+        low = int(position)
+        high = min(low + 1, self.count - 1)
+        frac = position - low
+        return float(self.values[low] + frac * (self.values[high] - self.values[low]))
+
+    def summary(self, digits=1):
+        """Rounded summary, same keys as RunningStats.summary()."""
+        if not self.count:
+            return None
+
+        def rnd(value):
+            return round(value, digits) if value is not None else None
+
+        return {
+            "count": self.count,
+            "mean": rnd(self.mean),
+            "stddev": rnd(self.stddev),
+            "min": rnd(float(self.values[0])),
+            "max": rnd(float(self.values[-1])),
+            "p10": rnd(self.quantile(0.10)),
+            "p50": rnd(self.quantile(0.50)),
+            "p90": rnd(self.quantile(0.90)),
+        }
+
+
+class PacketTable:
+    """
+    Packets as parallel NumPy columns, one row per packet.
+
+    Usage:
+        table = PacketTable.from_packets(views, parse_path_hops, canonical_key)
+        results = table.results(window_start_ms)
+    """
+
+    def __init__(self):
+        self.heard_ms = None  # int64 epoch ms, MISSING if unparseable
+        self.heard_at = []  # original heard_at strings, for output
+        self.snr = None  # float64, NaN if missing
+        self.rssi = None  # float64, NaN if missing
+        self.payload_type = None  # int8 code from PAYLOAD_TYPES
+        self.mode = None  # int8 code from MODES
+        self.key = None  # int32 index into keys, MISSING if no public key
+        self.hash = None  # int32 index of the packet hash, MISSING if none
+        self.excluded_channel = None  # bool, decoded channel_hash == 81
+        self.direct_only = None  # bool, own key prefix is not a path hop
+        self.hop_rows = None  # int32 row of each (packet, distinct hop) pair
+        self.hop_codes = None  # int16 hop byte of each pair
+        self.hop_prev = None  # int16 hop before it in the path, MISSING if first
+        self.hop_next = None  # int16 hop after it, OBSERVER_HOP if last
+        self.keys = []  # interned canonical public keys
+        self.hashes = []  # interned packet hashes
+        self.repeater_adverts = {}  # row -> packet dict for Repeater-mode Adverts
+        self.canonical_key = None  # key normalizer given to from_packets()
+
+    def __len__(self):
+        return len(self.heard_at)
+
+    @classmethod
+    def from_packets(cls, views, parse_path_hops, canonical_key):
+        """
+        Build a table from PacketViews.
+
+        Args:
+            views: Iterable of PacketViews (the table is built in one pass)
+            parse_path_hops: Path parser from fetch-repeater-data.py
+            canonical_key: Key normalizer from fetch-repeater-data.py, for
+                           the repeater keys activity_for() is asked about
+
+        Returns:
+            PacketTable
+        """
+        table = cls()
+        table.canonical_key = canonical_key
+        payload_codes = {name: i + 1 for i, name in enumerate(PAYLOAD_TYPES)}
+        mode_codes = {name: i + 1 for i, name in enumerate(MODES)}
+        key_index = {}
+        hash_index = {}
+        heard_ms, snr, rssi, payload_type, mode = [], [], [], [], []
+        key, hashes, excluded, direct_only = [], [], [], []
+        hop_rows, hop_codes, hop_prev, hop_next = [], [], [], []
+
+        for row, view in enumerate(views):
+            packet = view.packet
+            table.heard_at.append(view.heard_at)
+            heard_ms.append(view.heard_ms if view.heard_ms is not None and view.heard_ms >= 0 else MISSING)
+            snr.append(_to_float(packet.get("snr")))
+            rssi.append(_to_float(packet.get("rssi")))
+            payload_type.append(payload_codes.get(view.payload_type, 0))
+            packet_mode = mode_codes.get(view.decoded.get("mode"), 0)
+            mode.append(packet_mode)
+            excluded.append(view.decoded.get("channel_hash") == EXCLUDED_CHANNEL_HASH)
+
+            pk = view.key
+            if pk:
+                key.append(key_index.setdefault(pk, len(key_index)))
+            else:
+                key.append(MISSING)
+            packet_hash = packet.get("hash")
+            hashes.append(hash_index.setdefault(packet_hash, len(hash_index)) if packet_hash else MISSING)
+
+            path_hops = parse_path_hops(packet.get("path"))
+            hops = set()
+            last = len(path_hops) - 1
+            for i, hop in enumerate(path_hops):
+                if hop in hops:
+                    continue  # a repeated hop keeps the context of its first occurrence
+                hops.add(hop)
+                hop_rows.append(row)
+                hop_codes.append(int(hop, 16))
+                hop_prev.append(int(path_hops[i - 1], 16) if i else MISSING)
+                hop_next.append(int(path_hops[i + 1], 16) if i < last else OBSERVER_HOP)
+            direct_only.append(bool(pk) and pk[:2] not in hops)
+
+            if payload_type[-1] == ADVERT and packet_mode == REPEATER:
+                table.repeater_adverts[row] = packet
+
+        table.heard_ms = np.array(heard_ms, dtype=np.int64)
+        table.snr = np.array(snr, dtype=np.float64)
+        table.rssi = np.array(rssi, dtype=np.float64)
+        table.payload_type = np.array(payload_type, dtype=np.int8)
+        table.mode = np.array(mode, dtype=np.int8)
+        table.key = np.array(key, dtype=np.int32)
+        table.hash = np.array(hashes, dtype=np.int32)
+        table.excluded_channel = np.array(excluded, dtype=bool)
+        table.direct_only = np.array(direct_only, dtype=bool)
+        table.hop_rows = np.array(hop_rows, dtype=np.int32)
+        table.hop_codes = np.array(hop_codes, dtype=np.int16)
+        table.hop_prev = np.array(hop_prev, dtype=np.int16)
+        table.hop_next = np.array(hop_next, dtype=np.int16)
+        table.keys = list(key_index)
+        table.hashes = list(hash_index)
+        return table
+
+    def _daily_distinct(self, mask, codes, values, precision, exact_limit):
+        """DailyDistinct of values[codes] over the rows in mask, one (day, value) pair at a time."""
+        daily = DailyDistinct(precision, exact_limit)
+        days = self.heard_ms[mask] // DAY_MS
+        pairs = np.unique(np.stack([days, codes[mask].astype(np.int64)]), axis=1)
+        for day, code in pairs.T:
+            daily.add(int(day) * DAY_MS, values[code])
+        return daily
+
+    def companion_days(self, since_ms, precision=DEFAULT_PRECISION, exact_limit=DEFAULT_EXACT_LIMIT):
+        """Companion keys heard at or after since_ms, as CompanionConsumer.result()."""
+        mask = (self.mode == COMPANION) & (self.heard_ms >= since_ms) & (self.key != MISSING)
+        return self._daily_distinct(mask, self.key, self.keys, precision, exact_limit)
+
+    def message_days(self, since_ms, precision=DEFAULT_PRECISION, exact_limit=DEFAULT_EXACT_LIMIT):
+        """Message hashes heard at or after since_ms, as MessageConsumer.result()."""
+        mask = (np.isin(self.payload_type, MESSAGE_TYPES) & ~self.excluded_channel
+                & (self.heard_ms >= since_ms) & (self.hash != MISSING))
+        return self._daily_distinct(mask, self.hash, self.hashes, precision, exact_limit)
+
+    def latest_repeater_adverts(self):
+        """
+        Latest Repeater-mode Advert per public key (filter + aggregate).
+
+        Returns:
+            Dict with packet_count and repeaters (canonical key -> packet),
+            as RepeaterAdvertConsumer.result()
+        """
+        rows = np.array(sorted(self.repeater_adverts), dtype=np.int64)
+        repeaters = {}
+        if rows.size:
+            rows = rows[self.key[rows] != MISSING]
+            # Newest heard per key; ties (and all-invalid times) keep the first row
+            order = np.lexsort((rows, -self.heard_ms[rows], self.key[rows]))
+            rows = rows[order]
+            first = np.ones(rows.size, dtype=bool)
+            first[1:] = self.key[rows[1:]] != self.key[rows[:-1]]
+            for row in rows[first]:
+                repeaters[self.keys[self.key[row]]] = self.repeater_adverts[int(row)]
+        return {"packet_count": len(self.repeater_adverts), "repeaters": repeaters}
+
+    def latest_advert(self):
+        """Newest valid Advert heard time (epoch ms) per canonical key, as LatestAdvertConsumer."""
+        mask = (self.payload_type == ADVERT) & (self.key != MISSING) & (self.heard_ms != MISSING)
+        latest = np.full(len(self.keys), MISSING, dtype=np.int64)
+        np.maximum.at(latest, self.key[mask], self.heard_ms[mask])
+        return {self.keys[i]: int(ms) for i, ms in enumerate(latest) if ms != MISSING}
+
+    def _resolve_ambiguous(self, index, hop_order, hop_bounds):
+        """
+        Attribute the hop pairs of every shared prefix with an AttributionIndex.
+
+        Each distinct (prefix, previous hop, next hop) context is resolved
+        once.
+
+        Returns:
+            Dict mapping canonical key -> (rows, confidences) credited to it
+        """
+        def hop_name(code):
+            if code == MISSING:
+                return None
+            return OBSERVER if code == OBSERVER_HOP else f"{code:02x}"
+
+        credited = {}
+        for prefix in index.ambiguous:
+            code = int(prefix, 16)
+            pairs = hop_order[hop_bounds[code]:hop_bounds[code + 1]]
+            if not pairs.size:
+                continue
+            contexts, inverse = np.unique(np.stack([self.hop_prev[pairs], self.hop_next[pairs]]),
+                                          axis=1, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            owners = []
+            confidences = np.empty(contexts.shape[1])
+            for i, (prev, nxt) in enumerate(contexts.T):
+                key, confidences[i] = index.resolve(prefix, hop_name(int(prev)), hop_name(int(nxt)))
+                owners.append(key)
+            for key in set(owners):
+                chosen = np.flatnonzero([owner == key for owner in owners])
+                mask = np.isin(inverse, chosen)
+                credited[key] = (self.hop_rows[pairs[mask]], confidences[inverse[mask]])
+        return credited
+
+    def activity_for(self, repeater_keys, index=None):
+        """
+        Per-repeater activity, as ActivityConsumer.activity_for().
+
+        A repeater's rows are those with its 1-byte prefix among the path
+        hops plus the direct_only rows carrying its public key; the two
+        sets are disjoint, so each packet counts at most once. With an
+        AttributionIndex, hops on a shared prefix count only for the
+        repeater they are attributed to.
+
+        Args:
+            repeater_keys: Iterable of repeater public keys
+            index: Optional AttributionIndex
+
+        Returns:
+            Dict mapping repeater_key -> activity record whose snr/rssi
+            are ColumnStats
+        """
+        hop_order = np.argsort(self.hop_codes, kind="stable")
+        hop_rows = self.hop_rows[hop_order]
+        hop_bounds = np.searchsorted(self.hop_codes[hop_order], np.arange(257))
+        ambiguous = index.ambiguous if index is not None else frozenset()
+        credited = self._resolve_ambiguous(index, hop_order, hop_bounds) if ambiguous else {}
+
+        direct_rows = np.flatnonzero(self.direct_only)
+        direct_rows = direct_rows[np.argsort(self.key[direct_rows], kind="stable")]
+        direct_bounds = np.searchsorted(self.key[direct_rows], np.arange(len(self.keys) + 1))
+        key_index = {k: i for i, k in enumerate(self.keys)}
+
+        activity = {}
+        for repeater_key in repeater_keys:
+            pk = self.canonical_key(repeater_key)
+            parts = []
+            confidence = 0.0
+            try:
+                code = int(pk[:2], 16) if len(pk) >= 2 else None
+            except ValueError:
+                code = None
+            if pk[:2] in ambiguous:
+                rows, confidences = credited.get(pk, (None, None))
+                if rows is not None:
+                    parts.append(rows)
+                    confidence += float(confidences.sum())
+                # Its own packets whose hop on its prefix went to another
+                # repeater still count through the public key match
+                i = key_index.get(pk)
+                if i is not None:
+                    own = hop_rows[hop_bounds[code]:hop_bounds[code + 1]]
+                    own = own[self.key[own] == i]
+                    if rows is not None:
+                        own = np.setdiff1d(own, rows)
+                    parts.append(own)
+                    confidence += own.size
+            elif code is not None:
+                parts.append(hop_rows[hop_bounds[code]:hop_bounds[code + 1]])
+                confidence += parts[-1].size
+            i = key_index.get(pk)
+            if i is not None:
+                parts.append(direct_rows[direct_bounds[i]:direct_bounds[i + 1]])
+                confidence += parts[-1].size
+            rows = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+            act = {"last_heard_at": "", "last_heard_ms": None, "packet_count": int(rows.size),
+                   "confidence": confidence,
+                   "snr": ColumnStats(self.snr[rows]), "rssi": ColumnStats(self.rssi[rows])}
+            heard = self.heard_ms[rows]
+            if heard.size and heard.max() != MISSING:
+                # First row among those heard latest, as record_activity keeps
+                latest = rows[heard == heard.max()].min()
+                act["last_heard_ms"] = int(self.heard_ms[latest])
+                act["last_heard_at"] = self.heard_at[latest]
+            activity[repeater_key] = act
+        return activity
+
+    def results(self, window_start_ms, precision=DEFAULT_PRECISION, exact_limit=DEFAULT_EXACT_LIMIT,
+                index=None):
+        """
+        Compute every statistic for the status document.
+
+        Args:
+            window_start_ms: Start of the companion/message window (epoch ms)
+            precision: HyperLogLog precision of the distinct counters
+            exact_limit: Distinct counters stay exact up to this many values
+            index: Optional AttributionIndex for shared hop prefixes
+
+        Returns:
+            Dict shaped like AnalysisEngine.run() with default consumers
+        """
+        return {
+            "repeaters": self.latest_repeater_adverts(),
+            "latest_advert": self.latest_advert(),
+            "activity": lambda repeater_keys: self.activity_for(repeater_keys, index),
+            "companions": self.companion_days(window_start_ms, precision, exact_limit),
+            "messages": self.message_days(window_start_ms, precision, exact_limit),
+        }
@@ -0,0 +1,236 @@
+"""
+Adaptive poll scheduling for fetch-repeater-data.py.
+
+A fixed poll interval is too often when the mesh is quiet overnight and
+too slow when a repeater is about to drop offline. PollScheduler picks
+the delay to the next poll from what the last polls showed:
+
+- packet arrival rate: a time-weighted moving average of new packets per
+  second; the delay aims to collect about target_packets new packets
+- online threshold crossings: each online repeater goes offline
+  threshold_seconds after it was last heard; the next poll is placed
+  just after the earliest such crossing, so the status flips (or the
+  repeater is seen again) without waiting for the next regular poll
+- API errors: each consecutive failed poll doubles the delay, starting
+  from min_interval
+
+The delay is kept within [min_interval, max_interval] and then held to
+hourly_budget API requests in any sliding hour: polls are paced at
+3600 / hourly_budget seconds per request they are expected to make, and
+a poll that would overrun the budget waits until enough of the last
+hour's requests have aged out. The budget wins over max_interval.
+
+All times come from the injected clock (epoch seconds) and jitter from
+the injected rng, so a schedule replays identically offline. State is
+saved between runs, which lets a frequent cron job skip the runs that
+are not yet due.
+
+Usage:
+    scheduler = PollScheduler.load("data/poll-schedule.json", min_interval=60)
+    if scheduler.due():
+        ...poll...
+        scheduler.record(ok, requests, new_packets, online_last_heard_ms)
+        scheduler.save("data/poll-schedule.json")
+    delay = scheduler.next_due - scheduler.clock()
+"""
+
+import json
+import logging
+import math
+import random
+import time
+from pathlib import Path
+
+from output_writer import write_atomic
+
+logger = logging.getLogger(__name__)
+
+MIN_INTERVAL = 60  # seconds
+MAX_INTERVAL = 1800  # seconds
+HOURLY_BUDGET = 60  # API requests per sliding hour
+TARGET_PACKETS = 50  # new packets to collect per poll at the current arrival rate
+RATE_TIME_CONSTANT = 1800  # seconds; older arrival rate samples fade with this time constant
+CROSSING_MARGIN = 30  # seconds after a predicted offline crossing to poll
+BUDGET_WINDOW = 3600  # seconds
+SCHEDULE_VERSION = 1
+
+
+class PollScheduler:
+    """
+    Delay to the next poll from arrivals, threshold crossings, errors and budget.
+
+    Call record() after every poll; next_due and reason then describe
+    the next one.
+    """
+
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, hourly_budget=HOURLY_BUDGET,
+                 threshold_seconds=None, target_packets=TARGET_PACKETS, jitter=0.0, clock=None, rng=None):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("need 0 < min_interval <= max_interval")
+        if hourly_budget < 1:
+            raise ValueError("hourly_budget must be at least 1")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.hourly_budget = hourly_budget
+        self.threshold_seconds = threshold_seconds
+        self.target_packets = target_packets
+        self.jitter = jitter
+        self.clock = clock or time.time
+        self.rng = rng or random.Random()
+        self.rate = None  # new packets per second (moving average)
+        self.requests_per_poll = 1.0  # moving average of API requests per poll
+        self.failures = 0  # consecutive failed polls
+        self.last_poll = None  # epoch seconds
+        self.next_crossing = None  # earliest predicted offline crossing, epoch seconds
+        self.next_due = None  # epoch seconds; None polls right away
+        self.reason = "start"
+        self.history = []  # [epoch seconds, requests] for polls in the last BUDGET_WINDOW
+
+    # State
+
+    def to_dict(self):
+        return {
+            "version": SCHEDULE_VERSION,
+            "rate": self.rate,
+            "requestsPerPoll": self.requests_per_poll,
+            "failures": self.failures,
+            "lastPoll": self.last_poll,
+            "nextCrossing": self.next_crossing,
+            "nextDue": self.next_due,
+            "reason": self.reason,
+            "history": self.history,
+        }
+
+    def restore(self, data):
+        """Take over the state saved by to_dict() (the configuration stays as given)."""
+        if data.get("version") != SCHEDULE_VERSION:
+            return
+        self.rate = data.get("rate")
+        self.requests_per_poll = data.get("requestsPerPoll") or 1.0
+        self.failures = data.get("failures", 0)
+        self.last_poll = data.get("lastPoll")
+        self.next_crossing = data.get("nextCrossing")
+        self.next_due = data.get("nextDue")
+        self.reason = data.get("reason", "start")
+        self.history = [list(entry) for entry in data.get("history", [])]
+
+    @classmethod
+    def load(cls, path, **config):
+        """A scheduler configured by config with the state saved at path, if readable."""
+        scheduler = cls(**config)
+        path = Path(path)
+        if path.exists():
+            try:
+                scheduler.restore(json.loads(path.read_text()))
+            except (json.JSONDecodeError, OSError, ValueError, TypeError) as e:
+                logger.warning(f"Could not load poll schedule, starting over: {e}")
+        return scheduler
+
+    def save(self, path):
+        """Write the schedule state (via a temporary file)."""
+        write_atomic(path, json.dumps(self.to_dict(), separators=(",", ":")).encode())
+
+    # Scheduling
+
+    def due(self, slack=0.0):
+        """True if the next poll is due (within slack seconds)."""
+        return self.next_due is None or self.clock() >= self.next_due - slack
+
+    def crossing_due(self):
+        """True if a predicted offline crossing has passed since the last status."""
+        return self.next_crossing is not None and self.clock() >= self.next_crossing
+
+    def requests_in_window(self, now=None):
+        now = self.clock() if now is None else now
+        return sum(requests for at, requests in self.history if at > now - BUDGET_WINDOW)
+
+    def record(self, ok, requests=1, new_packets=None, online_last_heard_ms=None):
+        """
+        Account for a finished poll and schedule the next one.
+
+        Args:
+            ok: Whether the poll succeeded
+            requests: API requests the poll made
+            new_packets: Packets heard since the previous poll (None if unknown)
+            online_last_heard_ms: Last-heard times (epoch ms) of the repeaters now
+                                  online, or None to keep the previous crossing
+
+        Returns:
+            Seconds until the next poll
+        """
+        now = self.clock()
+        self.history = [entry for entry in self.history if entry[0] > now - BUDGET_WINDOW]
+        if requests:
+            self.history.append([now, requests])
+            self.requests_per_poll += 0.3 * (requests - self.requests_per_poll)
+
+        if ok:
+            self.failures = 0
+            if new_packets is not None and self.last_poll is not None and now > self.last_poll:
+                self._update_rate(new_packets / (now - self.last_poll), now - self.last_poll)
+            if online_last_heard_ms is not None:
+                self.next_crossing = self._next_crossing(online_last_heard_ms, now)
+            self.last_poll = now
+        else:
+            self.failures += 1
+
+        delay, self.reason = self._delay(now)
+        self.next_due = now + delay
+        return delay
+
+    def _update_rate(self, sample, elapsed):
+        if self.rate is None:
+            self.rate = sample
+            return
+        weight = 1 - math.exp(-elapsed / RATE_TIME_CONSTANT)
+        self.rate += weight * (sample - self.rate)
+
+    def _next_crossing(self, online_last_heard_ms, now):
+        if self.threshold_seconds is None:
+            return None
+        crossings = [heard_ms / 1000 + self.threshold_seconds for heard_ms in online_last_heard_ms
+                     if heard_ms is not None]
+        upcoming = [at for at in crossings if at > now]
+        return min(upcoming) if upcoming else None
+
+    def _delay(self, now):
+        """(seconds, reason) for the next poll after one at now."""
+        if self.failures:
+            delay, reason = self.min_interval * 2 ** self.failures, "backoff"
+        else:
+            delay, reason = self.max_interval, "max"
+            if self.rate:
+                arrival = self.target_packets / self.rate
+                if arrival < delay:
+                    delay, reason = arrival, "arrivals"
+            if self.next_crossing is not None:
+                crossing = self.next_crossing - now + CROSSING_MARGIN
+                if crossing < delay:
+                    delay, reason = crossing, "crossing"
+        if delay < self.min_interval:
+            delay, reason = self.min_interval, f"{reason}, min"
+        elif delay > self.max_interval:
+            delay, reason = self.max_interval, f"{reason}, max"
+        if self.jitter and not reason.startswith("crossing"):
+            delay = min(self.max_interval, max(self.min_interval,
+                                               delay * (1 + self.rng.uniform(-self.jitter, self.jitter))))
+
+        budget = self._budget_delay(now)
+        if budget > delay:
+            delay, reason = budget, f"{reason}, budget"
+        return delay, reason
+
+    def _budget_delay(self, now):
+        """Shortest delay that keeps the next poll within the hourly request budget."""
+        expected = self.requests_per_poll
+        pace = BUDGET_WINDOW * expected / self.hourly_budget
+        last = self.history[-1][0] if self.history else None
+        delay = pace - (now - last) if last is not None else 0.0
+        # Wait for old requests to leave the window until the next poll fits
+        used = self.requests_in_window(now)
+        for at, requests in self.history:
+            if used + expected <= self.hourly_budget:
+                break
+            used -= requests
+            delay = max(delay, at + BUDGET_WINDOW - now)
+        return max(0.0, delay)
@@ -0,0 +1,527 @@
+"""
+Frozen reference implementation of the repeater status analysis.
+
+These are the analysis functions of fetch-repeater-data.py as they were
+before any of the performance work (separate passes over the packet
+list, substring path matching, string timestamp comparisons, SNR/RSSI
+value lists). check-equivalence.py runs them next to the current
+pipeline and diffs the resulting status documents.
+
+Do not change this module to follow the pipeline. The only edits to the
+original code are the now arguments, which replace datetime.now() so
+both implementations see the same frozen clock, and
+build_reference_document(), which is the original main() without the
+fetch and the file output. Intended differences are declared in
+check-equivalence.py instead.
+"""
+
+import logging
+from datetime import datetime, timezone, timedelta
+
+logger = logging.getLogger(__name__)
+
+ONLINE_THRESHOLD_MINUTES = 240  # Node is online if heard within last 240 minutes
+ADVERT_STALE_DAYS = 3  # Exclude repeaters with no advert in this many days
+RSSI_MIN = -120  # dBm
+RSSI_MAX = 0  # dBm
+
+
+def filter_repeater_packets(packets):
+    """
+    Filter packets to keep only repeater advertisements.
+    
+    Args:
+        packets: List of packet dictionaries from API
+        
+    Returns:
+        List of repeater advertisement packets
+    """
+    if not packets:
+        return []
+    
+    repeater_packets = []
+    for packet in packets:
+        # Filter for Advert type packets with Repeater mode
+        decoded = packet.get("decoded_payload") or {}
+        if (packet.get("payload_type") == "Advert" and 
+            decoded.get("mode") == "Repeater"):
+            repeater_packets.append(packet)
+            logger.debug(f"Found repeater packet: {packet.get('decoded_payload', {}).get('name')} (id={packet.get('id')})")
+    
+    logger.info(f"Filtered {len(repeater_packets)} repeater packets from {len(packets)} total")
+    return repeater_packets
+
+
+def aggregate_repeaters(packets):
+    """
+    Aggregate repeater packets by public_key to get latest information.
+    
+    Args:
+        packets: List of repeater advertisement packets
+        
+    Returns:
+        Dictionary mapping public_key to latest packet info
+    """
+    repeaters = {}
+    
+    for packet in packets:
+        # Public key is in decoded_payload for Advert packets
+        decoded = packet.get("decoded_payload") or {}
+        public_key = decoded.get("public_key")
+        if not public_key:
+            continue
+        
+        # Keep only the most recent packet for each repeater
+        if public_key not in repeaters:
+            repeaters[public_key] = packet
+        else:
+            # Compare timestamps to keep the most recent
+            current_heard = repeaters[public_key].get("heard_at", "")
+            new_heard = packet.get("heard_at", "")
+            if new_heard > current_heard:
+                repeaters[public_key] = packet
+    
+    logger.info(f"Aggregated into {len(repeaters)} unique repeaters")
+    return repeaters
+
+
+def filter_stale_repeaters(all_packets, repeaters, max_age_days=ADVERT_STALE_DAYS, now=None):
+    """
+    Remove repeaters whose most recent payload_type=Advert packet is older
+    than max_age_days.
+
+    Scans all_packets for Advert packets matching each repeater's public key
+    and uses the newest heard_at among those Adverts to decide freshness.
+
+    Args:
+        all_packets: Full list of packets from the API
+        repeaters: Dict mapping public_key to latest Advert packet (from
+                   aggregate_repeaters)
+        max_age_days: Maximum age in days for the latest Advert packet
+
+    Returns:
+        Filtered dict with stale repeaters removed
+    """
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=max_age_days)
+
+    # Find the latest Advert heard_at per repeater public key
+    latest_advert: dict[str, str] = {}
+    for packet in all_packets:
+        if packet.get("payload_type") != "Advert":
+            continue
+        decoded = packet.get("decoded_payload") or {}
+        pk = (decoded.get("public_key") or "").lower()
+        if pk and pk in {k.lower() for k in repeaters}:
+            heard_at_str = packet.get("heard_at", "")
+            if heard_at_str > latest_advert.get(pk, ""):
+                latest_advert[pk] = heard_at_str
+
+    filtered = {}
+    for key, packet in repeaters.items():
+        heard_at_str = latest_advert.get(key.lower(), "")
+        if heard_at_str:
+            try:
+                heard_at = datetime.fromisoformat(heard_at_str.replace('Z', '+00:00'))
+                if heard_at >= cutoff:
+                    filtered[key] = packet
+                else:
+                    name = packet.get("node_name", key[:8])
+                    logger.debug(f"Excluding stale repeater '{name}' (last Advert: {heard_at_str[:19]})")
+            except (ValueError, AttributeError):
+                logger.warning(f"Invalid heard_at for repeater {key[:8]}, excluding")
+        else:
+            logger.warning(f"No Advert heard_at for repeater {key[:8]}, excluding")
+
+    removed = len(repeaters) - len(filtered)
+    logger.info(f"Filtered out {removed} stale repeaters (no Advert in last {max_age_days} days), {len(filtered)} remain")
+    return filtered
+
+
+def find_repeater_activity(all_packets, repeater_keys):
+    """
+    Scan all packets to find repeater activity.
+    
+    A packet is considered to involve a repeater if:
+    1. The packet's decoded_payload.public_key matches a repeater's public key, OR
+    2. The first 2 characters of a repeater's public_key appear in the packet's path value
+    
+    Either match counts as a positive indicator that the repeater was active.
+    
+    Args:
+        all_packets: List of all packet dicts from the API
+        repeater_keys: Set of repeater public keys (from Advert packets)
+        
+    Returns:
+        Dict mapping repeater_key -> {
+            "last_heard_at": str (ISO timestamp),
+            "snr_values": list of floats,
+            "rssi_values": list of floats,
+            "packet_count": int
+        }
+    """
+    # Build lookup structures with case-insensitive matching
+    normalized_keys = {k.lower(): k for k in repeater_keys}
+    
+    # Map 2-char prefixes to their repeater keys
+    key_prefixes = {}
+    for key in repeater_keys:
+        prefix = key[:2].lower()
+        if prefix not in key_prefixes:
+            key_prefixes[prefix] = []
+        key_prefixes[prefix].append(key)
+    
+    # Initialize activity tracking for each repeater
+    activity = {
+        key: {"last_heard_at": "", "snr_values": [], "rssi_values": [], "packet_count": 0}
+        for key in repeater_keys
+    }
+    
+    for packet in all_packets:
+        decoded = packet.get("decoded_payload") or {}
+        packet_public_key = (decoded.get("public_key") or "").lower()
+        path = str(packet.get("path", "")).lower()
+        heard_at = packet.get("heard_at", "")
+        snr = packet.get("snr")
+        rssi = packet.get("rssi")
+        
+        matched_repeaters = set()
+        
+        # Check 1: Does this packet's public_key match a known repeater?
+        if packet_public_key and packet_public_key in normalized_keys:
+            matched_repeaters.add(normalized_keys[packet_public_key])
+        
+        # Check 2: Does any repeater's 2-char prefix appear in the path?
+        if path:
+            for prefix, keys in key_prefixes.items():
+                if prefix in path:
+                    for key in keys:
+                        matched_repeaters.add(key)
+        
+        # Update activity for all matched repeaters
+        for repeater_key in matched_repeaters:
+            act = activity[repeater_key]
+            act["packet_count"] += 1
+            
+            if heard_at and heard_at > act["last_heard_at"]:
+                act["last_heard_at"] = heard_at
+            
+            if snr is not None:
+                try:
+                    act["snr_values"].append(float(snr))
+                except (ValueError, TypeError):
+                    pass
+            
+            if rssi is not None:
+                try:
+                    act["rssi_values"].append(float(rssi))
+                except (ValueError, TypeError):
+                    pass
+    
+    for key, act in activity.items():
+        logger.debug(f"Repeater {key[:8]}: {act['packet_count']} packets, last heard: {act['last_heard_at'][:19] if act['last_heard_at'] else 'never'}")
+    
+    logger.info(f"Scanned {len(all_packets)} packets for activity across {len(repeater_keys)} repeaters")
+    return activity
+
+
+def count_companion_nodes(packets, now=None):
+    """
+    Count unique Companion nodes active in the last 30 days.
+    
+    Filters for packets where decoded_payload.mode == "Companion"
+    and heard_at is within the last 30 days, then counts unique
+    public keys.
+    
+    Args:
+        packets: List of all packet dicts from API
+        
+    Returns:
+        int: Count of unique companion public keys
+    """
+    now = now or datetime.now(timezone.utc)
+    thirty_days_ago = now - timedelta(days=30)
+    companion_keys = set()
+    
+    for packet in packets:
+        decoded = packet.get("decoded_payload") or {}
+        if decoded.get("mode") == "Companion":
+            heard_at_str = packet.get("heard_at", "")
+            if heard_at_str:
+                try:
+                    heard_at = datetime.fromisoformat(heard_at_str.replace('Z', '+00:00'))
+                    if heard_at >= thirty_days_ago:
+                        public_key = decoded.get("public_key")
+                        if public_key:
+                            companion_keys.add(public_key.lower())
+                except (ValueError, AttributeError):
+                    pass
+    
+    logger.info(f"Found {len(companion_keys)} unique companion nodes active in last 30 days")
+    return len(companion_keys)
+
+
+def count_messages(packets, now=None):
+    """
+    Count text messages from the last 30 days.
+    
+    Counts packets where payload_type is "TextMessage" or "GroupText",
+    excluding any with decoded_payload.channel_hash == 81.
+    Only counts messages with heard_at within the last 30 days.
+    
+    Args:
+        packets: List of all packet dicts from API
+        
+    Returns:
+        int: Count of distinct matching messages (deduplicated by hash)
+    """
+    now = now or datetime.now(timezone.utc)
+    thirty_days_ago = now - timedelta(days=30)
+    message_hashes = set()
+    
+    for packet in packets:
+        payload_type = packet.get("payload_type", "")
+        if payload_type in ("TextMessage", "GroupText"):
+            decoded = packet.get("decoded_payload") or {}
+            if decoded.get("channel_hash") == 81:
+                continue
+            heard_at_str = packet.get("heard_at", "")
+            if heard_at_str:
+                try:
+                    heard_at = datetime.fromisoformat(heard_at_str.replace('Z', '+00:00'))
+                    if heard_at >= thirty_days_ago:
+                        msg_hash = packet.get("hash")
+                        if msg_hash:
+                            message_hashes.add(msg_hash)
+                except (ValueError, AttributeError):
+                    pass
+    
+    logger.info(f"Found {len(message_hashes)} distinct messages (TextMessage/GroupText, excl. channel_hash=81) in last 30 days")
+    return len(message_hashes)
+
+
+def calculate_online_status(heard_at_str, threshold_minutes=ONLINE_THRESHOLD_MINUTES, now=None):
+    """
+    Determine if repeater is online based on last heard time.
+    
+    Args:
+        heard_at_str: ISO format timestamp string
+        threshold_minutes: Minutes within which to consider online
+        
+    Returns:
+        Tuple of (status_string, datetime_object)
+    """
+    try:
+        # Parse ISO format timestamp
+        heard_at = datetime.fromisoformat(heard_at_str.replace('Z', '+00:00'))
+        now = now or datetime.now(timezone.utc)
+        time_diff = now - heard_at
+        
+        if time_diff < timedelta(minutes=threshold_minutes):
+            return "online", heard_at
+        else:
+            return "offline", heard_at
+    except (ValueError, AttributeError):
+        logger.warning(f"Invalid timestamp format: {heard_at_str}")
+        return "unknown", None
+
+
+def calculate_rssi_percentage(rssi_dbm):
+    """
+    Convert RSSI dBm value to percentage (0-100).
+    
+    Formula: -120 dBm = 0%, 0 dBm = 100%
+    
+    Args:
+        rssi_dbm: Signal strength in dBm (typically -120 to 0)
+        
+    Returns:
+        Percentage value (0-100) or None if invalid
+    """
+    if rssi_dbm is None:
+        return None
+    
+    try:
+        rssi = float(rssi_dbm)
+        # Clamp to valid range
+        rssi = max(RSSI_MIN, min(RSSI_MAX, rssi))
+        # Convert to percentage: 0% at -120dBm, 100% at 0dBm
+        percentage = ((rssi - RSSI_MIN) / (RSSI_MAX - RSSI_MIN)) * 100
+        return round(percentage, 1)
+    except (ValueError, TypeError):
+        return None
+
+
+def build_node_record(public_key, packet, activity=None, now=None):
+    """
+    Build a node record from a repeater advertisement packet and activity data.
+    
+    Args:
+        public_key: Unique node identifier
+        packet: API packet dictionary (Advert packet for metadata)
+        activity: Activity dict with last_heard_at, snr_values, rssi_values
+        
+    Returns:
+        Node record dictionary
+    """
+    decoded = packet.get("decoded_payload") or {}
+    
+    # Use activity-based heard_at if available, otherwise fall back to packet heard_at
+    if activity and activity.get("last_heard_at"):
+        heard_at_str = activity["last_heard_at"]
+    else:
+        heard_at_str = packet.get("heard_at", "")
+    
+    status, heard_dt = calculate_online_status(heard_at_str, now=now)
+    
+    # Generate a simple ID from public key
+    node_id = f"node-{public_key[:12].lower()}"
+    
+    # Extract location
+    latitude = decoded.get("lat")
+    longitude = decoded.get("lon")
+    
+    # Calculate average SNR from activity data
+    avg_snr = None
+    if activity and activity.get("snr_values"):
+        avg_snr = round(sum(activity["snr_values"]) / len(activity["snr_values"]), 1)
+    
+    # Calculate average RSSI from activity data
+    avg_rssi = None
+    if activity and activity.get("rssi_values"):
+        avg_rssi = round(sum(activity["rssi_values"]) / len(activity["rssi_values"]), 1)
+    
+    record = {
+        "id": node_id,
+        "name": packet.get("node_name", f"Node {public_key[:8]}"),
+        "status": status,
+        "publicKey": public_key,
+        "location": {
+            "latitude": latitude,
+            "longitude": longitude,
+            "address": ""  # Could be enhanced with reverse geocoding
+        },
+        "lastSeen": heard_at_str,
+        "signalStrength": packet.get("rssi"),
+        "signalPercentage": calculate_rssi_percentage(packet.get("rssi")),
+        "averageSNR": avg_snr,
+        "averageRSSI": avg_rssi,
+        "averageRSSIPercentage": calculate_rssi_percentage(avg_rssi),
+        "activityPacketCount": activity.get("packet_count", 0) if activity else 0,
+        "batteryLevel": None,  # Not available from API
+        "uptime": None,  # Not available from API
+        "hardware": decoded.get("hw_model", "Unknown"),
+        "firmware": decoded.get("firmware_version", "Unknown"),
+        "role": decoded.get("mode", "Unknown")
+    }
+    
+    return record
+
+
+def calculate_network_stats(nodes, companion_count=0, now=None):
+    """
+    Calculate aggregate network statistics.
+    
+    Args:
+        nodes: List of node records
+        companion_count: Number of unique companion nodes active in last 30 days
+        
+    Returns:
+        Dictionary with network statistics
+    """
+    now = now or datetime.now(timezone.utc)
+    if not nodes:
+        return {
+            "totalNodes": 0,
+            "onlineNodes": 0,
+            "offlineNodes": 0,
+            "averageSignal": None,
+            "averageSNR": None,
+            "companionCount": companion_count,
+            "networkHealth": "unknown",
+            "lastUpdated": now.isoformat()
+        }
+    
+    total = len(nodes)
+    online = sum(1 for n in nodes if n["status"] == "online")
+    offline = total - online
+    
+    # Calculate average signal strength from per-node averageRSSI (or fallback to signalStrength)
+    signals = []
+    for n in nodes:
+        if n.get("averageRSSI") is not None:
+            signals.append(n["averageRSSI"])
+        elif n.get("signalStrength") is not None:
+            signals.append(n["signalStrength"])
+    avg_signal = round(sum(signals) / len(signals), 1) if signals else None
+    
+    # Calculate average SNR across all nodes
+    snr_values = [n["averageSNR"] for n in nodes if n.get("averageSNR") is not None]
+    avg_snr = round(sum(snr_values) / len(snr_values), 1) if snr_values else None
+    
+    # Calculate network health percentage
+    health_percent = round((online / total * 100), 1) if total > 0 else 0
+    
+    # Determine health status
+    if health_percent >= 90:
+        health_status = "excellent"
+    elif health_percent >= 75:
+        health_status = "good"
+    elif health_percent >= 50:
+        health_status = "fair"
+    else:
+        health_status = "poor"
+    
+    return {
+        "totalNodes": total,
+        "onlineNodes": online,
+        "offlineNodes": offline,
+        "healthPercentage": health_percent,
+        "averageSignal": avg_signal,
+        "averageSNR": avg_snr,
+        "companionCount": companion_count,
+        "networkHealth": health_status,
+        "lastUpdated": now.isoformat()
+    }
+
+
+def build_reference_document(api_data, now=None):
+    """
+    Build the status document the original script wrote for api_data.
+
+    Args:
+        api_data: List of packet dictionaries
+        now: Frozen reference time (default: now)
+
+    Returns:
+        Status document, or None if there are no repeater packets (the
+        original script kept the previous file in that case)
+    """
+    now = now or datetime.now(timezone.utc)
+    repeater_packets = filter_repeater_packets(api_data)
+    if not repeater_packets:
+        return None
+    repeaters = aggregate_repeaters(repeater_packets)
+    repeaters = filter_stale_repeaters(api_data, repeaters, now=now)
+    repeater_keys = set(repeaters.keys())
+    activity = find_repeater_activity(api_data, repeater_keys)
+    companion_count = count_companion_nodes(api_data, now=now)
+    message_count = count_messages(api_data, now=now)
+    nodes = [
+        build_node_record(pk, packet, activity.get(pk), now=now)
+        for pk, packet in repeaters.items()
+    ]
+    stats = calculate_network_stats(nodes, companion_count, now=now)
+    return {
+        "lastUpdated": stats["lastUpdated"],
+        "totalNodes": stats["totalNodes"],
+        "onlineNodes": stats["onlineNodes"],
+        "offlineNodes": stats["offlineNodes"],
+        "healthPercentage": stats.get("healthPercentage"),
+        "networkHealth": stats["networkHealth"],
+        "averageSignal": stats["averageSignal"],
+        "averageSNR": stats["averageSNR"],
+        "companionCount": stats["companionCount"],
+        "messageCount": message_count,
+        "nodes": sorted(nodes, key=lambda n: n["name"])
+    }
@@ -0,0 +1,427 @@
+"""
+Historical rollups for fetch-repeater-data.py.
+
+repeater-status.json is a snapshot; this module keeps the history behind
+it as pre-aggregated buckets per repeater and for the whole network:
+packet count, message count, online samples and SNR/RSSI count, sum,
+min and max (so the mean of any merged bucket is exact).
+
+Storage is a directory of JSON-lines files, one per resolution, one
+bucket per line as a compact array:
+
+    [start_ms, key, packets, messages,
+     snr_n, snr_sum, snr_min, snr_max, rssi_n, rssi_sum, rssi_min, rssi_max,
+     samples, online, nodes]
+
+key is a canonical repeater public key, or NETWORK_KEY for network-wide
+buckets. New data is only ever appended to the 5-minute file, and a
+bucket may appear on several lines (a run that ends mid-bucket appends
+the rest of it on the next run); lines for the same bucket are merged on
+read. compact() rewrites the files: duplicate lines are merged, 5-minute
+buckets older than their retention are downsampled into hourly buckets,
+hourly into daily, and daily buckets past their retention are dropped.
+
+export() writes one fixed-size JSON file per node (plus network.json)
+holding the most recent EXPORT_POINTS buckets of each resolution as
+parallel arrays, so the website can draw history charts directly.
+
+Usage:
+    store = RollupStore("data/rollups")
+    store.append(merge_buckets(packet_buckets, status_buckets(document, now_ms)), through_ms)
+    store.compact(now_ms)
+    store.export("data/history", nodes, now_ms)
+"""
+
+import json
+import logging
+from pathlib import Path
+
+from output_writer import write_atomic
+
+logger = logging.getLogger(__name__)
+
+MINUTE_MS = 60_000
+DAY_MS = 1440 * MINUTE_MS
+RESOLUTIONS = {"5m": 5 * MINUTE_MS, "1h": 60 * MINUTE_MS, "1d": DAY_MS}  # finest first
+RETENTION_MS = {"5m": 2 * DAY_MS, "1h": 35 * DAY_MS, "1d": 400 * DAY_MS}
+EXPORT_POINTS = {"5m": 288, "1h": 168, "1d": 90}  # 24 hours, 7 days, 90 days
+NETWORK_KEY = "*"
+NETWORK_FILE = "network.json"
+STATE_FILE = "state.json"
+
+
+def bucket_start(ms, step):
+    """Start (epoch ms) of the bucket of width step that contains ms."""
+    return ms - ms % step
+
+
+class Bucket:
+    """One rollup bucket; buckets for the same period and key merge exactly."""
+
+    __slots__ = ("packets", "messages",
+                 "snr_n", "snr_sum", "snr_min", "snr_max",
+                 "rssi_n", "rssi_sum", "rssi_min", "rssi_max",
+                 "samples", "online", "nodes")
+
+    def __init__(self):
+        self.packets = 0
+        self.messages = 0
+        self.snr_n = 0
+        self.snr_sum = 0.0
+        self.snr_min = None
+        self.snr_max = None
+        self.rssi_n = 0
+        self.rssi_sum = 0.0
+        self.rssi_min = None
+        self.rssi_max = None
+        self.samples = 0  # status snapshots taken in this bucket
+        self.online = 0  # snapshots online (network: sum of online nodes)
+        self.nodes = 0  # snapshots counted (network: sum of total nodes)
+
+    def add_packet(self, snr, rssi, message=False):
+        """
+        Count one packet and its signal readings.
+
+        Args:
+            snr: SNR reading (numeric-like, or None)
+            rssi: RSSI reading (numeric-like, or None)
+            message: Count it as a message as well
+        """
+        self.packets += 1
+        if message:
+            self.messages += 1
+        if snr is not None:
+            try:
+                snr = float(snr)
+            except (ValueError, TypeError):
+                snr = None
+            if snr is not None:
+                self.snr_n += 1
+                self.snr_sum += snr
+                self.snr_min = snr if self.snr_min is None else min(self.snr_min, snr)
+                self.snr_max = snr if self.snr_max is None else max(self.snr_max, snr)
+        if rssi is not None:
+            try:
+                rssi = float(rssi)
+            except (ValueError, TypeError):
+                rssi = None
+            if rssi is not None:
+                self.rssi_n += 1
+                self.rssi_sum += rssi
+                self.rssi_min = rssi if self.rssi_min is None else min(self.rssi_min, rssi)
+                self.rssi_max = rssi if self.rssi_max is None else max(self.rssi_max, rssi)
+
+    def add_status(self, online, nodes=1):
+        """Record one status snapshot: online is a count (or bool) out of nodes."""
+        self.samples += 1
+        self.online += int(online)
+        self.nodes += nodes
+
+    def merge(self, other):
+        """Fold another bucket for the same key into this one."""
+        self.packets += other.packets
+        self.messages += other.messages
+        self.snr_n += other.snr_n
+        self.snr_sum += other.snr_sum
+        self.snr_min = _merge_extreme(min, self.snr_min, other.snr_min)
+        self.snr_max = _merge_extreme(max, self.snr_max, other.snr_max)
+        self.rssi_n += other.rssi_n
+        self.rssi_sum += other.rssi_sum
+        self.rssi_min = _merge_extreme(min, self.rssi_min, other.rssi_min)
+        self.rssi_max = _merge_extreme(max, self.rssi_max, other.rssi_max)
+        self.samples += other.samples
+        self.online += other.online
+        self.nodes += other.nodes
+        return self
+
+    def to_row(self, start_ms, key):
+        """Return the compact line representation."""
+        return [start_ms, key, self.packets, self.messages,
+                self.snr_n, round(self.snr_sum, 3), self.snr_min, self.snr_max,
+                self.rssi_n, round(self.rssi_sum, 3), self.rssi_min, self.rssi_max,
+                self.samples, self.online, self.nodes]
+
+    @classmethod
+    def from_row(cls, row):
+        """Inverse of to_row(); returns (start_ms, key, bucket)."""
+        bucket = cls()
+        (start_ms, key, bucket.packets, bucket.messages,
+         bucket.snr_n, bucket.snr_sum, bucket.snr_min, bucket.snr_max,
+         bucket.rssi_n, bucket.rssi_sum, bucket.rssi_min, bucket.rssi_max,
+         bucket.samples, bucket.online, bucket.nodes) = row
+        return start_ms, key, bucket
+
+
+def status_buckets(document, now_ms):
+    """
+    Record one status snapshot as 5-minute buckets.
+
+    Args:
+        document: Status document (nodes with publicKey and status,
+                  onlineNodes, totalNodes)
+        now_ms: Snapshot time (epoch ms)
+
+    Returns:
+        Dict mapping (start_ms, key) -> Bucket, with one online sample
+        per node and one for the network
+    """
+    start = bucket_start(now_ms, RESOLUTIONS["5m"])
+    buckets = {}
+    for node in document.get("nodes", []):
+        key = (node.get("publicKey") or "").lower()
+        if key:
+            bucket = buckets.setdefault((start, key), Bucket())
+            bucket.add_status(node.get("status") == "online")
+    network = buckets.setdefault((start, NETWORK_KEY), Bucket())
+    network.add_status(document.get("onlineNodes", 0), document.get("totalNodes", 0))
+    return buckets
+
+
+def merge_buckets(*bucket_maps):
+    """Merge dicts of (start_ms, key) -> Bucket into a new dict."""
+    merged = {}
+    for buckets in bucket_maps:
+        for k, bucket in buckets.items():
+            current = merged.get(k)
+            merged[k] = Bucket().merge(bucket) if current is None else current.merge(bucket)
+    return merged
+
+
+def _merge_extreme(pick, a, b):
+    """min/max of two optional values."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return pick(a, b)
+
+
+def _mean(total, n, digits=1):
+    return round(total / n, digits) if n else None
+
+
+def _round(value, digits=1):
+    return round(value, digits) if value is not None else None
+
+
+def series_document(buckets, now_ms):
+    """
+    Build the fixed-size chart document for one key.
+
+    Args:
+        buckets: Dict resolution -> {start_ms: Bucket} for the key
+        now_ms: Reference time; the last point of each series is the
+                bucket containing now_ms
+
+    Returns:
+        Dict resolution -> {"start", "step", and one array per field},
+        each array EXPORT_POINTS[resolution] long (null where there is
+        no data)
+    """
+    document = {}
+    for resolution, step in RESOLUTIONS.items():
+        points = EXPORT_POINTS[resolution]
+        start = bucket_start(now_ms, step) - (points - 1) * step
+        by_start = buckets.get(resolution, {})
+        fields = {name: [] for name in ("packets", "messages", "online",
+                                        "snrMean", "snrMin", "snrMax",
+                                        "rssiMean", "rssiMin", "rssiMax")}
+        for i in range(points):
+            b = by_start.get(start + i * step)
+            if b is None:
+                for values in fields.values():
+                    values.append(None)
+                continue
+            fields["packets"].append(b.packets)
+            fields["messages"].append(b.messages)
+            # Share of snapshots online (network: average online fraction)
+            fields["online"].append(round(b.online / b.nodes, 3) if b.nodes else None)
+            fields["snrMean"].append(_mean(b.snr_sum, b.snr_n))
+            fields["snrMin"].append(_round(b.snr_min))
+            fields["snrMax"].append(_round(b.snr_max))
+            fields["rssiMean"].append(_mean(b.rssi_sum, b.rssi_n))
+            fields["rssiMin"].append(_round(b.rssi_min))
+            fields["rssiMax"].append(_round(b.rssi_max))
+        document[resolution] = {"start": start, "step": step, **fields}
+    return document
+
+
+class RollupStore:
+    """
+    Append-only rollup files with retention and downsampling.
+
+    through_ms is the newest packet store insertion time (inserted_ms)
+    already rolled up; callers only feed packets stored after it, so
+    re-analyzing the same window on every run does not count packets
+    twice, and a packet stored late still lands in the bucket it was
+    heard in. Packets that do not come from the store are cut on their
+    heard time instead.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.through_ms = None
+        state_path = self.directory / STATE_FILE
+        if state_path.exists():
+            try:
+                self.through_ms = json.loads(state_path.read_text()).get("through_ms")
+            except (json.JSONDecodeError, OSError) as e:
+                logger.warning(f"Could not read rollup state, starting over: {e}")
+
+    def path(self, resolution):
+        return self.directory / f"{resolution}.jsonl"
+
+    def append(self, buckets, through_ms=None):
+        """
+        Append 5-minute buckets and advance the high-water mark.
+
+        Args:
+            buckets: Dict mapping (start_ms, key) -> Bucket
+            through_ms: Newest packet insertion time included (epoch ms),
+                        or None to leave the mark unchanged
+
+        Returns:
+            Number of lines appended
+        """
+        if buckets:
+            with open(self.path("5m"), "a") as f:
+                for (start_ms, key), bucket in sorted(buckets.items()):
+                    f.write(json.dumps(bucket.to_row(start_ms, key), separators=(",", ":")) + "\n")
+        if through_ms is not None and (self.through_ms is None or through_ms > self.through_ms):
+            self.through_ms = through_ms
+            write_atomic(self.directory / STATE_FILE, json.dumps({"through_ms": through_ms}).encode())
+        return len(buckets)
+
+    def load(self, resolution):
+        """
+        Read one resolution, merging lines for the same bucket.
+
+        Returns:
+            Dict mapping (start_ms, key) -> Bucket
+        """
+        buckets = {}
+        path = self.path(resolution)
+        if not path.exists():
+            return buckets
+        with open(path) as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    start_ms, key, bucket = Bucket.from_row(json.loads(line))
+                except (json.JSONDecodeError, ValueError, TypeError):
+                    # A run killed mid-append leaves at most one bad line
+                    logger.warning(f"Skipping malformed rollup line {path.name}:{line_no}")
+                    continue
+                current = buckets.get((start_ms, key))
+                if current is None:
+                    buckets[(start_ms, key)] = bucket
+                else:
+                    current.merge(bucket)
+        return buckets
+
+    def _save(self, resolution, buckets):
+        lines = [json.dumps(b.to_row(start_ms, key), separators=(",", ":"))
+                 for (start_ms, key), b in sorted(buckets.items())]
+        write_atomic(self.path(resolution), "".join(line + "\n" for line in lines).encode())
+
+    def compact(self, now_ms):
+        """
+        Merge duplicate lines, downsample aged buckets and apply retention.
+
+        A bucket older than its resolution's retention is folded into the
+        next coarser resolution; daily buckets older than their retention
+        are dropped.
+
+        Returns:
+            Dict resolution -> number of buckets kept
+        """
+        kept = {}
+        carry = {}
+        resolutions = list(RESOLUTIONS)
+        for i, resolution in enumerate(resolutions):
+            buckets = self.load(resolution)
+            for key, bucket in carry.items():
+                current = buckets.get(key)
+                buckets[key] = bucket if current is None else current.merge(bucket)
+            cutoff = now_ms - RETENTION_MS[resolution]
+            aged = [k for k in buckets if k[0] < cutoff]
+            carry = {}
+            if i + 1 < len(resolutions):
+                coarser = RESOLUTIONS[resolutions[i + 1]]
+                for start_ms, key in aged:
+                    target = (bucket_start(start_ms, coarser), key)
+                    bucket = buckets[(start_ms, key)]
+                    current = carry.get(target)
+                    carry[target] = bucket if current is None else current.merge(bucket)
+            for k in aged:
+                del buckets[k]
+            self._save(resolution, buckets)
+            kept[resolution] = len(buckets)
+        logger.info("Rollups compacted: " + ", ".join(f"{n} {r}" for r, n in kept.items()))
+        return kept
+
+    def series(self):
+        """
+        Load every resolution, each completed with the finer data not yet
+        downsampled into it (so the hourly series includes the last two
+        days, which still live in 5-minute buckets).
+
+        Returns:
+            Dict key -> {resolution -> {start_ms: Bucket}}
+        """
+        by_key = {}
+        finer = []
+        for resolution, step in RESOLUTIONS.items():
+            buckets = self.load(resolution)
+            for (start_ms, key), bucket in finer:
+                target = (bucket_start(start_ms, step), key)
+                current = buckets.get(target)
+                buckets[target] = Bucket().merge(bucket) if current is None else current.merge(bucket)
+            for (start_ms, key), bucket in buckets.items():
+                by_key.setdefault(key, {}).setdefault(resolution, {})[start_ms] = bucket
+            finer = list(buckets.items())
+        return by_key
+
+    def export(self, directory, nodes, now_ms):
+        """
+        Write the per-node and network history files.
+
+        Args:
+            directory: Output directory (e.g. data/history)
+            nodes: Node records from the status document (id, publicKey)
+            now_ms: Reference time for the series
+
+        Returns:
+            Number of files written
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        by_key = self.series()
+        written = set()
+        generated = now_ms
+
+        for node in nodes:
+            key = (node.get("publicKey") or "").lower()
+            document = {
+                "id": node["id"],
+                "publicKey": node.get("publicKey"),
+                "generated": generated,
+                "series": series_document(by_key.get(key, {}), now_ms),
+            }
+            filename = f"{node['id']}.json"
+            write_atomic(directory / filename, json.dumps(document, separators=(",", ":")).encode())
+            written.add(filename)
+
+        document = {"id": "network", "generated": generated,
+                    "series": series_document(by_key.get(NETWORK_KEY, {}), now_ms)}
+        write_atomic(directory / NETWORK_FILE, json.dumps(document, separators=(",", ":")).encode())
+        written.add(NETWORK_FILE)
+
+        # Nodes that dropped out of the status document no longer get a file
+        for path in directory.glob("node-*.json"):
+            if path.name not in written:
+                path.unlink()
+        logger.info(f"Exported history for {len(written) - 1} nodes to {directory}")
+        return len(written)
@@ -0,0 +1,165 @@
+"""
+Sharded copies of the status document for lazy loading on the website.
+
+repeater-status.json holds every node, so a page that shows only the
+network summary still downloads the whole node list. write_shards()
+splits the document into:
+
+    status/summary.json                  network statistics (no nodes) and
+                                         the name of the current node index
+    status/nodes.<hash>.json             compact index, one row per node:
+                                         {"fields": ["id", "name", ...], "rows": [[...], ...]}
+    status/nodes/<node-id>.<hash>.json   full node record plus its history series
+
+<hash> is a digest of the file's content, so every file except
+summary.json can be cached by browsers and CDNs indefinitely: new
+content always gets a new name. summary.json is the only file that has
+to be revalidated. Files from the previous generation are kept for one
+more run, so a client holding an older summary can still load what it
+points to.
+
+The same layout is served by status_server.py, with versioned names
+(nodes.json?v=<hash>) instead of hashed files.
+
+Usage:
+    stats = write_shards(document, "data/status", history_dir="data/history")
+"""
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+from output_writer import semantic_content, write_atomic
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_FILE = "summary.json"
+NODE_DIR = "nodes"
+HASH_LENGTH = 12  # hex digits of the SHA-256 content hash in file names
+INDEX_FIELDS = ("id", "name", "status", "lastSeen", "latitude", "longitude", "file")
+
+
+def content_hash(data):
+    """Short content hash of bytes, for cache-busting file names."""
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def _encode(document):
+    return json.dumps(document, separators=(",", ":")).encode()
+
+
+def hashed_name(stem, data):
+    """File name for content-addressed data: <stem>.<hash>.json"""
+    return f"{stem}.{content_hash(data)}.json"
+
+
+def _load_history(history_dir, node_id):
+    if history_dir is None:
+        return None
+    try:
+        return json.loads((Path(history_dir) / f"{node_id}.json").read_bytes()).get("series")
+    except FileNotFoundError:
+        return None
+    except (json.JSONDecodeError, OSError) as e:
+        logger.warning(f"Could not read history for {node_id}: {e}")
+        return None
+
+
+def referenced_files(directory):
+    """Relative names of the node index and node files the current summary points to."""
+    directory = Path(directory)
+    try:
+        summary = json.loads((directory / SUMMARY_FILE).read_bytes())
+        index_name = summary["nodeIndex"]
+        index = json.loads((directory / index_name).read_bytes())
+        column = index["fields"].index("file")
+        return {index_name, *(row[column] for row in index["rows"])}
+    except (FileNotFoundError, json.JSONDecodeError, OSError, KeyError, ValueError, TypeError) as e:
+        if not isinstance(e, FileNotFoundError):
+            logger.warning(f"Could not read the previous shard index: {e}")
+        return set()
+
+
+def build_shards(document, history_dir=None, naming=hashed_name):
+    """
+    Split a status document into the summary, node index and node files.
+
+    Args:
+        document: Document from build_status_document()
+        history_dir: Directory of per-node history files to embed
+                     (data/history), or None
+        naming: Function (stem, data) -> name under which data is served;
+                the names are what the summary and index refer to
+
+    Returns:
+        Tuple of (summary dict, dict name -> encoded file, index name)
+    """
+    files = {}
+    rows = []
+    for node in document["nodes"]:
+        data = _encode({"node": node, "history": _load_history(history_dir, node["id"])})
+        name = naming(f"{NODE_DIR}/{node['id']}", data)
+        files[name] = data
+        location = node.get("location") or {}
+        rows.append([node["id"], node["name"], node["status"], node["lastSeen"],
+                     location.get("latitude"), location.get("longitude"), name])
+    index_data = _encode({"fields": list(INDEX_FIELDS), "rows": rows})
+    index_name = naming("nodes", index_data)
+    files[index_name] = index_data
+
+    summary = {k: v for k, v in document.items() if k != "nodes"}
+    summary["nodeIndex"] = index_name
+    return summary, files, index_name
+
+
+def write_shards(document, directory, history_dir=None):
+    """
+    Write the summary, node index and per-node files for a status document.
+
+    Node files are written first and the summary last, so the summary
+    never points at a file that does not exist yet.
+
+    Args:
+        document: Document from build_status_document()
+        directory: Output directory (e.g. data/status)
+        history_dir: Directory of per-node history files to embed
+                     (data/history), or None
+
+    Returns:
+        Dict with the number of node files written (new content only),
+        total bytes a summary + index load costs, and files removed
+    """
+    directory = Path(directory)
+    (directory / NODE_DIR).mkdir(parents=True, exist_ok=True)
+    previous = referenced_files(directory)
+
+    summary, files, index_name = build_shards(document, history_dir)
+    written = 0
+    for name, data in files.items():  # the index comes last
+        path = directory / name
+        if not path.exists():
+            write_atomic(path, data)
+            written += name != index_name
+
+    summary_path = directory / SUMMARY_FILE
+    try:
+        current = json.loads(summary_path.read_bytes())
+    except (FileNotFoundError, json.JSONDecodeError, OSError):
+        current = None
+    summary_data = _encode(summary)
+    if semantic_content(current) != semantic_content(summary):
+        write_atomic(summary_path, summary_data)
+
+    # Keep this generation and the one before it
+    keep = previous | set(files)
+    removed = 0
+    for path in [*directory.glob("nodes.*.json"), *directory.glob(f"{NODE_DIR}/*.json")]:
+        if path.relative_to(directory).as_posix() not in keep:
+            path.unlink()
+            removed += 1
+    return {
+        "nodeFiles": written,
+        "summaryBytes": len(summary_data) + len(files[index_name]),
+        "removed": removed,
+    }
@@ -0,0 +1,290 @@
+"""
+HTTP status service for fetch-repeater-data.py --serve.
+
+The scheduled workflow publishes status as committed files, so the site
+lags the network by a workflow interval at best. In --serve mode the
+daemon keeps the latest status document in memory, and this module
+serves it over HTTP and pushes changes to connected browsers:
+
+    /status.json             the full status document
+    /summary.json            network statistics; nodeIndex names the index
+    /nodes.json?v=<hash>     node index (same layout as data/status, see shards.py)
+    /nodes/<id>.json?v=...   one node's record and history
+    /events                  Server-Sent Events:
+                               summary  the new summary, whenever it changes
+                               node     {"id", "name", "status", "previousStatus", "lastSeen"}
+                                        when a repeater goes online or offline,
+                                        appears or drops out
+
+Every response carries an ETag, so a client that already has the
+current version gets a 304; bodies are gzip-compressed once per update
+for clients that accept it. Index and node URLs carry their content hash
+in ?v=, and a request for the current version may be cached forever.
+Responses allow any origin, so the static site can use a server on
+another host.
+
+Usage:
+    state = StatusState()
+    server = make_server(state, "127.0.0.1", 8080)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state.publish(document)  # after every poll
+"""
+
+import gzip
+import json
+import logging
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from output_writer import semantic_content
+from shards import build_shards, content_hash
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_SECONDS = 15  # comment line sent on idle event streams
+SUBSCRIBER_QUEUE_SIZE = 100  # events buffered per client before it is dropped
+GZIP_MIN_BYTES = 512  # smaller bodies are sent uncompressed
+SSE_RETRY_MS = 5000  # reconnect delay suggested to EventSource clients
+
+
+def _encode(document):
+    return json.dumps(document, separators=(",", ":")).encode()
+
+
+def versioned_name(stem, data):
+    """Name for data in the served layout: <stem>.json?v=<hash>"""
+    return f"{stem}.json?v={content_hash(data)}"
+
+
+class Resource:
+    """One served body with its precomputed gzip copy and ETags."""
+
+    __slots__ = ("body", "gzipped", "version", "etag", "gzip_etag")
+
+    def __init__(self, body):
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=6, mtime=0) if len(body) >= GZIP_MIN_BYTES else None
+        self.version = content_hash(body)
+        self.etag = f'"{self.version}"'
+        self.gzip_etag = f'"{self.version}-gz"'
+
+
+class Subscriber:
+    """Event queue of one /events client."""
+
+    def __init__(self):
+        self.events = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.closed = False
+
+
+class StatusState:
+    """
+    The current status resources and the connected event streams.
+
+    publish() swaps in a new document atomically (readers see either the
+    old or the new set of resources) and queues the change events for
+    every subscriber.
+    """
+
+    def __init__(self, history_dir=None):
+        """
+        Args:
+            history_dir: Directory of per-node history files to include in
+                         node responses (data/history), or None
+        """
+        self.history_dir = history_dir
+        self.lock = threading.Lock()
+        self.resources = {}  # path -> Resource
+        self.summary = None
+        self.nodes = {}  # node id -> {"name", "status", "lastSeen"}
+        self.event_id = 0
+        self.subscribers = set()
+
+    def resource(self, path):
+        with self.lock:
+            return self.resources.get(path)
+
+    def publish(self, document):
+        """
+        Serve a new status document and notify subscribers of what changed.
+
+        Args:
+            document: Document from build_status_document()
+
+        Returns:
+            List of (event name, data) tuples sent to subscribers
+        """
+        summary, files, _ = build_shards(document, self.history_dir, versioned_name)
+        resources = {"/status.json": Resource(_encode(document)),
+                     "/summary.json": Resource(_encode(summary))}
+        for name, data in files.items():
+            resources["/" + name.split("?", 1)[0]] = Resource(data)
+        nodes = {node["id"]: {"name": node["name"], "status": node["status"], "lastSeen": node["lastSeen"]}
+                 for node in document["nodes"]}
+
+        with self.lock:
+            events = []
+            for node_id in sorted(self.nodes.keys() | nodes.keys()):
+                old, new = self.nodes.get(node_id), nodes.get(node_id)
+                old_status = old["status"] if old else None
+                new_status = new["status"] if new else None
+                if old_status != new_status:
+                    node = new or old
+                    events.append(("node", {"id": node_id, "name": node["name"], "status": new_status,
+                                            "previousStatus": old_status, "lastSeen": node["lastSeen"]}))
+            if semantic_content(self.summary) != semantic_content(summary):
+                events.append(("summary", summary))
+            self.resources = resources
+            self.summary = summary
+            self.nodes = nodes
+            for name, data in events:
+                self.event_id += 1
+                self._broadcast(self._format(name, data))
+        if events:
+            logger.info(f"Status server: {len(events)} events to {len(self.subscribers)} subscribers")
+        return events
+
+    def _format(self, name, data):
+        return f"id: {self.event_id}\nevent: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+    def _broadcast(self, message):
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.events.put_nowait(message)
+            except queue.Full:
+                # A client this far behind reconnects and starts from a fresh summary
+                subscriber.closed = True
+                self.subscribers.discard(subscriber)
+
+    def subscribe(self):
+        """Register an event stream; returns (Subscriber, initial summary event or None)."""
+        subscriber = Subscriber()
+        with self.lock:
+            self.subscribers.add(subscriber)
+            initial = self._format("summary", self.summary) if self.summary is not None else None
+        return subscriber, initial
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def close(self):
+        """End every event stream (at shutdown)."""
+        with self.lock:
+            for subscriber in self.subscribers:
+                subscriber.closed = True
+            self.subscribers.clear()
+
+
+class StatusRequestHandler(BaseHTTPRequestHandler):
+    state = None  # StatusState, set by make_server()
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def _common_headers(self):
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Expose-Headers", "ETag")
+
+    def _serve(self, send_body):
+        url = urlsplit(self.path)
+        if url.path == "/events" and send_body:
+            self._events()
+            return
+        resource = self.state.resource(url.path)
+        if resource is None:
+            self._send_json_error(404, "not found", send_body)
+            return
+
+        accepts_gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        use_gzip = accepts_gzip and resource.gzipped is not None
+        etag = resource.gzip_etag if use_gzip else resource.etag
+        requested = parse_qs(url.query).get("v", [None])[-1]
+        if requested == resource.version:
+            cache_control = "public, max-age=31536000, immutable"
+        else:
+            cache_control = "no-cache"
+
+        tags = [tag.strip().removeprefix("W/") for tag in self.headers.get("If-None-Match", "").split(",")]
+        if "*" in tags or resource.etag in tags or resource.gzip_etag in tags:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", cache_control)
+            self.send_header("Vary", "Accept-Encoding")
+            self._common_headers()
+            self.end_headers()
+            return
+
+        body = resource.gzipped if use_gzip else resource.body
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", cache_control)
+        self.send_header("Vary", "Accept-Encoding")
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self._common_headers()
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _send_json_error(self, code, message, send_body=True):
+        body = _encode({"error": message})
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self._common_headers()
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _events(self):
+        subscriber, initial = self.state.subscribe()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self._common_headers()
+            self.end_headers()
+            self.wfile.write(f"retry: {SSE_RETRY_MS}\n\n".encode())
+            if initial:
+                self.wfile.write(initial)
+            self.wfile.flush()
+            while not subscriber.closed:
+                try:
+                    message = subscriber.events.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    message = b": keepalive\n\n"
+                self.wfile.write(message)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.state.unsubscribe(subscriber)
+
+    def log_message(self, format, *args):
+        logger.debug(f"Status server: {self.address_string()} {format % args}")
+
+
+def make_server(state, host="127.0.0.1", port=0):
+    """
+    Create the HTTP server for a StatusState (call serve_forever() to run it).
+
+    Args:
+        state: StatusState to serve
+        host: Interface to listen on
+        port: Port (0 picks a free one; see server.server_port)
+
+    Returns:
+        ThreadingHTTPServer
+    """
+    handler = type("BoundStatusRequestHandler", (StatusRequestHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
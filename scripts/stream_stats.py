@@ -0,0 +1,301 @@
+"""
+Bounded-memory, mergeable statistics for fetch-repeater-data.py.
+
+RunningStats keeps count, mean, variance, min and max in O(1) memory and
+carries a TDigest for approximate quantiles. Both merge exactly the way
+they accumulate, so per-repeater signal statistics from different runs,
+observers or worker processes can be combined without the raw packets.
+"""
+
+import math
+from bisect import bisect_right
+from itertools import accumulate
+from operator import mul
+
+
+class TDigest:
+    """
+    Merging t-digest (Dunning & Ertl) for streaming quantile estimates.
+
+    Values are buffered and periodically merged into at most compression
+    centroids, however many values are added (one per k1 scale slot).
+    Centroids near the tails are kept small, so
+    p10/p90 stay accurate while memory stays bounded. Small inputs keep
+    every value as its own centroid, so their quantiles interpolate
+    between the actual values.
+    """
+
+    __slots__ = ("compression", "centroids", "buffer", "pending", "merged_count",
+                 "min", "max", "buffer_limit")
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.centroids = []  # sorted [mean, weight] pairs
+        self.buffer = []  # unit-weight values not yet merged
+        self.pending = []  # [mean, weight] pairs from merged digests
+        self.merged_count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.buffer_limit = 5 * compression
+
+    @property
+    def count(self):
+        """Total weight added."""
+        return self.merged_count + len(self.buffer) + sum(w for _, w in self.pending)
+
+    def add(self, value):
+        """Add a single value."""
+        buffer = self.buffer
+        buffer.append(value)
+        if len(buffer) >= self.buffer_limit:
+            self._compress()
+
+    def merge(self, other):
+        """Fold another TDigest into this one."""
+        other._compress()
+        if not other.centroids:
+            return
+        self.pending.extend([mean, weight] for mean, weight in other.centroids)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        # Merged centroids wait like buffered values, so folding many small
+        # digests (one per replayed day) costs one compression per batch
+        if len(self.pending) >= self.buffer_limit:
+            self._compress()
+
+    def _compress(self):
+        if not self.buffer and not self.pending:
+            return
+        values = [mean for mean, _ in self.centroids]
+        weights = [weight for _, weight in self.centroids]
+        for mean, weight in self.pending:
+            values.append(mean)
+            weights.append(weight)
+        values.extend(self.buffer)
+        weights.extend([1] * len(self.buffer))
+        self.buffer = []
+        self.pending = []
+
+        order = sorted(range(len(values)), key=values.__getitem__)
+        values = [values[i] for i in order]
+        weights = [weights[i] for i in order]
+        self.min = min(self.min, values[0])
+        self.max = max(self.max, values[-1])
+
+        # Cumulative sums let each centroid be cut out with bisect instead
+        # of walking the sorted values one at a time in Python.
+        cum_weight = [0, *accumulate(weights)]
+        cum_sum = [0.0, *accumulate(map(mul, values, weights))]
+        total = cum_weight[-1]
+        self.merged_count = total
+
+        # k1 scale: centroid edges at q = (sin(pi * k / compression) + 1) / 2,
+        # so centroids shrink towards both tails.
+        half = self.compression / 2
+        ends = []
+        last = 0
+        for k in range(1, self.compression):
+            target = total * (math.sin(math.pi * (k - half) / self.compression) + 1) / 2
+            end = bisect_right(cum_weight, target) - 1
+            if end <= last:
+                # A single value or centroid wider than the slot stands alone
+                end = last + 1
+            if end >= len(values):
+                break
+            ends.append(end)
+            last = end
+        if not ends or ends[-1] != len(values):
+            ends.append(len(values))
+
+        merged = []
+        start = 0
+        for end in ends:
+            weight = cum_weight[end] - cum_weight[start]
+            if end - start == 1:
+                merged.append([values[start], weight])
+            else:
+                merged.append([(cum_sum[end] - cum_sum[start]) / weight, weight])
+            start = end
+        self.centroids = merged
+
+    def quantile(self, q):
+        """
+        Estimate the q-quantile (0 <= q <= 1).
+
+        Returns:
+            Estimated value, or None if nothing has been added
+        """
+        self._compress()
+        centroids = self.centroids
+        if not centroids:
+            return None
+        if len(centroids) == 1:
+            return centroids[0][0]
+        count = self.merged_count
+        target = q * count
+        # Each centroid's mass is centred at cumulative + weight / 2
+        cumulative = 0.0
+        prev_center = None
+        prev_mean = None
+        for mean, weight in centroids:
+            center = cumulative + weight / 2
+            if target <= center:
+                if prev_center is None:
+                    # Between the minimum and the first centroid
+                    if center <= 0.5:
+                        return mean
+                    frac = max(0.0, target - 0.5) / (center - 0.5)
+                    return self.min + frac * (mean - self.min)
+                frac = (target - prev_center) / (center - prev_center)
+                return prev_mean + frac * (mean - prev_mean)
+            prev_center, prev_mean = center, mean
+            cumulative += weight
+        # Between the last centroid and the maximum
+        tail = count - 0.5
+        if tail <= prev_center:
+            return prev_mean
+        frac = min(1.0, (target - prev_center) / (tail - prev_center))
+        return prev_mean + frac * (self.max - prev_mean)
+
+    def to_dict(self):
+        """Serialize to a JSON-compatible dict."""
+        self._compress()
+        return {
+            "compression": self.compression,
+            "centroids": self.centroids,
+            "min": self.min if self.centroids else None,
+            "max": self.max if self.centroids else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a TDigest serialized with to_dict()."""
+        digest = cls(data.get("compression", 100))
+        digest.centroids = [[mean, weight] for mean, weight in data.get("centroids", [])]
+        digest.merged_count = sum(weight for _, weight in digest.centroids)
+        if digest.centroids:
+            digest.min = data["min"]
+            digest.max = data["max"]
+        return digest
+
+
+class RunningStats:
+    """
+    Streaming count / mean / variance / min / max with quantile sketch.
+
+    Keeps a running sum and sum of squares, so the mean matches
+    sum(values) / count and merging is plain addition. Signal readings
+    (dBm, dB) are small enough that the sum-of-squares variance does not
+    lose meaningful precision.
+    """
+
+    __slots__ = ("count", "total", "sumsq", "digest")
+
+    def __init__(self, compression=100):
+        self.count = 0
+        self.total = 0.0
+        self.sumsq = 0.0
+        self.digest = TDigest(compression)
+
+    def add(self, value):
+        """Add one observation."""
+        self.count += 1
+        self.total += value
+        self.sumsq += value * value
+        # Inlined TDigest.add(); this runs once per packet per repeater
+        digest = self.digest
+        buffer = digest.buffer
+        buffer.append(value)
+        if len(buffer) >= digest.buffer_limit:
+            digest._compress()
+
+    def merge(self, other):
+        """Fold another RunningStats into this one."""
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.sumsq += other.sumsq
+        self.digest.merge(other.digest)
+
+    @property
+    def min(self):
+        """Smallest observation, or None if empty."""
+        if not self.count:
+            return None
+        buffer = self.digest.buffer
+        return min(self.digest.min, min(buffer)) if buffer else self.digest.min
+
+    @property
+    def max(self):
+        """Largest observation, or None if empty."""
+        if not self.count:
+            return None
+        buffer = self.digest.buffer
+        return max(self.digest.max, max(buffer)) if buffer else self.digest.max
+
+    @property
+    def mean(self):
+        """Arithmetic mean, or None if empty."""
+        return self.total / self.count if self.count else None
+
+    @property
+    def variance(self):
+        """Sample variance, or None with fewer than two observations."""
+        if self.count < 2:
+            return None
+        return max(0.0, (self.sumsq - self.total * self.total / self.count) / (self.count - 1))
+
+    @property
+    def stddev(self):
+        """Sample standard deviation, or None with fewer than two observations."""
+        variance = self.variance
+        return math.sqrt(variance) if variance is not None else None
+
+    def quantile(self, q):
+        """Approximate q-quantile from the digest, or None if empty."""
+        return self.digest.quantile(q)
+
+    def summary(self, digits=1):
+        """
+        Rounded summary for publishing.
+
+        Returns:
+            Dict with count, mean, stddev, min, max, p10, p50 and p90, or
+            None if empty
+        """
+        if not self.count:
+            return None
+
+        def rnd(value):
+            return round(value, digits) if value is not None else None
+
+        return {
+            "count": self.count,
+            "mean": rnd(self.mean),
+            "stddev": rnd(self.stddev),
+            "min": rnd(self.min),
+            "max": rnd(self.max),
+            "p10": rnd(self.quantile(0.10)),
+            "p50": rnd(self.quantile(0.50)),
+            "p90": rnd(self.quantile(0.90)),
+        }
+
+    def to_dict(self):
+        """Serialize to a JSON-compatible dict."""
+        return {
+            "count": self.count,
+            "total": self.total,
+            "sumsq": self.sumsq,
+            "digest": self.digest.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a RunningStats serialized with to_dict()."""
+        stats = cls()
+        stats.count = data["count"]
+        stats.total = data["total"]
+        stats.sumsq = data["sumsq"]
+        stats.digest = TDigest.from_dict(data["digest"])
+        return stats
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the letsmesh.net packet API.
+
+Serves synthetic packets (see synthetic_packets.py), or an archived API
+response, at /api/packets/filtered with the query parameters
+fetch-repeater-data.py sends: observer, region, limit (default 500, as
+upstream) and the before cursor. Packets come back newest first. With
+--live-interval the stub keeps hearing new packets from the same nodes,
+so --daemon and --serve runs see repeaters come and go.
+
+Like the real endpoint behind Cloudflare, responses carry an ETag and
+Last-Modified (a matching If-None-Match / If-Modified-Since gets a 304),
+are gzip-compressed when the client accepts it, and set a cf_clearance
+cookie for clients that do not send one. --challenge-rate and
+--error-rate answer that share of requests with a Cloudflare challenge
+page (503) or a 500/502/504 instead. Request counters are served as JSON
+at /__stub/stats.
+
+Point the fetcher at it with LETSMESH_API_URL or --api-url:
+
+    python scripts/stub-letsmesh-server.py --port 8787 --live-interval 10
+    python scripts/fetch-repeater-data.py --no-store --serve 8080 --interval 15 \\
+        --api-url http://127.0.0.1:8787/api/packets/filtered
+"""
+
+import argparse
+import gzip
+import hashlib
+import itertools
+import json
+import logging
+import random
+import secrets
+import sys
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from synthetic_packets import generate_packets
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+API_PATH = "/api/packets/filtered"
+STATS_PATH = "/__stub/stats"
+DEFAULT_LIMIT = 500
+CLEARANCE_COOKIE = "cf_clearance"
+CLEARANCE_MAX_AGE = 1800  # seconds
+CHALLENGE_PAGE = (b"<!DOCTYPE html><html><head><title>Just a moment...</title></head>"
+                  b"<body>Checking your browser before accessing the site. Cloudflare</body></html>")
+ERROR_STATUSES = (500, 502, 504)
+
+
+class StubApi:
+    """Packets held newest first, plus the live packet generator."""
+
+    def __init__(self, packets=(), repeaters=10, seed=0, challenge_rate=0.0, error_rate=0.0):
+        self.lock = threading.Lock()
+        self.packets = []
+        self.modified = 0.0  # epoch seconds of the last add(), sent as Last-Modified
+        self.repeaters = repeaters
+        self.seed = seed
+        self.batches = itertools.count(seed + 1)
+        self.challenge_rate = challenge_rate
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.stats = Counter()
+        self.add(packets)
+        self.ids = itertools.count(len(self.packets))  # synthetic ids run 0..count-1 per batch
+
+    def add(self, packets):
+        with self.lock:
+            self.packets = sorted(self.packets + list(packets),
+                                  key=lambda p: p.get("heard_at") or "", reverse=True)
+            self.modified = float(int(datetime.now(timezone.utc).timestamp()))
+
+    def fault(self):
+        """Status code of a simulated failure for this request, or None."""
+        with self.lock:
+            draw = self.rng.random()
+            if draw < self.challenge_rate:
+                return 503
+            if draw < self.challenge_rate + self.error_rate:
+                return self.rng.choice(ERROR_STATUSES)
+        return None
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def hear(self, count, seconds):
+        """Add count packets from the stub's nodes heard over the last seconds."""
+        packets, _ = generate_packets(count, self.repeaters, days=seconds / 86_400,
+                                      seed=next(self.batches), node_seed=self.seed,
+                                      now=datetime.now(timezone.utc))
+        for packet in packets:
+            packet["id"] = next(self.ids)
+        self.add(packets)
+
+    def page(self, limit=DEFAULT_LIMIT, before=None):
+        """Up to limit packets, newest first, heard before the cursor if given."""
+        with self.lock:
+            packets = self.packets
+            if before:
+                packets = [p for p in packets if (p.get("heard_at") or "") < before]
+            return packets[:limit]
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    api = None  # StubApi, set by make_server()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == STATS_PATH:
+            with self.api.lock:
+                stats = dict(self.api.stats)
+            self.send_body(200, json.dumps(stats).encode(), "application/json")
+            return
+        if url.path != API_PATH:
+            self.send_error(404)
+            return
+        self.api.count("requests")
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            limit = int(query.get("limit", DEFAULT_LIMIT))
+        except ValueError:
+            self.send_error(400, "limit must be an integer")
+            return
+
+        status = self.api.fault()
+        if status == 503:
+            self.api.count("challenges")
+            self.send_body(503, CHALLENGE_PAGE, "text/html; charset=UTF-8")
+            return
+        if status is not None:
+            self.api.count("errors")
+            self.send_error(status)
+            return
+
+        with self.api.lock:
+            modified = self.api.modified
+        body = json.dumps(self.api.page(limit, query.get("before"))).encode()
+        etag = f'"{hashlib.sha256(body).hexdigest()[:20]}"'
+        headers = {"ETag": etag, "Last-Modified": formatdate(modified, usegmt=True)}
+        cookies = SimpleCookie(self.headers.get("Cookie") or "")
+        if CLEARANCE_COOKIE not in cookies:
+            self.api.count("without_clearance")
+            headers["Set-Cookie"] = (f"{CLEARANCE_COOKIE}={secrets.token_hex(16)}; Path=/; "
+                                     f"Max-Age={CLEARANCE_MAX_AGE}; HttpOnly")
+        if self.not_modified(etag, modified):
+            self.api.count("not_modified")
+            self.send_body(304, b"", None, headers)
+            return
+        self.send_body(200, body, "application/json", headers)
+
+    def not_modified(self, etag, modified):
+        """Evaluate If-None-Match (which wins when present) and If-Modified-Since."""
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*"
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= modified
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def send_body(self, status, body, content_type, headers=None):
+        """Send a response, gzip-compressed when the client accepts it."""
+        if body and "gzip" in (self.headers.get("Accept-Encoding") or ""):
+            body = gzip.compress(body, compresslevel=6)
+            headers = dict(headers or {}, **{"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.api.count("bytes_sent", len(body))
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def make_server(api, host="127.0.0.1", port=0):
+    """Return a ThreadingHTTPServer for api (port 0 picks a free port)."""
+    handler = type("BoundStubRequestHandler", (StubRequestHandler,), {"api": api})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def load_packets(path):
+    """Packets from an archived API response (.json or .json.gz)."""
+    opener = gzip.open if Path(path).suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic packets like the letsmesh.net API")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8787, help="Port (default: %(default)s)")
+    parser.add_argument("--input", type=Path, help="Serve this API dump instead of synthetic packets")
+    parser.add_argument("--packets", type=int, default=20000, help="Synthetic packets to start with")
+    parser.add_argument("--repeaters", type=int, default=30, help="Synthetic repeaters")
+    parser.add_argument("--days", type=float, default=7, help="Days the starting packets span")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--live-interval", type=float, default=0,
+                        help="Add new packets every this many seconds (0: serve a fixed set)")
+    parser.add_argument("--live-packets", type=int, default=50, help="Packets added per live interval")
+    parser.add_argument("--challenge-rate", type=float, default=0.0,
+                        help="Fraction of requests answered with a Cloudflare challenge page (503)")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of requests answered with a 500, 502 or 504")
+    args = parser.parse_args()
+
+    faults = {"challenge_rate": args.challenge_rate, "error_rate": args.error_rate}
+    if args.input:
+        api = StubApi(load_packets(args.input), seed=args.seed, **faults)
+    else:
+        packets, _ = generate_packets(args.packets, args.repeaters, days=args.days, seed=args.seed,
+                                      node_seed=args.seed)
+        api = StubApi(packets, args.repeaters, args.seed, **faults)
+    server = make_server(api, args.host, args.port)
+    logger.info(f"Serving {len(api.packets)} packets at http://{args.host}:{server.server_port}{API_PATH}")
+
+    stop = threading.Event()
+    if args.live_interval > 0 and not args.input:
+        def live():
+            while not stop.wait(args.live_interval):
+                api.hear(args.live_packets, args.live_interval)
+                logger.info(f"Heard {args.live_packets} new packets ({len(api.packets)} total)")
+        threading.Thread(target=live, daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+    server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Synthetic MeshCore packets shaped like letsmesh.net API responses.
+
+Used by benchmark-pipeline.py, and on its own to write test dumps that
+fetch-repeater-data.py --input can read.
+
+The mix follows what a regional observer hears: repeater and companion
+Adverts, TextMessage/GroupText traffic (some on the excluded channel
+hash 81), acks and other control packets, multi-hop paths through the
+repeaters, SNR/RSSI readings (occasionally missing) and heard_at times
+spread over the requested number of days. Messages are re-heard over
+different paths, so hashes repeat the way they do in real captures.
+
+Usage:
+    python scripts/synthetic_packets.py --packets 100000 --repeaters 100 --output dump.json.gz
+"""
+
+import argparse
+import gzip
+import json
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from timestamps import format_heard_at
+
+PAYLOAD_MIX = (  # (payload_type, weight)
+    ("Advert", 20),
+    ("TextMessage", 15),
+    ("GroupText", 35),
+    ("Ack", 15),
+    ("Path", 5),
+    ("Request", 5),
+    ("Response", 5),
+)
+REPEATER_ADVERT_SHARE = 0.4  # share of Adverts sent by repeaters (rest are companions)
+CHANNEL_HASHES = (81, 81, 17, 42, 203)  # GroupText channels; 81 is excluded by the pipeline
+MAX_HOPS = 6
+REHEARD_SHARE = 0.3  # share of messages that repeat an earlier hash over another path
+BASE_LAT, BASE_LON = 39.96, -82.93  # Bexley, OH
+
+
+def make_nodes(rng, count, role):
+    """Return count synthetic nodes as dicts with key, name and location."""
+    nodes = []
+    for i in range(count):
+        nodes.append({
+            "public_key": f"{rng.getrandbits(256):064x}",
+            "name": f"{role} {i:04d}",
+            "lat": round(BASE_LAT + rng.uniform(-0.5, 0.5), 5),
+            "lon": round(BASE_LON + rng.uniform(-0.5, 0.5), 5),
+        })
+    return nodes
+
+
+def make_path(rng, repeaters):
+    """Return a path through 0..MAX_HOPS random repeaters, in one of the API's string forms."""
+    hops = [rng.choice(repeaters)["public_key"][:2] for _ in range(rng.randint(0, MAX_HOPS))]
+    if hops and rng.random() < 0.1:
+        return ",".join(hops)
+    return "".join(hops)
+
+
+def generate_packets(count, repeater_count, companion_count=None, days=35, seed=0, now=None,
+                     node_seed=None):
+    """
+    Generate synthetic API packets.
+
+    Args:
+        count: Number of packets
+        repeater_count: Number of distinct repeaters
+        companion_count: Number of distinct companions (default 3 per repeater, min 20)
+        days: heard_at times are spread uniformly over this many days before now
+        seed: Random seed; the same arguments give the same packets
+        now: Newest possible heard_at (default: current time)
+        node_seed: Separate seed for the repeaters and companions, so
+                   batches with different seeds come from the same nodes
+                   (default: nodes and packets both follow seed)
+
+    Returns:
+        Tuple of (packets, repeater_keys)
+    """
+    rng = random.Random(seed)
+    node_rng = rng if node_seed is None else random.Random(node_seed)
+    now = now or datetime.now(timezone.utc)
+    span_ms = int(days * 86_400_000)
+    repeaters = make_nodes(node_rng, repeater_count, "Repeater")
+    companions = make_nodes(node_rng, companion_count or max(20, 3 * repeater_count), "Companion")
+    payload_types = [name for name, _ in PAYLOAD_MIX]
+    weights = [weight for _, weight in PAYLOAD_MIX]
+    recent_hashes = []
+
+    packets = []
+    for i in range(count):
+        payload_type = rng.choices(payload_types, weights)[0]
+        heard = now - timedelta(milliseconds=rng.randrange(span_ms))
+        packet = {
+            "id": i,
+            "hash": f"{rng.getrandbits(32):08x}",
+            "payload_type": payload_type,
+            "heard_at": format_heard_at(heard),
+            "path": make_path(rng, repeaters),
+            "snr": round(rng.gauss(5, 4), 2) if rng.random() > 0.05 else None,
+            "rssi": max(-125, min(-20, int(rng.gauss(-95, 12)))) if rng.random() > 0.05 else None,
+            "decoded_payload": None,
+        }
+        if payload_type == "Advert":
+            is_repeater = rng.random() < REPEATER_ADVERT_SHARE
+            node = rng.choice(repeaters if is_repeater else companions)
+            packet["node_name"] = node["name"]
+            packet["decoded_payload"] = {
+                "mode": "Repeater" if is_repeater else "Companion",
+                "public_key": node["public_key"],
+                "name": node["name"],
+                "lat": node["lat"],
+                "lon": node["lon"],
+            }
+        elif payload_type in ("TextMessage", "GroupText"):
+            if recent_hashes and rng.random() < REHEARD_SHARE:
+                packet["hash"] = rng.choice(recent_hashes)
+            else:
+                recent_hashes.append(packet["hash"])
+                if len(recent_hashes) > 1000:
+                    recent_hashes.pop(0)
+            if payload_type == "GroupText":
+                packet["decoded_payload"] = {"channel_hash": rng.choice(CHANNEL_HASHES)}
+        packets.append(packet)
+    return packets, {r["public_key"] for r in repeaters}
+
+
+def write_packets(path, packets):
+    """Write packets as a JSON array, gzip-compressed if path ends in .gz."""
+    path = Path(path)
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "wt", encoding="utf-8") as f:
+        json.dump(packets, f, separators=(",", ":"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic MeshCore API packets")
+    parser.add_argument("--packets", type=int, default=5000, help="Number of packets")
+    parser.add_argument("--repeaters", type=int, default=10, help="Number of repeaters")
+    parser.add_argument("--companions", type=int, default=None, help="Number of companions")
+    parser.add_argument("--days", type=float, default=35, help="Days of heard_at spread")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--output", type=Path, required=True, help="Output .json or .json.gz")
+    args = parser.parse_args()
+
+    packets, _ = generate_packets(args.packets, args.repeaters, args.companions, args.days, args.seed)
+    write_packets(args.output, packets)
+    print(f"Wrote {len(packets)} packets to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
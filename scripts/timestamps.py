@@ -0,0 +1,79 @@
+"""
+heard_at timestamp handling for fetch-repeater-data.py.
+
+The API reports heard_at as "YYYY-MM-DDTHH:MM:SS.mmmZ". Packets are
+parsed once at ingest into integer milliseconds since the Unix epoch, so
+every window and cutoff check afterwards is an integer compare that does
+not depend on the string format or precision the API happened to use.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_NAIVE_EPOCH = datetime(1970, 1, 1)
+_ONE_MS = timedelta(milliseconds=1)
+
+
+def parse_heard_at_ms(value):
+    """
+    Parse a heard_at timestamp into epoch milliseconds.
+
+    The API's fixed "YYYY-MM-DDTHH:MM:SS.mmmZ" shape skips the offset
+    handling: the C fromisoformat() parses it as a naive UTC time, which
+    is faster than slicing out the fields in Python. Anything else goes
+    through the general path; a timestamp without an offset is taken to
+    be UTC.
+
+    Args:
+        value: heard_at string (or None)
+
+    Returns:
+        Integer milliseconds since the epoch, or None if missing/invalid
+    """
+    if not value:
+        return None
+    try:
+        if len(value) == 24 and value[23] == "Z":
+            return (datetime.fromisoformat(value[:23]) - _NAIVE_EPOCH) // _ONE_MS
+        return datetime_to_ms(datetime.fromisoformat(value.replace("Z", "+00:00")))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def datetime_to_ms(dt):
+    """
+    Convert a datetime to epoch milliseconds.
+
+    Args:
+        dt: datetime; naive values are taken to be UTC
+
+    Returns:
+        Integer milliseconds since the epoch
+    """
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - EPOCH) // _ONE_MS
+
+
+def ms_to_datetime(ms):
+    """Convert epoch milliseconds to an aware UTC datetime."""
+    return EPOCH + timedelta(milliseconds=ms)
+
+
+def format_heard_at(dt):
+    """
+    Format an aware datetime the way the API formats heard_at.
+
+    Args:
+        dt: Timezone-aware datetime
+
+    Returns:
+        String like "2026-03-13T17:00:49.874Z"
+    """
+    dt = dt.astimezone(timezone.utc)
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+
+
+def format_epoch_ms(ms):
+    """Format epoch milliseconds the way the API formats heard_at."""
+    return format_heard_at(ms_to_datetime(ms))
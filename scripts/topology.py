@@ -0,0 +1,233 @@
+"""
+Mesh topology graph for fetch-repeater-data.py.
+
+Each packet path lists the repeaters that forwarded it, in order, by the
+first byte of their public key. Consecutive hops are directed neighbor
+links (a0 -> d3 means d3 heard a0 directly), and the last hop was heard
+by the observer, whose SNR/RSSI reading belongs to that final link.
+TopologyGraph keeps one edge per (from, to) hop pair with its
+observation count, first/last seen time and, for links into the
+observer, signal sums. Everything merges by addition, so the graph is
+updated per batch of new packets and saved between runs instead of
+being rebuilt from the packet history.
+
+The exported topology.json is a compact edge list for the site's map:
+
+    {"fields": ["from", "to", "count", "lastSeen", "snr", "rssi"],
+     "edges": [["a0", "d3", 12, 1792000000000, null, null], ...],
+     "nodes": {"a0": [{"id": "node-a0...", "name": ..., "lat": ..., "lon": ...}]}}
+
+Hop ids are 1-byte prefixes; "nodes" lists the repeaters that carry each
+prefix (several when prefixes collide).
+
+Usage:
+    graph = TopologyGraph.load("data/topology-state.json")
+    graph.add(hops, heard_ms, snr, rssi)
+    graph.prune(cutoff_ms)
+    graph.save("data/topology-state.json")
+    document = graph.export(nodes_by_prefix)
+"""
+
+import json
+import logging
+from pathlib import Path
+
+from output_writer import write_atomic
+
+logger = logging.getLogger(__name__)
+
+OBSERVER = "observer"  # pseudo-hop for the observer that heard the packet
+EXPORT_FIELDS = ("from", "to", "count", "lastSeen", "snr", "rssi")
+
+
+def _to_float(value):
+    """Convert a numeric-like API value to float, or None if missing/invalid."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+class Edge:
+    """Observations of one directed link."""
+
+    __slots__ = ("count", "first_ms", "last_ms", "snr_n", "snr_sum", "rssi_n", "rssi_sum")
+
+    def __init__(self):
+        self.count = 0
+        self.first_ms = None
+        self.last_ms = None
+        self.snr_n = 0
+        self.snr_sum = 0.0
+        self.rssi_n = 0
+        self.rssi_sum = 0.0
+
+    def observe(self, heard_ms, snr=None, rssi=None):
+        self.count += 1
+        if self.first_ms is None or heard_ms < self.first_ms:
+            self.first_ms = heard_ms
+        if self.last_ms is None or heard_ms > self.last_ms:
+            self.last_ms = heard_ms
+        if snr is not None:
+            self.snr_n += 1
+            self.snr_sum += snr
+        if rssi is not None:
+            self.rssi_n += 1
+            self.rssi_sum += rssi
+
+    def merge(self, other):
+        """Fold another Edge for the same link into this one."""
+        self.count += other.count
+        if other.first_ms is not None and (self.first_ms is None or other.first_ms < self.first_ms):
+            self.first_ms = other.first_ms
+        if other.last_ms is not None and (self.last_ms is None or other.last_ms > self.last_ms):
+            self.last_ms = other.last_ms
+        self.snr_n += other.snr_n
+        self.snr_sum += other.snr_sum
+        self.rssi_n += other.rssi_n
+        self.rssi_sum += other.rssi_sum
+
+    def to_row(self):
+        return [self.count, self.first_ms, self.last_ms,
+                self.snr_n, round(self.snr_sum, 3), self.rssi_n, round(self.rssi_sum, 3)]
+
+    @classmethod
+    def from_row(cls, row):
+        edge = cls()
+        (edge.count, edge.first_ms, edge.last_ms,
+         edge.snr_n, edge.snr_sum, edge.rssi_n, edge.rssi_sum) = row
+        return edge
+
+
+class TopologyGraph:
+    """
+    Directed hop graph, updated incrementally.
+
+    through_ms is the newest packet store insertion time (inserted_ms)
+    already added; callers feed only packets stored after it, so
+    re-analyzing the same window does not count a packet twice and a
+    packet stored late is still added. Packets that do not come from the
+    store are cut on their heard time instead.
+    """
+
+    def __init__(self):
+        self.edges = {}  # (from_hop, to_hop) -> Edge
+        self.through_ms = None
+
+    def __len__(self):
+        return len(self.edges)
+
+    def add(self, hops, heard_ms, snr=None, rssi=None, inserted_ms=None):
+        """
+        Add one packet's path.
+
+        Args:
+            hops: Hop prefixes in forwarding order
+            heard_ms: Packet heard time (epoch ms)
+            snr: SNR at the observer (applies to the last link)
+            rssi: RSSI at the observer (applies to the last link)
+            inserted_ms: Packet store insertion time (epoch ms), if
+                         different from heard_ms
+        """
+        mark = heard_ms if inserted_ms is None else inserted_ms
+        if self.through_ms is None or mark > self.through_ms:
+            self.through_ms = mark
+        if not hops:
+            return
+        edges = self.edges
+        for link in zip(hops, hops[1:]):
+            if link[0] == link[1]:
+                continue
+            edge = edges.get(link)
+            if edge is None:
+                edge = edges[link] = Edge()
+            edge.observe(heard_ms)
+        link = (hops[-1], OBSERVER)
+        edge = edges.get(link)
+        if edge is None:
+            edge = edges[link] = Edge()
+        edge.observe(heard_ms, _to_float(snr), _to_float(rssi))
+
+    def merge(self, other):
+        """
+        Fold a graph built from other packets (e.g. by another worker) into this one.
+
+        Args:
+            other: TopologyGraph whose packets were not added here
+        """
+        if other.through_ms is not None and (self.through_ms is None or other.through_ms > self.through_ms):
+            self.through_ms = other.through_ms
+        edges = self.edges
+        for link, other_edge in other.edges.items():
+            edge = edges.get(link)
+            if edge is None:
+                edge = edges[link] = Edge()
+            edge.merge(other_edge)
+
+    def prune(self, before_ms):
+        """Drop links not seen since before_ms; returns the number dropped."""
+        before = len(self.edges)
+        self.edges = {link: e for link, e in self.edges.items() if e.last_ms >= before_ms}
+        return before - len(self.edges)
+
+    def to_dict(self):
+        return {
+            "through_ms": self.through_ms,
+            "edges": [[frm, to, *edge.to_row()] for (frm, to), edge in sorted(self.edges.items())],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        graph = cls()
+        graph.through_ms = data.get("through_ms")
+        for row in data.get("edges", []):
+            graph.edges[(row[0], row[1])] = Edge.from_row(row[2:])
+        return graph
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved graph, or return an empty one if the file is missing or unreadable."""
+        path = Path(path)
+        if not path.exists():
+            return cls()
+        try:
+            return cls.from_dict(json.loads(path.read_text()))
+        except (json.JSONDecodeError, OSError, ValueError, TypeError, IndexError) as e:
+            logger.warning(f"Could not load topology state, starting over: {e}")
+            return cls()
+
+    def save(self, path):
+        """Write the graph state (via a temporary file)."""
+        write_atomic(path, json.dumps(self.to_dict(), separators=(",", ":")).encode())
+
+    def export(self, nodes_by_prefix, generated=None):
+        """
+        Build the compact edge list for the map.
+
+        Args:
+            nodes_by_prefix: Dict hop prefix -> list of node summaries
+                             (id, name, lat, lon) for current repeaters
+            generated: Timestamp string for the document
+
+        Returns:
+            topology.json document
+        """
+        edges = []
+        hops = set()
+        for (frm, to), edge in sorted(self.edges.items(), key=lambda item: -item[1].count):
+            edges.append([
+                frm, to, edge.count, edge.last_ms,
+                round(edge.snr_sum / edge.snr_n, 1) if edge.snr_n else None,
+                round(edge.rssi_sum / edge.rssi_n, 1) if edge.rssi_n else None,
+            ])
+            hops.update((frm, to))
+        hops.discard(OBSERVER)
+        return {
+            "generated": generated,
+            "observer": OBSERVER,
+            "fields": list(EXPORT_FIELDS),
+            "edges": edges,
+            "nodes": {hop: nodes_by_prefix.get(hop, []) for hop in sorted(hops)},
+        }
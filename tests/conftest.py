@@ -0,0 +1,65 @@
+"""
+Shared fixtures for the pipeline tests.
+
+The scripts are not a package: helper modules import each other by name
+from scripts/, and the dash-named executables are loaded from their
+files, as load_pipeline() in archive-packets.py does.
+"""
+
+import importlib.util
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent / "scripts"
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+
+def load_script(filename, name):
+    """Import a script from scripts/ under a module name."""
+    spec = importlib.util.spec_from_file_location(name, SCRIPT_DIR / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def pipeline():
+    """fetch-repeater-data.py as a module."""
+    return load_script("fetch-repeater-data.py", "fetch_repeater_data")
+
+
+@pytest.fixture(scope="session")
+def stub_server():
+    """stub-letsmesh-server.py as a module."""
+    return load_script("stub-letsmesh-server.py", "stub_letsmesh_server")
+
+
+@pytest.fixture
+def stub(stub_server):
+    """
+    A StubApi with no packets, served on an ephemeral port.
+
+    Yields:
+        Tuple of (StubApi, API endpoint URL)
+    """
+    api = stub_server.StubApi()
+    server = stub_server.make_server(api)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    yield api, f"http://{host}:{port}{stub_server.API_PATH}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fetch_cache(pipeline, tmp_path, monkeypatch):
+    """A fresh FetchCache installed as the pipeline's FETCH_CACHE, with no open sessions."""
+    cache = pipeline.FetchCache(tmp_path / "fetch-cache")
+    monkeypatch.setattr(pipeline, "FETCH_CACHE", cache)
+    monkeypatch.setattr(pipeline, "_SCRAPERS", {})
+    return cache
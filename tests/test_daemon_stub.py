@@ -0,0 +1,77 @@
+"""StatusDaemon polls against stub-letsmesh-server.py, feeding a --serve StatusState."""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from status_server import StatusState
+from synthetic_packets import generate_packets
+from timestamps import format_heard_at
+
+pytest.importorskip("cloudscraper")
+
+NOW = datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+
+
+def drain(subscriber):
+    """(event name, data) of every message queued for a subscriber."""
+    events = []
+    while not subscriber.events.empty():
+        lines = subscriber.events.get_nowait().decode().splitlines()
+        fields = dict(line.split(": ", 1) for line in lines if line)
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def daemon(pipeline, stub, fetch_cache, tmp_path, monkeypatch):
+    """A StatusDaemon without a packet store, polling the stub and publishing to a StatusState."""
+    api, endpoint = stub
+    packets, _ = generate_packets(2000, 8, days=1, seed=1, now=NOW)
+    api.add(packets)
+    monkeypatch.setattr(pipeline, "API_ENDPOINT", endpoint)
+    monkeypatch.setattr(pipeline, "OUTPUT_FILE", tmp_path / "repeater-status.json")
+    monkeypatch.setattr(pipeline, "BACKUP_FILE", tmp_path / "repeater-status.json.bak")
+    monkeypatch.setattr(pipeline, "SHARD_DIR", tmp_path / "status")
+    state = StatusState()
+    return pipeline.StatusDaemon(on_status=state.publish), state
+
+
+def test_daemon_cycle_conditional_request_and_events(pipeline, stub, fetch_cache, daemon):
+    api, _ = stub
+    daemon, state = daemon
+    subscriber, initial = state.subscribe()
+    assert initial is None
+
+    # First poll: every repeater appears, so one node event each plus the summary
+    assert daemon.poll(NOW + timedelta(hours=12))
+    events = drain(subscriber)
+    nodes = [data for name, data in events if name == "node"]
+    summary = [data for name, data in events if name == "summary"]
+    assert len(summary) == 1
+    assert len(nodes) == summary[0]["totalNodes"] > 0
+    assert len({node["id"] for node in nodes}) == len(nodes)
+    assert all(node["previousStatus"] is None and node["status"] == "offline" for node in nodes)
+
+    # Repeating the request with only If-None-Match gets a 304, and nothing is republished
+    (url,) = fetch_cache.entries
+    fetch_cache.entries[url]["lastModified"] = None
+    assert set(pipeline.conditional_headers(url)) == {"If-None-Match"}
+    assert daemon.poll(NOW + timedelta(hours=12))
+    assert api.stats["not_modified"] == 1
+    assert drain(subscriber) == []
+
+    # A fresh advert brings one repeater online: one node event plus the new summary
+    advert = next(p for p in api.packets
+                  if p["payload_type"] == "Advert" and p["decoded_payload"]["mode"] == "Repeater")
+    api.add([dict(advert, id=len(api.packets), hash="feedbeef", path="",
+                  heard_at=format_heard_at(NOW + timedelta(hours=12, minutes=-1)))])
+    assert daemon.poll(NOW + timedelta(hours=12))
+    events = drain(subscriber)
+    assert [name for name, _ in events] == ["node", "summary"]
+    node, summary = events[0][1], events[1][1]
+    assert node["id"] == f"node-{advert['decoded_payload']['public_key'][:12]}"
+    assert (node["previousStatus"], node["status"]) == ("offline", "online")
+    assert summary["onlineNodes"] == 1
+    assert api.stats["requests"] == 3
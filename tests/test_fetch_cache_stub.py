@@ -0,0 +1,132 @@
+"""fetch_api_page and stream_api_page through a FetchCache, against stub-letsmesh-server.py."""
+
+import gzip
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import pytest
+
+import fetch_cache as fetch_cache_module
+from synthetic_packets import generate_packets
+
+pytest.importorskip("cloudscraper")
+
+NOW = datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+
+
+def fetch_page(pipeline, url):
+    return pipeline.fetch_api_page(url)
+
+
+def stream_page(pipeline, url):
+    try:
+        return list(pipeline.stream_api_page(url))
+    except pipeline.FetchError:
+        return None
+
+
+@pytest.fixture(params=[fetch_page, stream_page], ids=["fetch", "stream"])
+def get_page(request, pipeline):
+    """Fetch one page the way fetch_api_page or stream_api_page does; None on failure."""
+    return lambda url: request.param(pipeline, url)
+
+
+@pytest.fixture
+def url(stub, monkeypatch):
+    """Page URL on a stub serving synthetic packets, with retry backoff skipped."""
+    api, endpoint = stub
+    packets, _ = generate_packets(300, 6, days=1, seed=2, now=NOW)
+    api.add(packets)
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+    return f"{endpoint}?observer=abc&region=CMH&limit=500"
+
+
+def script_faults(api, monkeypatch, statuses):
+    """Answer the next requests with these statuses (503: challenge page), then normally."""
+    faults = iter(statuses)
+    monkeypatch.setattr(api, "fault", lambda: next(faults, None))
+
+
+def cached_file(cache, url):
+    return gzip.decompress(cache._body_path(url).read_bytes())
+
+
+def test_not_modified_is_served_from_cached_body(stub, fetch_cache, url, get_page):
+    api, _ = stub
+    first = get_page(url)
+    assert len(first) == 300
+
+    assert get_page(url) == first
+    assert api.stats["not_modified"] == 1
+    assert api.stats["requests"] == 2
+
+
+def test_challenge_forgets_session_and_retries(stub, fetch_cache, url, get_page, monkeypatch):
+    api, _ = stub
+    host = urlsplit(url).netloc
+    first = get_page(url)
+    assert host in fetch_cache.sessions
+
+    forgotten = []
+    forget_session = fetch_cache.forget_session
+    monkeypatch.setattr(fetch_cache, "forget_session",
+                        lambda host: (forgotten.append(host), forget_session(host))[1])
+    script_faults(api, monkeypatch, [503])
+    assert get_page(url) == first
+    assert forgotten == [host]
+    assert api.stats["challenges"] == 1
+    assert api.stats["requests"] == 3
+    # The retry started a new session, without the clearance cookie of the first
+    assert api.stats["without_clearance"] == 2
+
+
+def test_server_errors_are_retried_then_fail_keeping_cached_body(pipeline, stub, fetch_cache, url, get_page,
+                                                                  monkeypatch):
+    api, _ = stub
+    get_page(url)
+    body = cached_file(fetch_cache, url)
+    digest = fetch_cache.entries[url]["digest"]
+
+    api.add(generate_packets(10, 6, days=0.1, seed=3, now=NOW)[0])
+    script_faults(api, monkeypatch, [500, 502, 504])
+    assert get_page(url) is None
+    assert api.stats["errors"] == pipeline.API_RETRIES
+    assert fetch_cache.cached_body(url) == body
+    assert fetch_cache.entries[url]["digest"] == digest
+    assert not list(fetch_cache._body_path(url).parent.glob("*.tmp"))
+
+
+def test_interrupted_stream_aborts_and_keeps_cached_body(pipeline, stub, fetch_cache, url, monkeypatch):
+    api, _ = stub
+    list(pipeline.stream_api_page(url))
+    body = cached_file(fetch_cache, url)
+
+    aborted = []
+    abort = fetch_cache_module.BodyWriter.abort
+    monkeypatch.setattr(fetch_cache_module.BodyWriter, "abort",
+                        lambda writer: (aborted.append(writer.url), abort(writer))[1])
+    api.add(generate_packets(10, 6, days=0.1, seed=3, now=NOW)[0])
+    packets = pipeline.stream_api_page(url)
+    next(packets)
+    packets.close()  # the consumer stops part way through the body
+    assert aborted == [url]
+    assert cached_file(fetch_cache, url) == body
+    assert not list(fetch_cache._body_path(url).parent.glob("*.tmp"))
+
+
+def test_identical_body_leaves_run_unchanged(stub, fetch_cache, url, get_page):
+    api, _ = stub
+    get_page(url)
+    fetch_cache.mark_analyzed()
+
+    # Without validators the stub answers 200 again, with the same body
+    fetch_cache.entries[url].update(etag=None, lastModified=None)
+    fetch_cache.begin_run()
+    get_page(url)
+    assert api.stats["not_modified"] == 0
+    assert fetch_cache.unchanged(3600)
+
+    api.add(generate_packets(10, 6, days=0.1, seed=3, now=NOW)[0])
+    fetch_cache.begin_run()
+    get_page(url)
+    assert not fetch_cache.unchanged(3600)
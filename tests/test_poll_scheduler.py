@@ -0,0 +1,116 @@
+"""PollScheduler decisions on a fake clock."""
+
+import json
+
+import pytest
+
+from poll_scheduler import BUDGET_WINDOW, CROSSING_MARGIN, PollScheduler
+
+START = 1_772_366_400  # 2026-03-01T12:00:00Z
+
+
+class FakeClock:
+    """Epoch seconds that only move when advanced."""
+
+    def __init__(self, now=START):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_arrivals_set_the_delay(clock):
+    scheduler = PollScheduler(min_interval=60, max_interval=1800, target_packets=50, clock=clock)
+    assert scheduler.due()
+    assert scheduler.record(True, 1, new_packets=0) == 1800
+    assert scheduler.reason == "max"
+
+    clock.advance(100)
+    delay = scheduler.record(True, 1, new_packets=20)  # 0.2 packets/s: 50 packets in 250 s
+    assert scheduler.rate == pytest.approx(0.2)
+    assert delay == pytest.approx(250)
+    assert scheduler.reason == "arrivals"
+    assert scheduler.next_due == pytest.approx(clock() + 250)
+    assert not scheduler.due()
+
+
+def test_poll_lands_just_after_offline_crossing(clock):
+    threshold = 240 * 60
+    scheduler = PollScheduler(min_interval=60, max_interval=1800, threshold_seconds=threshold, clock=clock)
+    heard = clock() - threshold + 200  # goes offline 200 s from now
+    later = clock() - threshold + 900
+    delay = scheduler.record(True, 1, new_packets=0, online_last_heard_ms=[later * 1000, heard * 1000])
+    assert scheduler.reason == "crossing"
+    assert scheduler.next_crossing == heard + threshold
+    assert delay == 200 + CROSSING_MARGIN
+    assert scheduler.next_due > heard + threshold
+
+    assert not scheduler.crossing_due()
+    clock.advance(delay)
+    assert scheduler.due()
+    assert scheduler.crossing_due()
+
+
+def test_failures_double_the_delay(clock):
+    scheduler = PollScheduler(min_interval=60, max_interval=3600, clock=clock)
+    for expected in (120, 240, 480, 960, 1920):
+        assert scheduler.record(False, 1) == expected
+        assert scheduler.reason == "backoff"
+        clock.advance(expected)
+    assert scheduler.record(False, 1) == 3600
+    assert scheduler.reason == "backoff, max"
+
+    clock.advance(3600)
+    scheduler.record(True, 1, new_packets=0)
+    assert scheduler.failures == 0
+    assert scheduler.reason == "max"
+
+
+def test_hourly_budget_wins_over_max_interval(clock):
+    scheduler = PollScheduler(min_interval=60, max_interval=600, hourly_budget=3, clock=clock)
+    first = clock()
+    scheduler.record(True, 1, new_packets=0)
+    for _ in range(2):
+        clock.advance(60)
+        scheduler.record(True, 1, new_packets=0)
+
+    # The budget is used up until the first request leaves the sliding hour
+    wait = first + BUDGET_WINDOW - clock()
+    assert scheduler._budget_delay(clock()) == wait
+    assert wait > scheduler.max_interval
+    assert scheduler.next_due == first + BUDGET_WINDOW
+    assert scheduler.reason == "max, budget"
+
+
+def test_state_round_trip_reproduces_schedule(clock, tmp_path):
+    config = dict(min_interval=60, max_interval=1800, threshold_seconds=14_400, clock=clock)
+    scheduler = PollScheduler(**config)
+    scheduler.record(True, 2, new_packets=0)
+    clock.advance(300)
+    scheduler.record(True, 1, new_packets=40, online_last_heard_ms=[(clock() - 14_000) * 1000])
+    clock.advance(120)
+    scheduler.record(False, 1)
+
+    restored = PollScheduler(**config)
+    restored.restore(json.loads(json.dumps(scheduler.to_dict())))
+    assert restored.next_due == scheduler.next_due
+    assert restored.to_dict() == scheduler.to_dict()
+
+    path = tmp_path / "poll-schedule.json"
+    scheduler.save(path)
+    loaded = PollScheduler.load(path, **config)
+    assert loaded.to_dict() == scheduler.to_dict()
+
+    # Both go on to schedule the same next poll
+    clock.advance(scheduler.next_due - clock())
+    assert loaded.due() and scheduler.due()
+    assert loaded.record(True, 1, new_packets=5) == scheduler.record(True, 1, new_packets=5)
+    assert (loaded.next_due, loaded.reason) == (scheduler.next_due, scheduler.reason)